@@ -0,0 +1,129 @@
+"""
+Benchmark: admin client list responsiveness at fleet scale.
+
+Shows a ClientTableModel of KIOSKS rows in a QTableView on Qt's offscreen
+platform, through ClientFilters sorted by time left, and feeds it RATE
+updates a second through a ClientChanges queue, the way
+ClientRegistry.on_change does. Most updates are session ticks and round
+trips, some are state and app changes. A probe timer that should fire every
+PROBE_MS measures how late the GUI event loop runs. Compared modes:
+  per-update   every update is applied, re-sorted and repainted as it arrives
+  batched      updates are merged and applied (and re-sorted once)
+               REFRESH_RATE times a second
+
+Run from the repository root:
+    python -m benchmarks.bench_admin_model [--kiosks 5000] [--rate 1000] [--seconds 5]
+"""
+import argparse
+import os
+import random
+import time
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PySide6.QtCore import QEventLoop, Qt, QTimer
+from PySide6.QtWidgets import QApplication, QTableView
+from shared.constants import SessionState
+from server.admin_model import COLUMN_OF, REFRESH_RATE, ClientChanges, ClientFilters, ClientTableModel
+
+PROBE_MS = 10
+FEED_MS = 5  # the feed catches up to the target rate this often
+APPS = ('chrome.exe', 'steam.exe', 'discord.exe', 'notepad.exe')
+
+def _update(kiosks: int):
+    client_id = f'pc{random.randrange(kiosks)}'
+    roll = random.random()
+    if roll < 0.6:
+        return client_id, {'remaining_time': random.randrange(7200)}
+    if roll < 0.9:
+        return client_id, {'rtt': random.uniform(0.001, 0.05)}
+    if roll < 0.97:
+        return client_id, {'active_apps': tuple(random.sample(APPS, random.randrange(len(APPS))))}
+    return client_id, {'state': random.choice((SessionState.ACTIVE, SessionState.PAUSED, SessionState.INACTIVE))}
+
+def _run(mode: str, kiosks: int, rate: int, seconds: float):
+    random.seed(1)
+    changes = ClientChanges()
+    model = ClientTableModel(changes, REFRESH_RATE if mode == 'batched' else 0)
+    filters = ClientFilters(model)
+    view = QTableView()
+    view.setModel(filters.model)
+    view.horizontalHeader().setSortIndicatorShown(True)
+    view.horizontalHeader().sortIndicatorChanged.connect(filters.sort)
+    view.horizontalHeader().setSortIndicator(COLUMN_OF['remaining_time'], Qt.AscendingOrder)
+    view.resize(1200, 800)
+    view.show()
+    for i in range(kiosks):
+        changes.put(f'pc{i}', {'ip': f'10.0.{i // 250}.{i % 250}', 'state': SessionState.ACTIVE,
+                               'remaining_time': random.randrange(7200), 'active_apps': (), 'rtt': None})
+    model.refresh()
+    QApplication.processEvents()
+
+    started = time.perf_counter()
+    sent = [0]
+    spent = [0.0]  # seconds inside refresh
+
+    def feed():
+        due = int((time.perf_counter() - started) * rate)
+        while sent[0] < due:
+            changes.put(*_update(kiosks))
+            sent[0] += 1
+            if mode == 'per-update':
+                before = time.perf_counter()
+                model.refresh()
+                spent[0] += time.perf_counter() - before
+    lags = []
+    last = [time.perf_counter()]
+
+    def probe():
+        now = time.perf_counter()
+        lags.append(now - last[0] - PROBE_MS / 1000)
+        last[0] = now
+    if mode == 'batched':
+        refresh = model.refresh
+
+        def timed_refresh():
+            before = time.perf_counter()
+            refresh()
+            spent[0] += time.perf_counter() - before
+        model._timer.timeout.disconnect()
+        model._timer.timeout.connect(timed_refresh)
+    timers = []
+    for interval, callback in ((FEED_MS, feed), (PROBE_MS, probe)):
+        timer = QTimer()
+        timer.timeout.connect(callback)
+        timer.start(interval)
+        timers.append(timer)
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    loop.exec()
+    for timer in timers:
+        timer.stop()
+    elapsed = time.perf_counter() - started
+    view.close()
+    lags.sort()
+    return {
+        'updates/s': sent[0] / elapsed,
+        'refreshes/s': model.refreshes / elapsed,
+        'model ms/s': spent[0] * 1000 / elapsed,
+        'lag p50': lags[len(lags) // 2] * 1000,
+        'lag p99': lags[int(len(lags) * 0.99)] * 1000,
+        'lag max': lags[-1] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kiosks', type=int, default=5000)
+    parser.add_argument('--rate', type=int, default=1000, help='updates per second')
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+    app = QApplication([])
+    app.setQuitOnLastWindowClosed(False)  # each mode closes its view
+    print(f"{args.kiosks} rows, {args.rate} updates/s offered, sorted by time left; lag in ms past {PROBE_MS} ms")
+    print(f"{'mode':<11} {'updates/s':>10} {'refreshes/s':>12} {'model ms/s':>11} {'lag p50':>8} {'lag p99':>8} "
+          f"{'lag max':>8}")
+    for mode in ('per-update', 'batched'):
+        result = _run(mode, args.kiosks, args.rate, args.seconds)
+        print(f"{mode:<11} {result['updates/s']:10.0f} {result['refreshes/s']:12.1f} {result['model ms/s']:11.1f} "
+              f"{result['lag p50']:8.1f} {result['lag p99']:8.1f} {result['lag max']:8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: memory per registered kiosk and filtered query latency, ClientRegistry vs a plain dict.
+
+The baseline is the old layout: a dict of per-client dicts with a fresh
+list of app names per client, filtered by scanning every client. The
+registry uses __slots__ records, interned strings, shared app tuples and
+secondary indexes.
+
+Run from the repository root:
+    python -m benchmarks.bench_client_registry [--clients 10000]
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from shared.constants import SessionState
+from server.client_registry import ClientConnection, ClientRegistry
+
+APPS = ['chrome.exe', 'steam.exe', 'discord.exe', 'valorant.exe', 'cs2.exe', 'notepad.exe', 'spotify.exe']
+STATES = [SessionState.ACTIVE] * 6 + [SessionState.PAUSED, SessionState.INACTIVE, SessionState.ENDED]
+QUERIES = 1000
+BUDGET = 1024  # bytes per registered client the registry should stay under
+
+def _fleet(clients: int):
+    """Status of each kiosk as the JSON the server receives, so every decoded string is a fresh object."""
+    rng = random.Random(1)
+    return [json.dumps([f'pc{i}', f'10.0.{i // 250}.{i % 250}', rng.choice(STATES),
+                        sorted(rng.sample(APPS, rng.randint(0, 3))), rng.randint(0, 7200)])
+            for i in range(clients)]
+
+def _build_dict(fleet):
+    table = {}
+    for client_id, ip, state, apps, remaining in map(json.loads, fleet):
+        table[client_id] = {'client_id': client_id, 'client_ip': ip, 'account': None, 'protocol': None,
+                            'last_seen': time.monotonic(), 'state': state, 'remaining_time': remaining,
+                            'active_apps': apps, 'resume_seq': None, 'heartbeat_interval': 5}
+    return table
+
+def _build_registry(fleet):
+    registry = ClientRegistry()
+    for client_id, ip, state, apps, remaining in map(json.loads, fleet):
+        conn = ClientConnection(client_id, ip, None)
+        registry.add(conn)
+        registry.update(conn, state=state, active_apps=apps, remaining_time=remaining)
+    return registry
+
+def _measure(build, fleet):
+    tracemalloc.start()
+    table = build(fleet)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return table, size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=10_000)
+    args = parser.parse_args()
+    fleet = _fleet(args.clients)
+    table, dict_bytes = _measure(_build_dict, fleet)
+    registry, registry_bytes = _measure(_build_registry, fleet)
+    print(f"clients={args.clients}")
+    print(f"dict      {dict_bytes / args.clients:7.0f} bytes/client")
+    print(f"registry  {registry_bytes / args.clients:7.0f} bytes/client (including indexes, budget {BUDGET})")
+
+    started = time.perf_counter()
+    for _ in range(QUERIES):
+        scanned = [c for c in table.values() if c['state'] == SessionState.ACTIVE and 'valorant.exe' in c['active_apps']]
+    scan = (time.perf_counter() - started) / QUERIES
+    started = time.perf_counter()
+    for _ in range(QUERIES):
+        found = registry.query(state=SessionState.ACTIVE, app='valorant.exe')
+    indexed = (time.perf_counter() - started) / QUERIES
+    assert {c['client_id'] for c in scanned} == {c.client_id for c in found}
+    print(f"query active & running valorant.exe ({len(found)} matches):")
+    print(f"scan      {scan * 1e6:9.1f} us")
+    print(f"indexed   {indexed * 1e6:9.1f} us  ({scan / indexed:.1f}x)")
+    started = time.perf_counter()
+    for _ in range(QUERIES):
+        registry.query(ip='10.0.7.42')
+    print(f"by ip     {(time.perf_counter() - started) / QUERIES * 1e6:9.1f} us")
+
+if __name__ == '__main__':
+    main()
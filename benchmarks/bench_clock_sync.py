@@ -0,0 +1,77 @@
+"""
+Benchmark: accuracy of ClockSync's round-trip and clock offset estimates.
+
+Simulates a kiosk whose clock is OFFSET seconds ahead of the server's and
+drifts by DRIFT. The kiosk heartbeats every HEARTBEAT_INTERVAL seconds, and
+the server answers each heartbeat, as they do with CLOCK. Each direction
+has a base delay plus queueing bursts that hit one direction at a time, so
+single samples see asymmetric paths.
+
+For each end the table compares the offset of single samples (what one
+timestamp exchange gives) with the filtered estimate, as the error against
+the true offset at that moment (p50 / p95 / max). The last columns are the
+smoothed round trip and jitter against the true mean round trip.
+
+Run from the repository root:
+    python -m benchmarks.bench_clock_sync [--hours 1] [--burst 0.3]
+"""
+import argparse
+import random
+import statistics
+from shared.clock_sync import ClockSync
+from shared.constants import HEARTBEAT_INTERVAL
+
+OFFSET = 37.5  # seconds the kiosk clock is ahead
+DRIFT = 50e-6  # kiosk clock runs this much fast
+BASE_DELAY = 0.005  # seconds each way
+QUEUE_DELAY = 0.030  # mean extra seconds of a burst
+
+def _delay(burst: float) -> float:
+    if random.random() < burst:
+        return BASE_DELAY + random.expovariate(1 / QUEUE_DELAY)
+    return BASE_DELAY
+
+def _percentiles(errors):
+    errors = sorted(abs(e) * 1000 for e in errors)
+    return errors[len(errors) // 2], errors[int(len(errors) * 0.95)], errors[-1]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=1.0)
+    parser.add_argument('--burst', type=float, default=0.3, help='share of messages that hit a queueing burst')
+    args = parser.parse_args()
+    random.seed(1)
+    now = [0.0]  # true time
+    server = ClockSync(lambda: now[0])
+    kiosk = ClockSync(lambda: now[0] * (1 + DRIFT) + OFFSET)
+    errors = {'server': ([], []), 'kiosk': ([], [])}
+    rtts = []
+    for beat in range(int(args.hours * 3600 / HEARTBEAT_INTERVAL)):
+        now[0] = beat * HEARTBEAT_INTERVAL
+        stamp = kiosk.stamp()
+        up, down = _delay(args.burst), _delay(args.burst)
+        rtts.append(up + down)
+        now[0] += up
+        truth = now[0] * DRIFT + OFFSET  # kiosk clock minus server clock
+        if server.received(**stamp):
+            errors['server'][0].append(server._recent[-1][1] - truth)
+            errors['server'][1].append(server.offset - truth)
+        stamp = server.stamp()
+        now[0] += down
+        truth = now[0] * DRIFT + OFFSET
+        if kiosk.received(**stamp):
+            errors['kiosk'][0].append(kiosk._recent[-1][1] + truth)
+            errors['kiosk'][1].append(kiosk.offset + truth)
+    print(f"{args.hours:g} h of heartbeats every {HEARTBEAT_INTERVAL}s, {args.burst:.0%} of messages queued "
+          f"(mean {QUEUE_DELAY * 1000:.0f} ms extra); offset errors in ms")
+    print(f"{'end':<7} {'single p50/p95/max':>22} {'filtered p50/p95/max':>22} {'rtt ms':>7} {'jitter ms':>10} "
+          f"{'true rtt ms':>12}")
+    for end, clock in (('server', server), ('kiosk', kiosk)):
+        raw, filtered = errors[end]
+        raw_text = '/'.join(f'{value:.1f}' for value in _percentiles(raw))
+        filtered_text = '/'.join(f'{value:.1f}' for value in _percentiles(filtered))
+        print(f"{end:<7} {raw_text:>22} {filtered_text:>22} {clock.rtt * 1000:7.1f} {clock.jitter * 1000:10.1f} "
+              f"{statistics.mean(rtts) * 1000:12.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Cluster test: load balancing across server nodes and kiosk failover.
+
+Starts NODES server processes (server/main.py with --peers) and points every
+simulated kiosk at the first node only. Kiosks speak the real protocol with
+the CLUSTER capability: they take the node list from the handshake, follow
+redirects, and on a dropped connection try the next node without waiting.
+A few kiosks log in with a prepaid account, which starts a session on the
+first node.
+
+The script prints how the kiosks spread over the nodes as the first node
+redirects its excess. It then kills the first node (SIGKILL, no goodbye)
+and reports how long its kiosks took to get a handshake from another node,
+against one heartbeat interval. It also checks that the sessions carried on
+there, with the time that was left.
+
+Run from the repository root:
+    python -m benchmarks.bench_cluster [--kiosks 300] [--nodes 3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from shared.constants import CONNECT_TIMEOUT, HEARTBEAT_INTERVAL, MessageType
+from shared.protocol import HEARTBEAT_FRAME, create_handshake, encode_message, handshake_fields, parse_address
+from server.billing import BillingLedger
+from .bench_fleet import _wait_for_port
+
+BASE_PORT = 5201
+CLUSTER_BASE_PORT = 5301
+SESSIONS = 6  # kiosks that log in with an account
+SESSION_SECONDS = 3600
+
+class Kiosk:
+    """A simulated CLUSTER kiosk. Records which node it is on and when it got there."""
+
+    def __init__(self, index: int, first_server: str, account: bool):
+        self.client_id = f'pc{index}'
+        self.servers = [first_server]
+        self.index = 0
+        self.account = account
+        self.token = None
+        self.last_seq = None
+        self.node = None  # address of the node it is connected to
+        self.connected_at = 0.0
+        self.remaining = None  # session seconds left, as last told by a server
+        self.remaining_at = 0.0
+        self.writer = None
+
+    def _first_frame(self) -> bytes:
+        if not self.account:
+            return encode_message(create_handshake(self.client_id, '127.0.0.1', None, self.token, self.last_seq))
+        auth = {'type': MessageType.AUTH, 'client_id': self.client_id, 'username': self.client_id,
+                'password': 'secret'}
+        auth.update(handshake_fields(create_handshake(self.client_id, resume_token=self.token,
+                                                      last_seq=self.last_seq)))
+        return json.dumps(auth).encode() + b'\n'
+
+    async def run(self):
+        while True:
+            address = self.servers[self.index]
+            host, port = parse_address(address)
+            try:
+                reader, self.writer = await asyncio.wait_for(asyncio.open_connection(host, port), CONNECT_TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                self.index = (self.index + 1) % len(self.servers)
+                if self.index == 0:
+                    await asyncio.sleep(1)
+                continue
+            self.writer.write(self._first_frame())
+            heartbeat = asyncio.create_task(self._heartbeat())
+            try:
+                await self._receive(reader, address)
+            finally:
+                heartbeat.cancel()
+                self.writer.close()
+                self.node = None
+
+    async def _receive(self, reader, address: str):
+        while True:
+            try:
+                line = await reader.readline()
+            except OSError:
+                return  # e.g. reset by a killed node: fail over like on a clean close
+            if not line:
+                return
+            data = json.loads(line)
+            if data.get('seq') is not None:
+                self.last_seq = data['seq']
+            kind = data.get('type')
+            if kind in (MessageType.HANDSHAKE, MessageType.AUTH_SUCCESS):
+                self.node, self.connected_at = address, time.monotonic()
+                self.token = data.get('resume_token') or self.token
+                if data.get('servers'):
+                    self.servers, self.index = data['servers'], 0
+            elif kind == MessageType.REDIRECT:
+                self.servers, self.index = data['servers'], 0
+                return
+            elif kind in (MessageType.SESSION_STARTED, MessageType.SESSION_START):
+                self.remaining, self.remaining_at = data.get('duration'), time.monotonic()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            self.writer.write(HEARTBEAT_FRAME)
+
+def _start_node(i: int, nodes: int, tmp: str, env) -> subprocess.Popen:
+    directory = os.path.join(tmp, f'node{i}')
+    os.makedirs(directory, exist_ok=True)
+    peers = ','.join(f'127.0.0.1:{CLUSTER_BASE_PORT + j}' for j in range(nodes) if j != i)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'server.main', '--host', '127.0.0.1', '--port', str(BASE_PORT + i),
+         '--node', f'n{i}', '--cluster-port', str(CLUSTER_BASE_PORT + i), '--peers', peers,
+         '--ledger', os.path.join(directory, 'ledger.db'), '--events', os.path.join(directory, 'events'),
+         '--usage', os.path.join(directory, 'usage'), '--assets', os.path.join(directory, 'assets')],
+        env=env, stderr=open(os.path.join(directory, 'server.log'), 'w')
+    )
+
+def _spread(kiosks, nodes: int):
+    counts = [0] * nodes
+    for kiosk in kiosks:
+        if kiosk.node is not None:
+            counts[parse_address(kiosk.node)[1] - BASE_PORT] += 1
+    return counts
+
+async def _balance(kiosks, nodes: int, alive: range):
+    """Print the spread every second until the live nodes hold about the same number of kiosks."""
+    started = time.monotonic()
+    while True:
+        await asyncio.sleep(1)
+        counts = [_spread(kiosks, nodes)[i] for i in alive]
+        print(f"  t={time.monotonic() - started:4.0f}s  {counts}")
+        if sum(counts) == len(kiosks) and max(counts) - min(counts) <= len(kiosks) * 0.1 + 2:
+            return
+        if time.monotonic() - started > 30:
+            print("  did not balance within 30s")
+            return
+
+async def _scenario(kiosks, nodes: int, processes):
+    tasks = [asyncio.create_task(kiosk.run()) for kiosk in kiosks]
+    print("spread over nodes:")
+    await _balance(kiosks, nodes, range(nodes))
+
+    first = f'127.0.0.1:{BASE_PORT}'
+    victims = [kiosk for kiosk in kiosks if kiosk.node == first]
+    sessions = {kiosk.client_id: kiosk.remaining - (time.monotonic() - kiosk.remaining_at)
+                for kiosk in victims if kiosk.remaining is not None}
+    await asyncio.sleep(0.5)
+    killed = time.monotonic()
+    processes[0].kill()
+    while any(kiosk.node in (None, first) for kiosk in victims) and time.monotonic() - killed < 10:
+        await asyncio.sleep(0.01)
+    delays = sorted(kiosk.connected_at - killed for kiosk in victims if kiosk.node not in (None, first))
+    print(f"killed node 0 holding {len(victims)} kiosks ({len(sessions)} in a session)")
+    if delays:
+        print(f"  failed over: {len(delays)}  median {statistics.median(delays) * 1000:.0f} ms  "
+              f"max {delays[-1] * 1000:.0f} ms  (heartbeat interval {HEARTBEAT_INTERVAL * 1000} ms)")
+    for kiosk in victims:
+        if kiosk.client_id in sessions:
+            expected = sessions[kiosk.client_id] - (kiosk.remaining_at - killed)
+            print(f"  {kiosk.client_id} on {kiosk.node}: {kiosk.remaining}s left (expected ~{expected:.0f}s)")
+    print("spread over the surviving nodes:")
+    await _balance(kiosks, nodes, range(1, nodes))
+    for task in tasks:
+        task.cancel()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kiosks', type=int, default=300)
+    parser.add_argument('--nodes', type=int, default=3)
+    args = parser.parse_args()
+    env = dict(os.environ, KIOSK_RESUME_SECRET=os.urandom(32).hex(), KIOSK_CLUSTER_SECRET=os.urandom(32).hex())
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, 'node0'))
+        ledger = BillingLedger(os.path.join(tmp, 'node0', 'ledger.db'))
+        for i in range(SESSIONS):
+            ledger.set_password(f'pc{i}', 'secret')
+            ledger.credit(f'pc{i}', SESSION_SECONDS)
+        ledger.close()
+        processes = [_start_node(i, args.nodes, tmp, env) for i in range(args.nodes)]
+        try:
+            for i in range(args.nodes):
+                _wait_for_port(BASE_PORT + i)
+            time.sleep(3)  # let the nodes link up
+            first = f'127.0.0.1:{BASE_PORT}'
+            kiosks = [Kiosk(i, first, i < SESSIONS) for i in range(args.kiosks)]
+            asyncio.run(_scenario(kiosks, args.nodes, processes))
+        finally:
+            for process in processes:
+                process.kill()
+                process.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Fleet simulator: connection, auth and status throughput against server/main.py.
+
+Starts the server with 1 worker and then with one worker per CPU, and drives
+it from several simulator processes. Each simulated kiosk repeatedly connects,
+handshakes (every AUTH_EVERY-th connection authenticates instead, which costs
+a password hash on the server), sends a burst of status and heartbeat
+messages, and disconnects.
+
+Run from the repository root:
+    python -m benchmarks.bench_fleet [--seconds 5] [--kiosks 200]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from server.billing import BillingLedger
+from shared.protocol import create_handshake, create_heartbeat, create_client_status, encode_message
+
+PORT = 5099
+ACCOUNTS = 10
+AUTH_EVERY = 10
+STATUS_PER_CONNECTION = 20
+
+async def _kiosk(index: int, deadline: float, counts: list):
+    client_id = f'pc{index}'
+    burst = b''.join(
+        encode_message(create_client_status(client_id, 'active', ['game.exe'], 1000))
+        for _ in range(STATUS_PER_CONNECTION)
+    ) + encode_message(create_heartbeat(client_id))
+    cycle = 0
+    while time.monotonic() < deadline:
+        reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+        if cycle % AUTH_EVERY == index % AUTH_EVERY:
+            auth = {'type': 'auth', 'username': f'user{index % ACCOUNTS}', 'password': 'secret',
+                    'client_id': client_id, 'protocol_version': 1}
+            writer.write(json.dumps(auth).encode() + b'\n')
+            await reader.readline()
+            await reader.readline()
+            counts[1] += 1
+        else:
+            writer.write(encode_message(create_handshake(client_id)))
+            await reader.readline()
+        writer.write(burst)
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+        counts[0] += 1
+        counts[2] += STATUS_PER_CONNECTION + 1
+        cycle += 1
+
+def _simulator(first: int, kiosks: int, seconds: float, results):
+    counts = [0, 0, 0]
+    deadline = time.monotonic() + seconds
+
+    async def run():
+        await asyncio.gather(*(_kiosk(first + i, deadline, counts) for i in range(kiosks)), return_exceptions=True)
+
+    asyncio.run(run())
+    results.put(counts)
+
+def _wait_for_port(port: int = PORT):
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+def run(workers: int, kiosks: int, seconds: float, ledger_path: str):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'server.main', '--host', '127.0.0.1', '--port', str(PORT),
+         '--workers', str(workers), '--ledger', ledger_path],
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_for_port()
+        simulators = max(1, os.cpu_count() or 1)
+        results = multiprocessing.Queue()
+        per = kiosks // simulators
+        procs = [multiprocessing.Process(target=_simulator, args=(i * per, per, seconds, results))
+                 for i in range(simulators)]
+        for p in procs:
+            p.start()
+        totals = [0, 0, 0]
+        for _ in procs:
+            for i, value in enumerate(results.get()):
+                totals[i] += value
+        for p in procs:
+            p.join()
+    finally:
+        server.terminate()
+        server.wait()
+    connections, auths, messages = totals
+    print(f"workers={workers:<3} connections/s={connections / seconds:8.0f}  "
+          f"auths/s={auths / seconds:7.0f}  messages/s={messages / seconds:9.0f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--kiosks', type=int, default=200)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger_path = os.path.join(tmp, 'ledger.db')
+        ledger = BillingLedger(ledger_path)
+        for i in range(ACCOUNTS):
+            ledger.set_password(f'user{i}', 'secret')
+            ledger.credit(f'user{i}', 1000 * 3600)
+        ledger.close()
+        print(f"cpus={os.cpu_count()} kiosks={args.kiosks} seconds={args.seconds}")
+        for workers in sorted({1, os.cpu_count() or 1}):
+            run(workers, args.kiosks, args.seconds, ledger_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark: server packets and CPU per kiosk, fixed JSON heartbeats vs adaptive piggybacked ones.
+
+Each simulated kiosk sends a client status at random moments (an app
+launched, a session change) and heartbeats on top of that:
+  fixed     a full JSON heartbeat every HEARTBEAT_INTERVAL, whatever else was sent
+  adaptive  the interval the server hands out for this fleet size, skipped when
+            another frame went out since the last tick, and sent as HEARTBEAT_FRAME
+An hour of this traffic is generated per kiosk, replayed against a real
+server (server/main.py, one worker) compressed into a few wall-clock
+seconds, and the server process's CPU time is measured around the replay.
+
+Run from the repository root:
+    python -m benchmarks.bench_heartbeat [--kiosks 1000] [--seconds 20]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import psutil
+from shared.constants import HEARTBEAT_INTERVAL
+from shared.protocol import (
+    HEARTBEAT_FRAME, create_client_status, create_handshake, create_heartbeat, encode_message
+)
+from server.client_manager import heartbeat_interval_for
+from .bench_fleet import PORT, _wait_for_port
+
+SIMULATED_SECONDS = 3600
+STATUS_EVERY = 45  # mean seconds between status updates
+
+def _schedule(index: int, mode: str, fleet: int):
+    """(time, frame) pairs one kiosk sends over SIMULATED_SECONDS."""
+    rng = random.Random(index)
+    client_id = f'pc{index}'
+    status = encode_message(create_client_status(client_id, 'active', ['game.exe', 'browser.exe'], 1800))
+    statuses = []
+    t = rng.expovariate(1 / STATUS_EVERY)
+    while t < SIMULATED_SECONDS:
+        statuses.append(t)
+        t += rng.expovariate(1 / STATUS_EVERY)
+    if mode == 'fixed':
+        interval, heartbeat = HEARTBEAT_INTERVAL, encode_message(create_heartbeat(client_id))
+    else:
+        interval, heartbeat = heartbeat_interval_for(fleet), HEARTBEAT_FRAME
+    frames = [(t, status) for t in statuses]
+    last_sent, i = 0.0, 0
+    for tick in range(interval, SIMULATED_SECONDS, interval):
+        while i < len(statuses) and statuses[i] <= tick:
+            last_sent = statuses[i]
+            i += 1
+        if mode == 'adaptive' and tick - last_sent < interval:
+            continue
+        frames.append((tick, heartbeat))
+        last_sent = tick
+    frames.sort(key=lambda item: item[0])
+    return frames
+
+async def _kiosk(index: int, mode: str, fleet: int, scale: float, start: float, counts: list):
+    frames = _schedule(index, mode, fleet)
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    writer.write(encode_message(create_handshake(f'pc{index}')))
+    await reader.readline()
+    await asyncio.sleep(max(0.0, start - time.time()))
+    for t, frame in frames:
+        delay = start + t * scale - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        writer.write(frame)
+        counts[0] += 1
+        counts[1] += len(frame)
+    await writer.drain()
+    writer.close()
+
+def _simulator(first: int, kiosks: int, mode: str, fleet: int, scale: float, start: float, results):
+    counts = [0, 0]
+
+    async def run():
+        await asyncio.gather(*(_kiosk(first + i, mode, fleet, scale, start, counts) for i in range(kiosks)))
+
+    asyncio.run(run())
+    results.put(counts)
+
+def run(mode: str, kiosks: int, seconds: float, ledger_path: str):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'server.main', '--host', '127.0.0.1', '--port', str(PORT),
+         '--workers', '1', '--ledger', ledger_path],
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_for_port()
+        process = psutil.Process(server.pid)
+        simulators = max(1, min(4, os.cpu_count() or 1))
+        per = kiosks // simulators
+        scale = seconds / SIMULATED_SECONDS
+        start = time.time() + 2  # leave time for every kiosk to connect first
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_simulator,
+                                         args=(i * per, per, mode, per * simulators, scale, start, results))
+                 for i in range(simulators)]
+        for p in procs:
+            p.start()
+        time.sleep(max(0.0, start - time.time()))
+        cpu = process.cpu_times()
+        before = cpu.user + cpu.system
+        totals = [0, 0]
+        for _ in procs:
+            for i, value in enumerate(results.get()):
+                totals[i] += value
+        time.sleep(0.2)  # let the server drain its sockets
+        cpu = process.cpu_times()
+        used = cpu.user + cpu.system - before
+        for p in procs:
+            p.join()
+    finally:
+        server.terminate()
+        server.wait()
+    fleet = per * simulators
+    print(f"{mode:<9} packets/kiosk/h={totals[0] / fleet:7.0f}  bytes/kiosk/h={totals[1] / fleet:8.0f}  "
+          f"server cpu/kiosk/h={used / fleet * 1000:6.2f}ms")
+    return totals[0], used
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kiosks', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=20, help='wall-clock seconds one simulated hour is replayed in')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger_path = os.path.join(tmp, 'ledger.db')
+        print(f"kiosks={args.kiosks} adaptive interval={heartbeat_interval_for(args.kiosks)}s "
+              f"status every ~{STATUS_EVERY}s")
+        fixed_packets, fixed_cpu = run('fixed', args.kiosks, args.seconds, ledger_path)
+        adaptive_packets, adaptive_cpu = run('adaptive', args.kiosks, args.seconds, ledger_path)
+    print(f"packets  {adaptive_packets / fixed_packets:6.2f}x of fixed")
+    print(f"cpu      {adaptive_cpu / fixed_cpu:6.2f}x of fixed")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: event loop latency while a notice is on screen.
+
+Runs a qasync event loop on Qt's offscreen platform, with a local server
+that sends a timestamped line every TICK to a receive task. On the
+TRIGGER-th line the receive task shows a "session ended" notice, as the
+kiosk does when SESSION_END arrives. The notice is shown as either:
+  modal    QMessageBox.exec(), closed after HOLD seconds as if someone clicked OK
+  banner   Notifier.notify(), which returns at once
+Meanwhile a callback chain (like a QTimer) and a task (like a heartbeat
+coroutine) each wake every TICK and record how late they are. The table
+gives the worst lateness of each and the worst delay of a line from send to
+receive. "stalled" means the task never woke again. Loop errors counts
+tasks that qasync could not step from inside the nested modal loop.
+
+Run from the repository root:
+    python -m benchmarks.bench_notifications [--hold 3]
+"""
+import argparse
+import asyncio
+import os
+import sys
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import qasync
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QApplication, QMessageBox
+from shared.notifications import Notifier
+
+TICK = 0.05  # seconds between lines and between probe wake-ups
+TRIGGER = 10  # the line that brings up the notice
+
+class _Probe:
+    """Worst lateness seen by each kind of work during one run."""
+
+    def __init__(self, now: float):
+        self.callback_lag = 0.0
+        self.task_lag = 0.0
+        self.task_last = now
+        self.frame_delay = 0.0
+        self.frames = 0
+        self.errors = 0
+
+def _callback(loop, probe: _Probe, due: float, end: float):
+    now = loop.time()
+    probe.callback_lag = max(probe.callback_lag, now - due)
+    if now < end:
+        loop.call_at(now + TICK, _callback, loop, probe, now + TICK, end)
+
+async def _ticker(loop, probe: _Probe, end: float):
+    while loop.time() < end:
+        due = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        probe.task_last = loop.time()
+        probe.task_lag = max(probe.task_lag, probe.task_last - due)
+
+async def _receive(loop, reader, probe: _Probe, mode: str, hold: float, notifier: Notifier):
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        probe.frames += 1
+        probe.frame_delay = max(probe.frame_delay, loop.time() - float(line))
+        if probe.frames != TRIGGER:
+            continue
+        title, text = "Session Ended", "Your session has ended. The desktop is now locked."
+        if mode == 'modal':
+            box = QMessageBox(QMessageBox.Information, title, text)
+            QTimer.singleShot(int(hold * 1000), box.accept)
+            box.exec()
+        else:
+            notifier.notify(title, text, timeout=hold)
+
+async def _run(mode: str, hold: float, notifier: Notifier) -> _Probe:
+    loop = asyncio.get_event_loop()
+    probe = _Probe(loop.time())
+    loop.set_exception_handler(lambda loop, context: setattr(probe, 'errors', probe.errors + 1))
+    end = loop.time() + TICK * TRIGGER + hold + 1
+    writers = []
+
+    def send():
+        if loop.time() < end:
+            for writer in writers:
+                writer.write(f'{loop.time()}\n'.encode())
+            loop.call_later(TICK, send)
+    server = await asyncio.start_server(lambda reader, writer: writers.append(writer), '127.0.0.1', 0)
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+    loop.call_later(TICK, send)
+    loop.call_later(TICK, _callback, loop, probe, loop.time() + TICK, end)
+    # Neither task is awaited: a task qasync failed to step never finishes
+    ticker = asyncio.create_task(_ticker(loop, probe, end))
+    receiver = asyncio.create_task(_receive(loop, reader, probe, mode, hold, notifier))
+    await asyncio.sleep(end - loop.time() + 0.5)
+    if probe.task_last < end - 2 * TICK:
+        probe.task_lag = None
+    ticker.cancel()
+    receiver.cancel()
+    writer.close()
+    server.close()
+    loop.set_exception_handler(None)
+    return probe
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hold', type=float, default=3.0, help='seconds the notice stays up')
+    args = parser.parse_args()
+    app = QApplication(sys.argv)
+    app.setQuitOnLastWindowClosed(False)  # closing the box or a banner must not stop the loop
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    notifier = Notifier()
+    print(f"notice held {args.hold:.1f}s, tick {TICK * 1000:.0f} ms")
+    print(f"{'mode':<7} {'callback lag ms':>16} {'task lag ms':>12} {'line delay ms':>14} {'lines':>6} {'loop errors':>12}")
+    with loop:
+        for mode in ('modal', 'banner'):
+            probe = loop.run_until_complete(_run(mode, args.hold, notifier))
+            task_lag = 'stalled' if probe.task_lag is None else f'{probe.task_lag * 1000:.1f}'
+            print(f"{mode:<7} {probe.callback_lag * 1000:16.1f} {task_lag:>12} {probe.frame_delay * 1000:14.1f} "
+                  f"{probe.frames:6} {probe.errors:12}")
+
+if __name__ == '__main__':
+    main()
+    # The task the modal run wedged can never finish, and finalizing it at exit crashes qasync
+    sys.stdout.flush()
+    os._exit(0)
@@ -0,0 +1,86 @@
+"""
+Benchmark: screen thumbnail encoding cost and bytes per frame.
+
+Renders a synthetic 1920x1080 desktop with Qt's offscreen platform and feeds
+TileEncoder a sequence of frames:
+  static    nothing changed
+  clock     a clock in the corner ticks
+  window    a window is dragged across the screen
+  video     a third of the screen changes every frame
+For each, JPEG and PNG tiles are timed, sent as deltas (changed tiles) and as
+full frames (encoder reset every frame).
+
+Run from the repository root:
+    python -m benchmarks.bench_screen [--frames 30]
+"""
+import argparse
+import os
+import random
+import time
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PySide6.QtCore import QRect, Qt
+from PySide6.QtGui import QColor, QFont, QGuiApplication, QImage, QLinearGradient, QPainter
+from client.screen_capture import TileEncoder
+
+WIDTH, HEIGHT = 1920, 1080
+
+def _desktop(frame: int, scenario: str) -> QImage:
+    image = QImage(WIDTH, HEIGHT, QImage.Format_RGB32)
+    painter = QPainter(image)
+    gradient = QLinearGradient(0, 0, WIDTH, HEIGHT)
+    gradient.setColorAt(0, QColor(20, 40, 90))
+    gradient.setColorAt(1, QColor(90, 20, 60))
+    painter.fillRect(image.rect(), gradient)
+    painter.setFont(QFont('Sans', 14))
+    for i in range(24):  # icon grid
+        x, y = 40 + (i % 6) * 140, 40 + (i // 6) * 140
+        painter.fillRect(x, y, 64, 64, QColor.fromHsv(i * 15, 160, 220))
+        painter.setPen(Qt.white)
+        painter.drawText(x - 10, y + 90, f'App {i}')
+    painter.fillRect(0, HEIGHT - 40, WIDTH, 40, QColor(30, 30, 30))  # toolbar
+    if scenario in ('clock', 'window', 'video'):
+        painter.drawText(WIDTH - 120, HEIGHT - 14, f'12:{frame // 60:02d}:{frame % 60:02d}')
+    if scenario == 'window':
+        x = 200 + frame * 25
+        painter.fillRect(QRect(x, 300, 800, 500), QColor(235, 235, 235))
+        painter.fillRect(QRect(x, 300, 800, 30), QColor(0, 90, 180))
+        painter.setPen(Qt.black)
+        for line in range(12):
+            painter.drawText(x + 20, 360 + line * 30, f'Document line {line} ' * 3)
+    if scenario == 'video':
+        rng = random.Random(frame)
+        for _ in range(400):
+            painter.fillRect(rng.randrange(600, 1800), rng.randrange(100, 700), 40, 40,
+                             QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    painter.end()
+    return image
+
+def _run(scenario: str, frames: int, quality: int, full: bool):
+    encoder = TileEncoder(quality=quality)
+    images = [_desktop(i, scenario) for i in range(frames + 1)]
+    encoder.encode(images[0])  # the first frame is always full
+    spent, total = 0.0, 0
+    for image in images[1:]:
+        if full:
+            encoder.reset()
+        started = time.perf_counter()
+        _, _, _, tiles = encoder.encode(image)
+        spent += time.perf_counter() - started
+        total += sum(len(data) for _, data in tiles)
+    return spent / frames * 1000, total / frames
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=30)
+    args = parser.parse_args()
+    app = QGuiApplication([])  # noqa: F841 - QPainter text needs the application
+    print(f"{'scenario':<8} {'format':<5} {'delta ms':>9} {'delta KB':>9} {'full ms':>8} {'full KB':>8}")
+    for scenario in ('static', 'clock', 'window', 'video'):
+        for name, quality in (('jpeg', 60), ('png', 0)):
+            delta_ms, delta_bytes = _run(scenario, args.frames, quality, False)
+            full_ms, full_bytes = _run(scenario, args.frames, quality, True)
+            print(f"{scenario:<8} {name:<5} {delta_ms:9.2f} {delta_bytes / 1024:9.1f} "
+                  f"{full_ms:8.2f} {full_bytes / 1024:8.1f}")
+
+if __name__ == '__main__':
+    main()
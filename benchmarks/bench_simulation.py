@@ -0,0 +1,268 @@
+"""
+Simulation: a kiosk fleet against the real server, in virtual time.
+
+Runs ClientManager on a VirtualEventLoop with KIOSKS kiosks over an
+in-memory Network (shared/simulation.py). Each kiosk is the client's own
+KioskConnection (client/kiosk_connection.py: ServerList failover and
+backoff, handshake, heartbeats, ClockSync, SessionCountdown) with only the
+desktop left out. Each kiosk's wall clock is off by up to MAX_OFFSET
+seconds (NTP keeps it from drifting) and its monotonic clock runs up to
+MAX_DRIFT fast or slow. Timers fire TIMER_LATENESS late.
+
+An admin starts sessions at random (some run the full
+MAX_SESSION_DURATION), pauses, resumes and extends them. The server is
+taken down for OUTAGE seconds in the middle of the run, so every kiosk
+reconnects at once.
+
+Reported, and checked (the exit status is 1 if a check fails):
+  session end   when kiosks locked against when the server ended the
+                session (negative: early); within a second with CLOCK
+  drops         connections lost outside the outage (heartbeat timeouts);
+                there should be none
+  reconnect     time from the outage's end until each kiosk is back; no
+                kiosk may tell its user the server is unreachable
+  digest        of everything the kiosks saw, with their timings; a second
+                run with the same seed must give the same one (--repeat)
+
+The defaults (50 kiosks for an hour) take about 7 s. The server stretches
+heartbeats as the fleet grows, so large fleets cost the least per
+kiosk-hour: 5000 kiosks for half an hour take about 70 s. For full
+MAX_SESSION_DURATION sessions, run a few kiosks for longer, e.g.
+--kiosks 20 --hours 50.
+
+Run from the repository root:
+    python -m benchmarks.bench_simulation [--kiosks 50] [--hours 1] [--seed 1] [--repeat]
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from typing import Dict, List
+from client.kiosk_connection import KioskConnection
+from client.server_list import ServerList
+from shared.constants import HEARTBEAT_INTERVAL, MAX_SESSION_DURATION
+from shared.protocol import MessageType, SessionState
+from shared.simulation import Network, VirtualEventLoop
+from server.client_manager import ClientManager
+from server.resumption import ResumptionTokens
+
+SERVER = ('10.0.0.1', 5000)
+MAX_OFFSET = 120.0  # seconds a kiosk clock may be off
+MAX_DRIFT = 50e-6  # how far a kiosk's monotonic clock may run fast or slow
+LATENCY = 0.002  # seconds each way, plus jitter
+JITTER = 0.003
+IDLE_MEAN = 1200  # seconds a kiosk waits between sessions, on average
+LONG_SESSIONS = 0.05  # share of sessions that run MAX_SESSION_DURATION
+OUTAGE = 30  # seconds the server is down, halfway through
+TIMER_LATENESS = 0.001  # seconds kiosk timers fire late; real ones never fire exactly on time
+
+def _percentiles(values: List[float]):
+    values = sorted(values)
+    if not values:
+        return 0.0, 0.0, 0.0
+    return values[len(values) // 2], values[int(len(values) * 0.99)], values[-1]
+
+class Fleet:
+    """What the kiosks saw, for the report and the digest."""
+
+    def __init__(self, outage: float):
+        self.outage = (outage, outage + OUTAGE)  # when the server is down
+        self.trace: List[str] = []
+        self.kiosk_ends: Dict[str, float] = {}  # sessions one side has ended and the other not yet
+        self.server_ends: Dict[str, float] = {}
+        self.end_errors: List[float] = []  # kiosk end - server end, seconds
+        self.legacy = 0  # sessions counted down without a deadline
+        self.drops = 0
+        self.reconnects: List[float] = []
+        self.unreachable = 0  # times a kiosk told its user the server is unreachable
+        self.connections = 0
+
+    def ended(self, client_id: str, now: float, by_kiosk: bool):
+        """Pair the kiosk's and the server's end of the same session."""
+        mine, theirs = (self.kiosk_ends, self.server_ends) if by_kiosk else (self.server_ends, self.kiosk_ends)
+        other = theirs.pop(client_id, None)
+        if other is None:
+            mine[client_id] = now
+        else:
+            self.end_errors.append(now - other if by_kiosk else other - now)
+
+class SimKiosk:
+    """A kiosk as client/main.py runs it, without the desktop: its KioskConnection on the kiosk's own clocks.
+
+    Timers fire on the kiosk's (drifting) monotonic clock, TIMER_LATENESS
+    late, as QTimers do, and connections go over the Network. The
+    connection's callbacks record what the kiosk sees in the Fleet.
+    """
+
+    def __init__(self, loop: VirtualEventLoop, network: Network, fleet: Fleet, index: int, seed: int):
+        self.loop = loop
+        self.network = network
+        self.fleet = fleet
+        self.random = random.Random(seed * 1_000_003 + index)
+        self.client_ip = self.client_id = f'10.1.{index // 250}.{index % 250 + 1}'  # the server names it by IP
+        self.drift = self.random.uniform(-MAX_DRIFT, MAX_DRIFT)
+        monotonic = lambda: loop.time() * (1 + self.drift)
+        wall = loop.wall(self.random.uniform(-MAX_OFFSET, MAX_OFFSET))  # kept in step by NTP
+        servers = ServerList([f'{SERVER[0]}:{SERVER[1]}'], clock=monotonic, rng=self.random)
+        self.connection = KioskConnection(servers, self.client_ip, open_connection=self._open_connection,
+                                          monotonic=monotonic, wall=wall, call_later=self._after)
+        self.connection.on_handshake = self._connected
+        self.connection.on_disconnected = self._disconnected
+        self.connection.on_unreachable = self._unreachable
+        self.connection.on_session = self._session
+        self.connection.on_session_end = self._ended
+        self.cut_off = False  # disconnected by the outage
+
+    def _log(self, event: str):
+        self.fleet.trace.append(f'{self.loop.time():.6f} {self.client_id} {event}')
+
+    def _after(self, seconds: float, callback) -> asyncio.TimerHandle:
+        """A single-shot timer of seconds on the kiosk's clock."""
+        return self.loop.call_later(seconds / (1 + self.drift) + TIMER_LATENESS, callback)
+
+    def _open_connection(self, host: str, port: int, ssl=None):
+        return self.network.open_connection(host, port, self.client_ip)
+
+    def start(self):
+        self._after(self.random.uniform(0, HEARTBEAT_INTERVAL), self.connection.start)  # not switched on in step
+
+    def _connected(self, message):
+        if self.cut_off:
+            self.cut_off = False
+            self.fleet.reconnects.append(self.loop.time() - self.fleet.outage[1])
+        self._log(f'connected resumed={message.resumed}')
+
+    def _disconnected(self, redirected: bool):
+        start, end = self.fleet.outage
+        if start <= self.loop.time() <= end:
+            self.cut_off = True
+        else:
+            self.fleet.drops += 1
+        self._log('disconnected')
+
+    def _unreachable(self):
+        self.fleet.unreachable += 1
+        self._log('unreachable')
+
+    def _session(self, message):
+        countdown = self.connection.countdown
+        if message.type == MessageType.SESSION_START:
+            self._log(f'start {message.duration}')
+        elif message.type == MessageType.SESSION_PAUSE:
+            self._log(f'pause {countdown.remaining}')
+        else:
+            self._log('resume')
+
+    def _ended(self):
+        if self.connection.countdown.deadline is None:
+            self.fleet.legacy += 1
+        self.fleet.ended(self.client_id, self.loop.time(), by_kiosk=True)
+        self._log(f"end {'local' if self.connection.countdown.expired else 'server'}")
+
+async def _admin(manager: ClientManager, client_id: str, rng: random.Random):
+    """Starts a session now and then, and sometimes pauses, resumes or extends it."""
+    while True:
+        await asyncio.sleep(rng.expovariate(1 / IDLE_MEAN))
+        if rng.random() < LONG_SESSIONS:
+            duration = MAX_SESSION_DURATION
+        else:
+            duration = rng.randrange(15, 241) * 60
+        manager.start_session(client_id, duration)
+        while manager.scheduler.state(client_id) is not None:
+            await asyncio.sleep(rng.expovariate(1 / 1800))
+            state = manager.scheduler.state(client_id)
+            roll = rng.random()
+            if state == SessionState.PAUSED:
+                manager.resume_session(client_id)
+            elif state == SessionState.ACTIVE and roll < 0.3:
+                manager.pause_session(client_id)
+            elif state == SessionState.ACTIVE and roll < 0.5:
+                manager.extend_session(client_id, 900)
+
+async def _simulate(kiosks: int, hours: float, seed: int) -> Fleet:
+    loop = asyncio.get_running_loop()
+    network = Network(loop, LATENCY, JITTER, seed)
+    fleet = Fleet(hours * 3600 / 2)
+    manager = ClientManager(tokens=ResumptionTokens(bytes(32), clock=loop.wall()),
+                            clock=loop.time, wall_clock=loop.wall())
+    expire = manager.scheduler.on_expire
+
+    def expired(client_id: str):
+        fleet.ended(client_id, loop.time(), by_kiosk=False)
+        expire(client_id)
+    manager.scheduler.on_expire = expired
+    network.listen(SERVER, manager.make_protocol)
+    tasks = manager.start()
+    rng = random.Random(seed)
+    for index in range(kiosks):
+        kiosk = SimKiosk(loop, network, fleet, index, seed)
+        kiosk.start()
+        tasks.append(loop.create_task(_admin(manager, kiosk.client_id, random.Random(rng.random()))))
+    await asyncio.sleep(fleet.outage[0])
+    network.set_down(SERVER)
+    await asyncio.sleep(OUTAGE)
+    network.set_down(SERVER, False)
+    await asyncio.sleep(hours * 3600 - fleet.outage[1])
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    fleet.connections = network.connections
+    return fleet
+
+def _run(kiosks: int, hours: float, seed: int):
+    loop = VirtualEventLoop()
+    try:
+        started = time.perf_counter()
+        fleet = loop.run_until_complete(_simulate(kiosks, hours, seed))
+        return fleet, time.perf_counter() - started
+    finally:
+        loop.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kiosks', type=int, default=50)
+    parser.add_argument('--hours', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', action='store_true', help='run again and compare the digests')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger('client').setLevel(logging.CRITICAL)  # every kiosk logs its failed attempts in the outage
+    fleet, elapsed = _run(args.kiosks, args.hours, args.seed)
+    digest = hashlib.sha256('\n'.join(fleet.trace).encode()).hexdigest()[:16]
+    kiosk_hours = args.kiosks * args.hours
+    print(f"{args.kiosks} kiosks x {args.hours:g} h = {kiosk_hours:.0f} kiosk-hours in {elapsed:.1f} s "
+          f"({kiosk_hours * 3600 / elapsed:.0f}x real time), {len(fleet.trace)} events, {fleet.connections} connections")
+    p50, p99, worst = _percentiles([abs(error) for error in fleet.end_errors])
+    early = sum(1 for error in fleet.end_errors if error < 0)
+    print(f"session end  {len(fleet.end_errors)} sessions, |kiosk - server| p50/p99/max "
+          f"{p50 * 1000:.0f}/{p99 * 1000:.0f}/{worst * 1000:.0f} ms, {early} locked early, "
+          f"{fleet.legacy} without a deadline")
+    p50, p99, worst = _percentiles(fleet.reconnects)
+    print(f"reconnect    after a {OUTAGE}s outage: {len(fleet.reconnects)} kiosks back, p50/p99/max "
+          f"{p50:.1f}/{p99:.1f}/{worst:.1f} s; {fleet.unreachable} told the user it is unreachable")
+    print(f"drops        {fleet.drops} outside the outage")
+    print(f"digest       {digest}")
+    failed = []
+    if fleet.end_errors and max(abs(error) for error in fleet.end_errors) > 1.0:
+        failed.append('a kiosk ended its session more than a second away from the server')
+    if fleet.drops:
+        failed.append('connections dropped outside the outage')
+    if len(fleet.reconnects) < args.kiosks:
+        failed.append('not every kiosk reconnected after the outage')
+    if fleet.unreachable:
+        failed.append(f'kiosks gave up on the server during a {OUTAGE}s outage')
+    if args.repeat:
+        again, _ = _run(args.kiosks, args.hours, args.seed)
+        same = hashlib.sha256('\n'.join(again.trace).encode()).hexdigest()[:16] == digest
+        print(f"repeat       {'same digest' if same else 'DIFFERENT digest'}")
+        if not same:
+            failed.append('the rerun did not repeat the first run')
+    for failure in failed:
+        print(f"FAILED: {failure}")
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: TLS handshake cost for kiosks, full handshake vs session resumption.
+
+Client and server handshake in memory (ssl.MemoryBIO, no sockets) with the
+contexts from shared/tls.py and a self-signed RSA certificate, and the CPU
+time each side spends is measured:
+  full       no session to offer
+  resumed    the kiosk offers the ticket from its previous connection
+  elsewhere  a new server context, as on another worker or after a server
+             restart: ticket keys are per process, so the old ticket is
+             rejected once and the handshake falls back to full
+
+Run from the repository root:
+    python -m benchmarks.bench_tls [--handshakes 2000]
+"""
+import argparse
+import hashlib
+import os
+import ssl
+import subprocess
+import tempfile
+import time
+from shared.tls import client_context, server_context
+
+def _make_certificate(directory: str):
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+         '-keyout', key, '-out', cert, '-days', '1', '-subj', '/CN=kiosk-server'],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return cert, key
+
+def _handshake(client_ctx, server_ctx, times):
+    """One connection: handshake, a server message (which carries the TLS 1.3 ticket), remember the session."""
+    c_in, c_out, s_in, s_out = ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO()
+    client = client_ctx.wrap_bio(c_in, c_out)
+    server = server_ctx.wrap_bio(s_in, s_out, server_side=True)
+    client_done = server_done = False
+    while not (client_done and server_done):
+        started = time.process_time()
+        try:
+            client.do_handshake()
+            client_done = True
+        except ssl.SSLWantReadError:
+            pass
+        times[0] += time.process_time() - started
+        s_in.write(c_out.read())
+        started = time.process_time()
+        try:
+            server.do_handshake()
+            server_done = True
+        except ssl.SSLWantReadError:
+            pass
+        times[1] += time.process_time() - started
+        c_in.write(s_out.read())
+    started = time.process_time()
+    server.write(b'{"type":"handshake"}\n')
+    times[1] += time.process_time() - started
+    c_in.write(s_out.read())
+    started = time.process_time()
+    client.read(1024)
+    client_ctx.verify(client)
+    client_ctx.remember(client)
+    times[0] += time.process_time() - started
+    return client.session_reused
+
+def _phase(name: str, handshakes: int, client_ctx, server_ctx, reuse: bool) -> float:
+    times, resumed = [0.0, 0.0], 0
+    for _ in range(handshakes):
+        if not reuse:
+            client_ctx.session = None
+        resumed += _handshake(client_ctx, server_ctx, times)
+    print(f"{name:<9} client={times[0] / handshakes * 1e6:7.0f}us  server={times[1] / handshakes * 1e6:7.0f}us  "
+          f"resumed={resumed}/{handshakes}")
+    return times[1] / handshakes
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--handshakes', type=int, default=2000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = _make_certificate(tmp)
+        with open(cert) as f:
+            pin = hashlib.sha256(ssl.PEM_cert_to_DER_cert(f.read())).hexdigest()
+        # The kiosk pins the server certificate, as client_config.json would
+        client_ctx = client_context({'pin_sha256': pin})
+        server_ctx = server_context(cert, key)
+        full = _phase('full', args.handshakes, client_ctx, server_ctx, False)
+        resumed = _phase('resumed', args.handshakes, client_ctx, server_ctx, True)
+        _phase('elsewhere', 1, client_ctx, server_context(cert, key), True)
+    print(f"server cpu per resumed handshake: {resumed / full:.2f}x of full")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: server-side receive throughput, StreamReader.readline() vs FrameProtocol.
+
+A separate process streams pre-encoded CLIENT_STATUS frames over a local TCP
+connection; the server side decodes them either with one readline/json.loads
+per message (the old path) or with FrameProtocol's batched decoding.
+
+Run from the repository root:
+    python -m benchmarks.bench_transport [--messages 200000]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+from shared.protocol import create_client_status, encode_message
+from shared.transport import FrameProtocol
+
+def _sender(port: int, messages: int):
+    frame = encode_message(create_client_status('pc1', 'active', ['game.exe', 'browser.exe'], 1800))
+    blob = frame * messages
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        sock.sendall(blob)
+
+async def _run(mode: str, messages: int) -> float:
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    count = 0
+    started = None
+
+    async def stream_handler(reader, writer):
+        nonlocal count, started
+        while count < messages:
+            data = await reader.readline()
+            if not data:
+                break
+            if started is None:
+                started = time.perf_counter()
+            json.loads(data.decode().strip())
+            count += 1
+        done.set_result(time.perf_counter() - started)
+        writer.close()
+
+    def on_frames(protocol, frames):
+        nonlocal count, started
+        if started is None:
+            started = time.perf_counter()
+        count += len(frames)
+        if count >= messages and not done.done():
+            done.set_result(time.perf_counter() - started)
+
+    if mode == 'streamreader':
+        server = await asyncio.start_server(stream_handler, '127.0.0.1', 0)
+    else:
+        server = await loop.create_server(lambda: FrameProtocol(on_frames), '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    sender = multiprocessing.Process(target=_sender, args=(port, messages))
+    sender.start()
+    elapsed = await done
+    sender.join()
+    server.close()
+    await server.wait_closed()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200_000)
+    args = parser.parse_args()
+    results = {}
+    for mode in ('streamreader', 'frameprotocol'):
+        elapsed = asyncio.run(_run(mode, args.messages))
+        results[mode] = args.messages / elapsed
+        print(f"{mode:<14} {results[mode]:12.0f} messages/s")
+    print(f"speedup        {results['frameprotocol'] / results['streamreader']:12.2f}x")
+
+if __name__ == '__main__':
+    main()
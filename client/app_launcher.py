@@ -0,0 +1,233 @@
+"""
+Launcher that tracks the processes and windows of launched applications.
+"""
+import ctypes
+import ctypes.wintypes
+import logging
+import os
+import subprocess
+from typing import Callable, Dict, List, Optional, Set
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# WinEvent constants (winuser.h)
+EVENT_OBJECT_DESTROY = 0x8001
+EVENT_OBJECT_SHOW = 0x8002
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+OBJID_WINDOW = 0
+CHILDID_SELF = 0
+GA_ROOT = 2
+
+# How far up the parent chain an unknown window's process is checked
+MAX_ANCESTOR_DEPTH = 4
+
+class AppLauncher:
+    """Launches apps and keeps pid->app and hwnd->app indexes up to date.
+
+    Processes are tracked from the moment they are launched. Descendants (e.g.
+    a game spawned by its launcher or by ``cmd /c``) are adopted when one of
+    their windows appears, by walking the new window's parent chain, so the
+    desktop never needs to be enumerated to find an app's windows. Pids found
+    to be foreign are remembered only while they have a window shown, and are
+    handed to ``on_foreign_window`` once per window (e.g. to hide blocked ones).
+    """
+
+    def __init__(self):
+        self.pid_to_app: Dict[int, str] = {}
+        self.hwnd_to_app: Dict[int, str] = {}
+        self.app_pids: Dict[str, Set[int]] = {}
+        self.app_hwnds: Dict[str, List[int]] = {}
+        self.app_windows: Dict[str, int] = {}  # app name -> main (oldest live) window
+        self.processes: Dict[int, subprocess.Popen] = {}
+        self._foreign_pids: Dict[int, Set[int]] = {}  # pid -> its shown windows
+        self._foreign_hwnds: Dict[int, int] = {}  # hwnd -> pid
+        self.on_window_added: Optional[Callable[[str, int], None]] = None
+        self.on_window_removed: Optional[Callable[[str, int], None]] = None
+        self.on_foreign_window: Optional[Callable[[int, int], None]] = None  # (hwnd, pid)
+
+    def launch(self, app_name: str, app_path: str) -> subprocess.Popen:
+        """Start an app and record its process."""
+        if os.path.isfile(app_path):
+            process = subprocess.Popen([app_path], cwd=os.path.dirname(app_path) or None)
+        else:
+            # Command lines and shell targets (URLs, .lnk) still need the shell
+            process = subprocess.Popen(app_path, shell=True)
+        self.processes[process.pid] = process
+        self.track(app_name, process.pid)
+        return process
+
+    def track(self, app_name: str, pid: int):
+        """Record pid as belonging to app_name."""
+        self.pid_to_app[pid] = app_name
+        self.app_pids.setdefault(app_name, set()).add(pid)
+        self._forget_foreign(pid)
+
+    def app_for_pid(self, pid: int) -> Optional[str]:
+        """Return the app owning pid, adopting it if an ancestor is tracked."""
+        app_name = self.pid_to_app.get(pid)
+        if app_name is not None or pid in self._foreign_pids:
+            return app_name
+        try:
+            ancestor = psutil.Process(pid)
+            for _ in range(MAX_ANCESTOR_DEPTH):
+                ancestor = ancestor.parent()
+                if ancestor is None:
+                    break
+                app_name = self.pid_to_app.get(ancestor.pid)
+                if app_name is not None:
+                    self.track(app_name, pid)
+                    return app_name
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        self._foreign_pids.setdefault(pid, set())
+        return None
+
+    def app_for_window(self, hwnd: int) -> Optional[str]:
+        return self.hwnd_to_app.get(hwnd)
+
+    def window_for(self, app_name: str) -> Optional[int]:
+        return self.app_windows.get(app_name)
+
+    def window_shown(self, hwnd: int, pid: int) -> Optional[str]:
+        """Index a newly shown top-level window. Returns its app, if it is one of ours."""
+        if hwnd in self.hwnd_to_app:
+            return self.hwnd_to_app[hwnd]
+        if hwnd in self._foreign_hwnds:
+            return None
+        app_name = self.app_for_pid(pid)
+        if app_name is None:
+            self._foreign_pids[pid].add(hwnd)
+            self._foreign_hwnds[hwnd] = pid
+            if self.on_foreign_window:
+                self.on_foreign_window(hwnd, pid)
+            return None
+        self.hwnd_to_app[hwnd] = app_name
+        self.app_hwnds.setdefault(app_name, []).append(hwnd)
+        self.app_windows.setdefault(app_name, hwnd)
+        if self.on_window_added:
+            self.on_window_added(app_name, hwnd)
+        return app_name
+
+    def window_destroyed(self, hwnd: int) -> Optional[str]:
+        """Drop a destroyed window from the indexes."""
+        app_name = self.hwnd_to_app.pop(hwnd, None)
+        if app_name is None:
+            pid = self._foreign_hwnds.pop(hwnd, None)
+            hwnds = self._foreign_pids.get(pid)
+            if hwnds is not None:
+                hwnds.discard(hwnd)
+                if not hwnds:
+                    # A later window of a reused pid is classified afresh
+                    del self._foreign_pids[pid]
+            return None
+        hwnds = self.app_hwnds.get(app_name, [])
+        if hwnd in hwnds:
+            hwnds.remove(hwnd)
+        if self.app_windows.get(app_name) == hwnd:
+            if hwnds:
+                self.app_windows[app_name] = hwnds[0]
+            else:
+                del self.app_windows[app_name]
+        if self.on_window_removed:
+            self.on_window_removed(app_name, hwnd)
+        return app_name
+
+    def process_exited(self, pid: int):
+        """Forget an exited process."""
+        self.processes.pop(pid, None)
+        self._forget_foreign(pid)
+        app_name = self.pid_to_app.pop(pid, None)
+        if app_name is not None:
+            pids = self.app_pids.get(app_name)
+            if pids is not None:
+                pids.discard(pid)
+                if not pids:
+                    del self.app_pids[app_name]
+
+    def _forget_foreign(self, pid: int):
+        for hwnd in self._foreign_pids.pop(pid, ()):
+            self._foreign_hwnds.pop(hwnd, None)
+
+    def reap(self):
+        """Forget processes that have exited. Only looks at pids seen by this launcher."""
+        for pid in list(self.pid_to_app):
+            process = self.processes.get(pid)
+            alive = process.poll() is None if process else psutil.pid_exists(pid)
+            if not alive:
+                self.process_exited(pid)
+        for pid in list(self._foreign_pids):
+            if not psutil.pid_exists(pid):
+                self.process_exited(pid)
+
+    def tracked_pids(self) -> Set[int]:
+        """All pids started by this launcher or adopted as descendants."""
+        return set(self.pid_to_app)
+
+    def clear(self):
+        """Forget everything, e.g. after the session has been torn down."""
+        self.pid_to_app.clear()
+        self.hwnd_to_app.clear()
+        self.app_pids.clear()
+        self.app_hwnds.clear()
+        self.app_windows.clear()
+        self.processes.clear()
+        self._foreign_pids.clear()
+        self._foreign_hwnds.clear()
+
+WINEVENTPROC = ctypes.WINFUNCTYPE(
+    None,
+    ctypes.wintypes.HANDLE,
+    ctypes.wintypes.DWORD,
+    ctypes.wintypes.HWND,
+    ctypes.wintypes.LONG,
+    ctypes.wintypes.LONG,
+    ctypes.wintypes.DWORD,
+    ctypes.wintypes.DWORD
+) if hasattr(ctypes, 'WINFUNCTYPE') else None
+
+class WindowEventHook:
+    """Feeds window show/destroy events into an AppLauncher.
+
+    Uses an out-of-context WinEvent hook, which is delivered through the
+    installing thread's message queue, i.e. the Qt event loop.
+    """
+
+    def __init__(self, launcher: AppLauncher):
+        self.launcher = launcher
+        self.hook = None
+        self._proc = None
+
+    def install(self):
+        if self.hook:
+            return
+        user32 = ctypes.windll.user32
+        self._proc = WINEVENTPROC(self._callback)
+        self.hook = user32.SetWinEventHook(
+            EVENT_OBJECT_DESTROY, EVENT_OBJECT_SHOW, 0, self._proc, 0, 0,
+            WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS
+        )
+        if not self.hook:
+            logger.error("SetWinEventHook failed; launched app windows will not be tracked")
+
+    def uninstall(self):
+        if self.hook:
+            ctypes.windll.user32.UnhookWinEvent(self.hook)
+            self.hook = None
+
+    def _callback(self, hook, event, hwnd, id_object, id_child, thread_id, event_time):
+        if id_object != OBJID_WINDOW or id_child != CHILDID_SELF or not hwnd:
+            return
+        try:
+            if event == EVENT_OBJECT_DESTROY:
+                self.launcher.window_destroyed(hwnd)
+                return
+            user32 = ctypes.windll.user32
+            if user32.GetAncestor(hwnd, GA_ROOT) != hwnd:
+                return
+            pid = ctypes.wintypes.DWORD()
+            user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            self.launcher.window_shown(hwnd, pid.value)
+        except Exception as e:
+            logger.error(f"Error handling window event: {e}")
@@ -0,0 +1,158 @@
+"""
+Local content-addressed store of assets (icons) fetched from the server.
+"""
+import base64
+import hashlib
+import logging
+import os
+import re
+from collections import deque
+from typing import Callable, Deque, Iterable, Optional, Set
+from shared.constants import ASSET_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), 'assets')
+CHUNK_WINDOW = 4  # chunk requests in flight per transfer
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+_PARTIAL = '.part'
+
+class AssetCache:
+    """Blobs named by SHA-256. Downloads grow <digest>.part and are renamed once verified."""
+
+    def __init__(self, directory: str = ASSETS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest: str) -> Optional[str]:
+        """Local file of a complete asset, or None if it has not been fetched."""
+        if not _DIGEST.match(digest or ''):
+            return None
+        path = os.path.join(self.directory, digest)
+        return path if os.path.exists(path) else None
+
+    def partial_size(self, digest: str) -> int:
+        """Bytes of an interrupted download already on disk."""
+        try:
+            return os.path.getsize(os.path.join(self.directory, digest + _PARTIAL))
+        except OSError:
+            return 0
+
+    def write(self, digest: str, offset: int, data: bytes, total: int) -> Optional[bool]:
+        """Store a chunk. Returns True once the asset is complete and verified, False if it failed
+        verification (the partial file is discarded), None while incomplete."""
+        partial = os.path.join(self.directory, digest + _PARTIAL)
+        with open(partial, 'r+b' if os.path.exists(partial) else 'wb') as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate(offset + len(data))
+        if offset + len(data) < total:
+            return None
+        sha = hashlib.sha256()
+        with open(partial, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        if sha.hexdigest() != digest:
+            logger.error(f"Asset {digest} failed verification; discarding it")
+            os.remove(partial)
+            return False
+        os.replace(partial, os.path.join(self.directory, digest))
+        return True
+
+    def gc(self, referenced: Iterable[str]) -> int:
+        """Delete blobs and partial downloads that are not referenced. Returns the number removed."""
+        keep = set(referenced)
+        removed = 0
+        for name in os.listdir(self.directory):
+            digest = name[:-len(_PARTIAL)] if name.endswith(_PARTIAL) else name
+            if _DIGEST.match(digest) and digest not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Could not remove unreferenced asset {name}: {e}")
+        if removed:
+            logger.info(f"Removed {removed} unreferenced assets")
+        return removed
+
+class AssetFetcher:
+    """Fetches missing assets one at a time, CHUNK_WINDOW chunks in flight.
+
+    ``request(digest, offset)`` sends an ASSET_REQUEST; ``received`` takes the
+    ASSET_CHUNK answers, which arrive in request order. A transfer cut off by
+    a disconnect resumes from the partial file after ``restart``.
+    """
+
+    def __init__(self, cache: AssetCache, request: Callable[[str, int], None],
+                 on_ready: Optional[Callable[[str], None]] = None):
+        self.cache = cache
+        self.request = request
+        self.on_ready = on_ready
+        self._queue: Deque[str] = deque()
+        self._queued: Set[str] = set()
+        self._current: Optional[str] = None
+        self._total: Optional[int] = None
+        self._next_offset = 0  # first byte not yet requested
+        self._in_flight = 0
+
+    def want(self, digests: Iterable[str]):
+        """Queue the assets that are neither stored nor already queued, and start fetching."""
+        for digest in digests:
+            if digest and digest not in self._queued and self.cache.path(digest) is None:
+                self._queue.append(digest)
+                self._queued.add(digest)
+        if self._current is None:
+            self._start_next()
+
+    def restart(self):
+        """The connection was replaced: requests in flight are lost, ask again from what is on disk."""
+        if self._current is not None:
+            self._queue.appendleft(self._current)
+            self._current = None
+        self._start_next()
+
+    def received(self, message):
+        """Handle an ASSET_CHUNK message."""
+        if message.sha256 != self._current:
+            return  # answer to a request from before a restart
+        self._in_flight -= 1
+        if message.size is None:
+            logger.error(f"Server does not have asset {message.sha256}")
+            self._finish()
+            return
+        self._total = message.size
+        data = base64.b64decode(message.data or '')
+        done = self.cache.write(message.sha256, message.offset, data, message.size)
+        if done is None:
+            self._fill_window()
+            return
+        digest = self._current
+        self._finish()
+        if done and self.on_ready is not None:
+            self.on_ready(digest)
+
+    def _start_next(self):
+        while self._queue:
+            digest = self._queue.popleft()
+            if self.cache.path(digest) is not None:
+                self._queued.discard(digest)
+                continue
+            self._current = digest
+            self._total = None
+            self._next_offset = self.cache.partial_size(digest)
+            self._in_flight = 0
+            self._fill_window()
+            return
+
+    def _fill_window(self):
+        # Until the first answer gives the size, ask for one chunk only
+        window = CHUNK_WINDOW if self._total is not None else 1
+        while self._in_flight < window and (self._total is None or self._next_offset < self._total):
+            self.request(self._current, self._next_offset)
+            self._next_offset += ASSET_CHUNK_SIZE
+            self._in_flight += 1
+
+    def _finish(self):
+        self._queued.discard(self._current)
+        self._current = None
+        self._start_next()
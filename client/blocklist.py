@@ -0,0 +1,169 @@
+"""
+Blocked-process enforcement: terminates blocked programs as soon as they start.
+"""
+import fnmatch
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import psutil
+
+logger = logging.getLogger(__name__)
+
+SCAN_INTERVAL = 0.5  # seconds between process table diffs
+HASH_PREFIX = 'sha256:'
+
+class BlocklistMatcher:
+    """Blocklist rules compiled for fast matching of process names.
+
+    Rules are case-insensitive and one of:
+      - a plain name ("cmd.exe"): looked up in a set
+      - a wildcard pattern ("*cheat*.exe", "psexe?.exe"): all patterns are
+        folded into one precompiled regex
+      - "sha256:<hex>" of the executable: catches renamed copies; hashes are
+        computed only when such rules exist, once per executable file
+    """
+
+    def __init__(self, rules: Iterable[str]):
+        names: Set[str] = set()
+        patterns: List[str] = []
+        hashes: Set[str] = set()
+        for rule in rules:
+            rule = rule.strip().lower()
+            if not rule:
+                continue
+            if rule.startswith(HASH_PREFIX):
+                hashes.add(rule[len(HASH_PREFIX):])
+            elif any(c in rule for c in '*?['):
+                patterns.append(fnmatch.translate(rule))
+            else:
+                names.add(rule)
+        self.names = frozenset(names)
+        self.pattern = re.compile('|'.join(patterns)) if patterns else None
+        self.hashes = frozenset(hashes)
+        self._file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.names or self.pattern or self.hashes)
+
+    def match_name(self, name: str) -> bool:
+        name = name.lower()
+        return name in self.names or (self.pattern is not None and self.pattern.match(name) is not None)
+
+    def match_executable(self, path: Optional[str]) -> bool:
+        if not self.hashes or not path:
+            return False
+        try:
+            stat = os.stat(path)
+            key = (path, stat.st_size, stat.st_mtime_ns)
+            digest = self._file_hashes.get(key)
+            if digest is None:
+                sha = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        sha.update(chunk)
+                digest = sha.hexdigest()
+                self._file_hashes[key] = digest
+        except OSError:
+            return False
+        return digest in self.hashes
+
+def _describe(pid: int, with_exe: bool) -> Tuple[str, Optional[str]]:
+    """Name of a process, and its executable path if asked for."""
+    process = psutil.Process(pid)
+    if not with_exe:
+        return process.name(), None
+    with process.oneshot():
+        name = process.name()
+        try:
+            exe = process.exe()
+        except (psutil.AccessDenied, OSError):
+            exe = None
+    return name, exe
+
+def _terminate(pid: int):
+    psutil.Process(pid).terminate()
+
+class BlocklistEnforcer:
+    """Watches for new processes and terminates the ones the matcher blocks.
+
+    Each ``scan`` lists the pids (cheap: one system call) and diffs them
+    against the previous scan; only new pids are looked up and matched, so
+    a quiet machine costs a set difference per pass whatever its size.
+    Unlike window hiding, this also catches console-less and hidden
+    processes. A pid that is reused between two scans is not noticed, which
+    at SCAN_INTERVAL means a blocked program gets at most one interval.
+
+    Names of live processes are kept (``name_of``) for other callers that
+    would otherwise look them up again.
+    """
+
+    def __init__(
+        self,
+        matcher: BlocklistMatcher,
+        list_pids: Callable[[], Iterable[int]] = psutil.pids,
+        describe: Callable[[int, bool], Tuple[str, Optional[str]]] = _describe,
+        terminate: Callable[[int], None] = _terminate,
+        on_blocked: Optional[Callable[[int, str], None]] = None,
+    ):
+        self.matcher = matcher
+        self.list_pids = list_pids
+        self.describe = describe
+        self.terminate = terminate
+        self.on_blocked = on_blocked
+        self.exempt = {os.getpid()}
+        self._known: Set[int] = set()
+        self._names: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def name_of(self, pid: int) -> Optional[str]:
+        return self._names.get(pid)
+
+    def scan(self) -> List[Tuple[int, str]]:
+        """One pass: match processes started since the last one; returns the (pid, name) terminated."""
+        pids = set(self.list_pids())
+        names = self._names
+        for pid in self._known - pids:
+            names.pop(pid, None)
+        blocked = []
+        with_exe = bool(self.matcher.hashes)
+        for pid in pids - self._known:
+            if pid in self.exempt:
+                continue
+            try:
+                name, exe = self.describe(pid, with_exe)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            names[pid] = name
+            if self.matcher.match_name(name) or self.matcher.match_executable(exe):
+                try:
+                    self.terminate(pid)
+                except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
+                    logger.warning(f"Could not terminate blocked process {name} ({pid}): {e}")
+                    continue
+                logger.warning(f"Terminated blocked process {name} ({pid})")
+                blocked.append((pid, name))
+        self._known = pids
+        if blocked and self.on_blocked is not None:
+            for pid, name in blocked:
+                self.on_blocked(pid, name)
+        return blocked
+
+    def start(self, interval: float = SCAN_INTERVAL):
+        """Scan every interval on a daemon thread until ``stop``."""
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.scan()
+                except Exception as e:
+                    logger.error(f"Blocklist scan failed: {e}")
+                self._stop.wait(interval)
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name='blocklist', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
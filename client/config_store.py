@@ -0,0 +1,128 @@
+"""
+Crash-safe local store for the allowed apps list.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WRITE_RETRY_DELAY = 5.0  # seconds before a failed write is tried again (a newer list is written at once)
+
+class AllowedAppsStore:
+    """Persists the allowed apps list off the UI thread.
+
+    Writes go to a temp file that is fsynced and renamed over the target, so a
+    power cut leaves either the old or the new list on disk, never a torn one.
+    Saves are coalesced: only the newest pending list is written, and a list
+    whose content hash matches the file on disk is not written at all. A list
+    that fails to write stays pending and is retried; ``error`` holds the
+    failure until a write succeeds.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0
+        self._written_hash: Optional[str] = None
+        self._pending: Optional[Tuple[bytes, str]] = None
+        self.error: Optional[Exception] = None  # why the last write failed
+        self._attempts = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer_loop, name='AllowedAppsStore', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _encode(apps: List[Dict[str, str]], version: int) -> bytes:
+        return json.dumps({'version': version, 'apps': apps}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def load(self) -> Tuple[int, List[Dict[str, str]]]:
+        """Return (version, apps) from disk, or (0, []) if there is no usable file."""
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            data = json.loads(raw)
+        except FileNotFoundError:
+            return 0, []
+        except Exception as e:
+            logger.error(f"Error loading allowed apps from {self.path}: {e}")
+            return 0, []
+        if isinstance(data, list):
+            # Pre-versioned file written with indent=2
+            version, apps = 0, data
+        else:
+            version, apps = int(data.get('version') or 0), data.get('apps') or []
+        with self._cond:
+            self.version = version
+            self._written_hash = hashlib.sha256(self._encode(apps, version)).hexdigest()
+        return version, apps
+
+    def save(self, apps: List[Dict[str, str]], version: Optional[int] = None) -> bool:
+        """Queue apps for writing. Returns False if they match what is already on disk."""
+        if version is None:
+            version = self.version
+        payload = self._encode(apps, version)
+        digest = hashlib.sha256(payload).hexdigest()
+        with self._cond:
+            self.version = version
+            if self._pending is None and digest == self._written_hash:
+                return False
+            self._pending = (payload, digest)
+            self._cond.notify()
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued writes are on disk. Returns False on timeout or a failed write (see ``error``)."""
+        with self._cond:
+            attempts = self._attempts
+            self._cond.wait_for(lambda: self._pending is None or (self._attempts != attempts and self.error is not None), timeout)
+            return self._pending is None
+
+    def close(self):
+        """Flush pending writes and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._closed)
+                if self._pending is None:
+                    return
+                payload, digest = self._pending
+                unchanged = digest == self._written_hash
+            error = None
+            if not unchanged:
+                try:
+                    self._write_atomic(payload)
+                except Exception as e:
+                    logger.error(f"Error saving allowed apps: {e}")
+                    error = e
+            with self._cond:
+                self._attempts += 1
+                self.error = error
+                if error is None:
+                    self._written_hash = digest
+                    # A newer list may have been queued while we were writing
+                    if self._pending is not None and self._pending[1] == digest:
+                        self._pending = None
+                self._cond.notify_all()
+                if error is not None:
+                    if self._closed:
+                        return  # not saved; the file on disk still holds the previous list
+                    self._cond.wait(WRITE_RETRY_DELAY)
+
+    def _write_atomic(self, payload: bytes):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,376 @@
+"""
+The kiosk's connection to the server and the session it runs there, without the desktop.
+"""
+import asyncio
+import logging
+import ssl
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+from shared.clock_sync import ClockSync
+from shared.constants import CONNECT_TIMEOUT, HEARTBEAT_INTERVAL, Capability, JournalEvent
+from shared.protocol import (
+    HEARTBEAT_FRAME, LEGACY_FEATURES, Message, MessageType, SessionState,
+    create_ack, create_client_status, create_clock_heartbeat, create_handshake, create_heartbeat, create_journal,
+    decode_message, encode_frame, encode_message, negotiate
+)
+from shared.tls import ClientContext
+from .server_list import ServerList
+from .session_countdown import SessionCountdown
+from .session_journal import SessionJournal
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_TICK_INTERVAL = 30  # seconds between journaled ticks while offline
+
+OpenConnection = Callable[..., Awaitable[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]]
+Timer = Callable[[float, Callable[[], None]], asyncio.TimerHandle]
+
+class KioskConnection:
+    """Everything KioskClient does on the network, and the session countdown.
+
+    Connects to the servers in ``servers`` in turn (retrying until one
+    answers), handshakes, keeps the connection alive with heartbeats and
+    clock samples, applies and acknowledges session commands, counts the
+    session down and journals events while offline. The desktop hooks in
+    through the ``on_*`` callbacks; messages this class does not handle go
+    to ``on_message``, and an exception raised there NACKs the command.
+
+    Clocks, timers (``call_later``) and ``open_connection`` can be replaced,
+    so benchmarks/bench_simulation.py runs a fleet of these in virtual time.
+    """
+
+    def __init__(
+        self,
+        servers: ServerList,
+        client_ip: str,
+        journal: Optional[SessionJournal] = None,
+        tls: Optional[ClientContext] = None,
+        open_connection: OpenConnection = asyncio.open_connection,
+        monotonic: Callable[[], float] = time.monotonic,
+        wall: Callable[[], float] = time.time,
+        call_later: Optional[Timer] = None
+    ):
+        self.servers = servers
+        self.client_ip = client_ip
+        self.journal = journal  # session events recorded while the server is unreachable; None: not kept
+        self.tls = tls  # None = plain TCP
+        self.open_connection = open_connection
+        self.monotonic = monotonic
+        self.wall = wall
+        self.call_later = call_later or (lambda delay, callback: asyncio.get_event_loop().call_later(delay, callback))
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.connected = False
+        self.redirected = False  # the connection was closed to follow a server redirect
+        self.client_id: Optional[str] = None
+        self.handshake = None
+        self.features = LEGACY_FEATURES
+        self.resume_token = None  # lets a reconnect pick up where this connection left off
+        self.last_seq = None
+        self.journal_upload = None  # (msg_id, journal mark) of the upload the server has yet to ACK
+        self.upload_id = 0
+        self.state = SessionState.INACTIVE
+        self.countdown = SessionCountdown(monotonic, wall)
+        self.clock = ClockSync(wall)  # round trip and clock offset to the server, per connection
+        self.heartbeat_interval = HEARTBEAT_INTERVAL
+        self.last_sent = 0.0  # monotonic time of the last frame written; any frame proves liveness
+        self.heartbeat_timer: Optional[asyncio.TimerHandle] = None
+        self.session_timer: Optional[asyncio.TimerHandle] = None
+        self.tick_due = 0.0  # monotonic time of the next session tick; the timer keeps its period
+        self.apps_version: Callable[[], Optional[int]] = lambda: None
+        self.active_apps: Callable[[], List[str]] = lambda: []
+        self.on_connected: Optional[Callable[[], None]] = None
+        self.on_handshake: Optional[Callable[[Message], None]] = None
+        self.on_disconnected: Optional[Callable[[bool], None]] = None  # called with True after a redirect
+        self.on_unreachable: Optional[Callable[[], None]] = None  # once per outage, after UNREACHABLE_AFTER
+        self.on_servers: Optional[Callable[[List[str]], None]] = None  # the server changed the list
+        self.on_session: Optional[Callable[[Message], None]] = None  # SESSION_START, _PAUSE or _RESUME applied
+        self.on_session_end: Optional[Callable[[], None]] = None
+        self.on_time_left: Optional[Callable[[int], None]] = None  # every second of a running session
+        self.on_message: Optional[Callable[[Message], None]] = None
+
+    @property
+    def online(self) -> bool:
+        return self.connected and self.writer is not None and not self.writer.is_closing()
+
+    def start(self) -> asyncio.Task:
+        return asyncio.ensure_future(self.connect())
+
+    async def connect(self):
+        """Connect to the first server that answers. A server that cannot be reached is skipped for the
+        next one at once; ServerList.failed says how long to wait after every one has been tried."""
+        attempt = 0
+        told = False
+        while True:
+            host, port = self.servers.current
+            attempt += 1
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    self.open_connection(host, port, ssl=self.tls),
+                    CONNECT_TIMEOUT
+                )
+                if self.tls:
+                    try:
+                        self.tls.verify(self.writer.get_extra_info('ssl_object'))
+                    except ssl.SSLError:
+                        self.writer.close()
+                        raise
+                self.servers.connected()
+                self.connected = True
+                self.clock = ClockSync(self.wall)
+                # Send handshake; client_ip keeps it readable by legacy servers.
+                # Until the server answers with its own handshake we speak the legacy format.
+                self.features = LEGACY_FEATURES
+                self.heartbeat_interval = HEARTBEAT_INTERVAL
+                self.handshake = create_handshake(
+                    self.client_id, self.client_ip, self.apps_version(), self.resume_token, self.last_seq
+                )
+                self.write(encode_message(self.handshake))
+                if self.on_connected is not None:
+                    self.on_connected()
+                await self.writer.drain()
+                self._start_heartbeats()
+                asyncio.ensure_future(self._receive_messages(self.reader))
+                return
+            except Exception as e:
+                logger.error(f"Connection attempt {attempt} to {host}:{port} failed: {e!r}")
+                self.connected = False
+                delay = self.servers.failed()
+                if self.servers.unreachable and not told:
+                    told = True
+                    if self.state in (SessionState.ACTIVE, SessionState.PAUSED):
+                        # Events are journaled until the server is back
+                        logger.warning("Server unreachable; continuing session offline")
+                    if self.on_unreachable is not None:
+                        self.on_unreachable()
+                if delay:
+                    await asyncio.sleep(delay)
+
+    async def _receive_messages(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                data = await reader.readline()
+                if not data:
+                    break
+                try:
+                    logger.info(f"Received: {data!r}")
+                    message = decode_message(data, self.features)
+                except Exception as e:
+                    logger.error(f"Error decoding message: {e}")
+                    continue
+                if message.seq is not None:
+                    if self.last_seq is not None and message.seq <= self.last_seq:
+                        # Already applied before the reconnect; the ack may have been lost with the connection
+                        self._acknowledge(message)
+                        continue
+                    self.last_seq = message.seq
+                error = None
+                try:
+                    self._handle_message(message)
+                except Exception as e:
+                    logger.error(f"Error handling message: {e}")
+                    error = str(e) or type(e).__name__
+                self._acknowledge(message, error)
+        except Exception as e:
+            logger.error(f"Error receiving messages: {e}")
+        if reader is self.reader:
+            self._handle_disconnect()
+
+    def _handle_message(self, message: Message):
+        if message.type == MessageType.HANDSHAKE:
+            self.features = negotiate(self.handshake, message)
+            if message.client_id:
+                self.client_id = message.client_id
+            if message.resume_token:
+                self.resume_token = message.resume_token
+            if not message.resumed:
+                self.last_seq = None
+            if self.tls:
+                self.tls.remember(self.writer.get_extra_info('ssl_object'))
+            if message.heartbeat_interval and self.features.supports(Capability.HEARTBEAT):
+                self._set_heartbeat_interval(message.heartbeat_interval)
+            if self.features.supports(Capability.CLUSTER) and self.servers.replace(message.servers):
+                self._servers_changed()
+            logger.info(f"Negotiated protocol v{self.features.version} ({self.features.codec}, "
+                        f"capabilities: {sorted(self.features.capabilities)})")
+            if self.features.supports(Capability.CLOCK):
+                self._send_clock()
+            self._upload_journal()
+            if self.on_handshake is not None:
+                self.on_handshake(message)
+        elif message.type == MessageType.SESSION_START:
+            self.state = SessionState.ACTIVE
+            self.countdown.start(message.duration or 0, message.deadline)
+            self._session_changed(message)
+            self._start_session_timer(0)
+            self.report_event(JournalEvent.STATUS, {'state': self.state})
+        elif message.type == MessageType.SESSION_PAUSE:
+            self.state = SessionState.PAUSED
+            self.countdown.pause()
+            self._stop_session_timer()
+            self._session_changed(message)
+            self.report_event(JournalEvent.STATUS, {'state': self.state})
+        elif message.type == MessageType.SESSION_RESUME:
+            self.state = SessionState.ACTIVE
+            self.countdown.set_deadline(message.deadline)
+            self._session_changed(message)
+            self._start_session_timer(1)
+            self.report_event(JournalEvent.STATUS, {'state': self.state})
+        elif message.type == MessageType.SESSION_EXTEND:
+            self.countdown.extend(message.duration or 0, message.deadline)
+        elif message.type == MessageType.SESSION_END:
+            if self.state != SessionState.ENDED:  # the kiosk may have locked on its own deadline first
+                self.end_session()
+        elif message.type == MessageType.HEARTBEAT:
+            if message.interval:
+                self._set_heartbeat_interval(message.interval)
+            if message.sent is not None and self.features.supports(Capability.CLOCK):
+                first = self.clock.rtt is None
+                if self.clock.received(message.sent, message.echo, message.held) and first:
+                    logger.info(f"Server round trip {self.clock.rtt * 1000:.1f} ms, "
+                                f"clock offset {self.clock.offset * 1000:+.1f} ms")
+                if message.echo is None:
+                    self._send_clock()  # the server asks for an answer
+        elif message.type == MessageType.REDIRECT:
+            self._redirect(message.servers)
+        elif message.type == MessageType.ACK:
+            if self.journal_upload is not None and message.msg_id == self.journal_upload[0]:
+                self.journal.discard(self.journal_upload[1])
+                self.journal_upload = None
+        elif self.on_message is not None:
+            self.on_message(message)
+
+    def _session_changed(self, message: Message):
+        if self.on_session is not None:
+            self.on_session(message)
+
+    def _servers_changed(self):
+        if self.on_servers is not None:
+            self.on_servers(self.servers.servers)
+
+    def report_event(self, kind: int, payload: dict):
+        """Send a status update, or journal the event while the server is unreachable."""
+        if self.online:
+            self.send_status()
+        elif self.journal is not None:
+            self.journal.append(kind, payload)
+
+    def send_status(self, error: Optional[str] = None, apps: Optional[List[str]] = None):
+        status = create_client_status(self.client_id, self.state, self.active_apps() if apps is None else apps,
+                                      self.countdown.remaining, error)
+        self.write(encode_message(status, self.features))
+
+    def _upload_journal(self):
+        """Send everything recorded while offline in one message; it is forgotten once the server ACKs it."""
+        self.journal_upload = None  # an ACK cannot arrive on a connection that is gone; this sends it all again
+        if self.journal is None or self.journal.empty or not self.features.supports(Capability.JOURNAL):
+            return
+        events = [list(event) for event in self.journal.read()]
+        message = create_journal(self.client_id, events)
+        if self.features.supports(Capability.ACK):
+            self.upload_id += 1
+            message.msg_id = self.upload_id
+            self.journal_upload = (message.msg_id, self.journal.mark())
+        self.write(encode_message(message, self.features))
+        if self.journal_upload is None:
+            self.journal.clear()  # the server cannot confirm it
+        logger.info(f"Uploaded {len(events)} journaled events")
+
+    def _handle_disconnect(self):
+        if not self.connected:
+            return
+        self.connected = False
+        self._cancel(self.heartbeat_timer)
+        self.heartbeat_timer = None
+        redirected, self.redirected = self.redirected, False
+        if self.on_disconnected is not None:
+            self.on_disconnected(redirected)
+        asyncio.ensure_future(self.connect())
+
+    def _redirect(self, servers: Optional[List[str]]):
+        """Move to the node the server chose (to even out the load); the session follows through the cluster."""
+        if not servers:
+            return
+        if self.servers.replace(servers):
+            self._servers_changed()
+        logger.info(f"Redirected to {servers[0]}")
+        self.redirected = True
+        self.writer.close()
+
+    def _acknowledge(self, message: Message, error: str = None):
+        """ACK (or NACK with the error) a command the server wants confirmed."""
+        if message.msg_id is not None and self.features.supports(Capability.ACK):
+            self.write(encode_message(create_ack(self.client_id, message.msg_id, error), self.features))
+
+    def write(self, data: bytes):
+        self.writer.write(data)
+        self.last_sent = self.monotonic()
+
+    @staticmethod
+    def _cancel(timer: Optional[asyncio.TimerHandle]):
+        if timer is not None:
+            timer.cancel()
+
+    def _start_heartbeats(self):
+        self._cancel(self.heartbeat_timer)
+        self.heartbeat_timer = self.call_later(self.heartbeat_interval, self._send_heartbeat)
+
+    def _set_heartbeat_interval(self, interval: int):
+        if interval != self.heartbeat_interval:
+            logger.info(f"Server set heartbeat interval to {interval}s")
+            self.heartbeat_interval = interval
+            self._start_heartbeats()
+
+    def _send_heartbeat(self):
+        self.heartbeat_timer = self.call_later(self.heartbeat_interval, self._send_heartbeat)
+        if not self.online:
+            return
+        if self.monotonic() - self.last_sent < self.heartbeat_interval:
+            return  # something else went out since the last tick
+        if self.features.supports(Capability.CLOCK):
+            self._send_clock()
+        elif self.features.supports(Capability.HEARTBEAT):
+            self.write(HEARTBEAT_FRAME)
+        else:
+            self.write(encode_message(create_heartbeat(self.client_id), self.features))
+        asyncio.ensure_future(self.writer.drain())
+
+    def _send_clock(self):
+        self.write(encode_frame(create_clock_heartbeat(self.clock.stamp()), self.features))
+
+    def _start_session_timer(self, first: float):
+        """Tick every second of the kiosk's clock, the first time after first seconds."""
+        self._stop_session_timer()
+        self.tick_due = self.monotonic() + first
+        self.session_timer = self.call_later(first, self._update_session_time)
+
+    def _stop_session_timer(self):
+        self._cancel(self.session_timer)
+        self.session_timer = None
+
+    def _update_session_time(self):
+        self.session_timer = None
+        if self.state != SessionState.ACTIVE or self.countdown.remaining is None:
+            return
+        remaining = self.countdown.tick()
+        if self.on_time_left is not None:
+            self.on_time_left(remaining)
+        if remaining % JOURNAL_TICK_INTERVAL == 0 and not self.online and self.journal is not None:
+            self.journal.append(JournalEvent.TICK, {'state': self.state, 'remaining': remaining})
+        if self.countdown.expired:
+            self.end_session()
+            return
+        ticks = 1
+        if self.on_time_left is None and self.countdown.deadline is not None and self.online:
+            # Nothing shows the time and nothing is journaled: only the tick that ends the session matters
+            ticks = max(1, int(self.countdown.time_left()))
+        self.tick_due += ticks
+        self.session_timer = self.call_later(max(0.0, self.tick_due - self.monotonic()), self._update_session_time)
+
+    def end_session(self):
+        self._stop_session_timer()
+        self.state = SessionState.ENDED
+        if self.on_session_end is not None:
+            self.on_session_end()  # sees the countdown as it ended
+        self.countdown.stop()
+        self.report_event(JournalEvent.STATUS, {'state': self.state})
@@ -2,7 +2,6 @@
 Kiosk desktop component for displaying allowed applications.
 """
 import os
-import subprocess
 from typing import Dict, List, Optional
 from PySide6.QtWidgets import (
     QWidget, QGridLayout, QPushButton, QLabel,
@@ -12,7 +11,9 @@ from PySide6.QtCore import Qt, QSize, Signal
 from PySide6.QtGui import QIcon, QPixmap
 from shared.constants import ICON_SIZE, GRID_SPACING
 from functools import partial
-import json
+from .config_store import AllowedAppsStore
+from .app_launcher import AppLauncher
+from .asset_cache import AssetCache
 
 ALLOWED_APPS_FILE = 'allowed_apps.json'
 
@@ -56,8 +57,9 @@ class KioskDesktop(QWidget):
     """Kiosk desktop that displays allowed applications."""
     app_launched = Signal(str, str)  # Emitted when an app is launched (app_name, app_path)
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, launcher: Optional[AppLauncher] = None, assets: Optional[AssetCache] = None):
         super().__init__(parent)
+        self.launcher = launcher or AppLauncher()
         self.setWindowFlags(
             Qt.Window |
             Qt.FramelessWindowHint |
@@ -118,15 +120,27 @@ class KioskDesktop(QWidget):
         
         # Store app icons
         self.app_icons: Dict[str, AppIcon] = {}
+        self.apps: List[Dict[str, str]] = []
+        self.apps_store = AllowedAppsStore(ALLOWED_APPS_FILE)
+        self.assets = assets
 
-    def set_allowed_apps(self, apps: List[Dict[str, str]]):
+    @property
+    def apps_version(self) -> int:
+        """Version of the app list currently shown (0 if never versioned by the server)."""
+        return self.apps_store.version
+
+    def set_allowed_apps(self, apps: List[Dict[str, str]], version: Optional[int] = None):
         """Set the list of allowed applications and save to disk."""
-        # Save to disk
-        try:
-            with open(ALLOWED_APPS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(apps, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Error saving allowed apps: {e}")
+        # Saved in the background; unchanged lists are not rewritten
+        self.apps_store.save(apps, version)
+        if apps == self.apps and self.app_icons:
+            return
+        self.apps = apps
+        self.refresh_icons()
+
+    def refresh_icons(self):
+        """Rebuild the icon grid, e.g. after an icon has been downloaded."""
+        apps = self.apps
         # Clear existing icons
         for icon in self.app_icons.values():
             self.grid_layout.removeWidget(icon)
@@ -139,7 +153,7 @@ class KioskDesktop(QWidget):
         for app in apps:
             icon = AppIcon(
                 app['name'],
-                app['icon_path'],
+                self._icon_path(app),
                 app['path']
             )
             icon.clicked.connect(partial(self._handle_app_click, app['name'], app['path']))
@@ -150,17 +164,22 @@ class KioskDesktop(QWidget):
                 col = 0
                 row += 1
 
+    def _icon_path(self, app: Dict[str, str]) -> str:
+        """The downloaded copy of the app's icon if there is one, else its icon_path on this PC."""
+        if self.assets is not None and app.get('icon_sha256'):
+            path = self.assets.path(app['icon_sha256'])
+            if path is not None:
+                return path
+        return app.get('icon_path', '')
+
     def load_allowed_apps(self):
-        try:
-            with open(ALLOWED_APPS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception:
-            return []
+        _, apps = self.apps_store.load()
+        return apps
 
     def _handle_app_click(self, app_name: str, app_path: str):
         """Handle app icon click."""
         try:
-            subprocess.Popen(app_path, shell=True)
+            self.launcher.launch(app_name, app_path)
             self.app_launched.emit(app_name, app_path)
         except Exception as e:
             print(f"Error launching {app_name} at {app_path}: {e}")
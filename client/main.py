@@ -4,6 +4,7 @@ Main client application for the kiosk system.
 import sys
 import os
 import asyncio
+import base64
 import logging
 import json
 import psutil
@@ -15,19 +16,28 @@ from datetime import datetime
 from PySide6.QtWidgets import QApplication, QMainWindow, QMessageBox, QInputDialog, QLabel, QVBoxLayout, QWidget
 from PySide6.QtCore import Qt, QTimer, QRect
 from shared.constants import (
-    DEFAULT_SERVER_PORT,
-    HEARTBEAT_INTERVAL, RECONNECT_ATTEMPTS,
-    RECONNECT_DELAY, BLOCKED_PROCESSES
+    DEFAULT_SERVER_PORT, Capability, JournalEvent,
+    BLOCKED_PROCESSES, HIDE_ONLY_PROCESSES, TELEMETRY_INTERVAL
 )
 from shared.protocol import (
-    Message, MessageType, SessionState,
-    create_heartbeat, create_client_status
+    Message, MessageType, AssetMessage, ScreenMessage, TelemetryMessage, encode_message
 )
 from .kiosk_desktop import KioskDesktop
+from .app_launcher import AppLauncher, WindowEventHook
+from .session_teardown import SessionTeardown
+from .session_journal import SessionJournal
+from .kiosk_connection import KioskConnection
+from .telemetry import TelemetrySampler
+from .blocklist import BlocklistEnforcer, BlocklistMatcher
+from .screen_capture import MAX_UNSENT_BYTES, TileEncoder, grab_screen
+from .asset_cache import AssetCache, AssetFetcher
+from .server_list import ServerList
+from shared.notifications import NOTICE_TIMEOUT, Notifier
+from shared.telemetry import TelemetryEncoder
+from shared.tls import client_context
 from .fake_toolbar import FakeToolbar
 import qasync
 import argparse
-import shared.protocol as protocol
 
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'client_config.json')
 
@@ -47,16 +57,28 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--dev', action='store_true', help='Run in developer (windowed) mode')
 args, _ = parser.parse_known_args()
 
-def get_server_ip():
+def load_config():
     if os.path.exists(CONFIG_FILE):
         with open(CONFIG_FILE, 'r') as f:
-            data = json.load(f)
-            return data.get('server_ip')
-    return None
+            return json.load(f)
+    return {}
+
+def get_servers():
+    """Server nodes to try in order: "servers" (learned from the cluster), else the single "server_ip"."""
+    config = load_config()
+    return config.get('servers') or ([config['server_ip']] if config.get('server_ip') else [])
 
 def save_server_ip(ip):
+    config = load_config()
+    config['server_ip'] = ip
+    with open(CONFIG_FILE, 'w') as f:
+        json.dump(config, f)
+
+def save_servers(servers):
+    config = load_config()
+    config['servers'] = servers
     with open(CONFIG_FILE, 'w') as f:
-        json.dump({'server_ip': ip}, f)
+        json.dump(config, f)
 
 class BlankDesktop(QMainWindow):
     def __init__(self):
@@ -66,10 +88,17 @@ class BlankDesktop(QMainWindow):
         self.showFullScreen()
 
 class KioskClient(QMainWindow):
-    def __init__(self, server_ip):
+    def __init__(self, servers):
         super().__init__()
-        self.server_ip = server_ip
+        self.servers = ServerList(servers)
+        self.notifier = Notifier()  # banners instead of modal boxes, so networking goes on behind them
         self.client_ip = self._get_local_ip()
+        # Failover, handshake, heartbeats and the session countdown; the desktop follows its callbacks
+        self.connection = KioskConnection(
+            self.servers, self.client_ip,
+            journal=SessionJournal(),  # session events recorded while the server is unreachable
+            tls=client_context(load_config().get('tls'))  # None = plain TCP
+        )
         if not args.dev:
             self.setWindowFlags(Qt.Window | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
             self.showFullScreen()
@@ -77,7 +106,13 @@ class KioskClient(QMainWindow):
             self.setWindowTitle('Kiosk Client (DEV MODE)')
             self.resize(1200, 800)
             self.show()
-        self.desktop = KioskDesktop(self)
+        # The launcher indexes launched apps' processes and windows as they appear
+        self.launcher = AppLauncher()
+        self.window_hook = WindowEventHook(self.launcher)
+        # Icons are fetched from the server by content hash into a local store
+        self.assets = AssetCache()
+        self.asset_fetcher = AssetFetcher(self.assets, self._request_asset, lambda _: self.desktop.refresh_icons())
+        self.desktop = KioskDesktop(self, launcher=self.launcher, assets=self.assets)
         self.toolbar = FakeToolbar(self)
         self.blank_desktop = QMainWindow()
         self.blank_desktop.setWindowFlags(Qt.Window | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
@@ -93,36 +128,66 @@ class KioskClient(QMainWindow):
         self.blank_desktop.hide()
         self.desktop.hide()
         self.toolbar.hide()
-        self.active_windows = {}
+        self.active_windows = self.launcher.app_windows  # app name -> main hwnd
+        self.launcher.on_window_added = lambda app_name, hwnd: self.toolbar.update_app_state(app_name, True)
+        self.launcher.on_window_removed = lambda app_name, hwnd: self.toolbar.update_app_state(
+            app_name, app_name in self.active_windows)
+        self.launcher.on_foreign_window = self._foreign_window_shown
+        # Blocked programs are terminated as they start; windows of the hide-only ones are hidden below
+        rules = [name for name in BLOCKED_PROCESSES if name not in HIDE_ONLY_PROCESSES]
+        self.blocked_windows = BlocklistMatcher(BLOCKED_PROCESSES)
+        loop = asyncio.get_event_loop()
+        self.enforcer = BlocklistEnforcer(
+            BlocklistMatcher(rules + load_config().get('blocklist', [])),
+            on_blocked=lambda pid, name: loop.call_soon_threadsafe(self._report_blocked, name)
+        )
+        self.enforcer.start()
+        self.window_hook.install()
+        # The hook only reports windows shown from now on; index the ones already up once
+        win32gui.EnumWindows(self._index_window, None)
         self.window_timer = QTimer()
-        self.window_timer.timeout.connect(self._check_windows)
+        self.window_timer.timeout.connect(self.launcher.reap)
         self.window_timer.start(1000)
-        self.reader = None
-        self.writer = None
-        self.client_id = None
-        self.state = SessionState.INACTIVE
-        self.remaining_time = None
-        self.heartbeat_timer = QTimer()
-        self.heartbeat_timer.timeout.connect(self._send_heartbeat)
-        self.session_timer = None
+        self.connection.apps_version = lambda: self.desktop.apps_version
+        self.connection.active_apps = lambda: list(self.toolbar.app_buttons)
+        self.connection.on_connected = self._connected
+        self.connection.on_handshake = self._handshake_done
+        self.connection.on_disconnected = self._handle_disconnect
+        self.connection.on_unreachable = self._server_unreachable
+        self.connection.on_servers = save_servers
+        self.connection.on_session = self._session_changed
+        self.connection.on_session_end = self._end_session
+        self.connection.on_time_left = self._show_time_left
+        self.connection.on_message = self._handle_message
+        self.teardown_task = None
+        self.telemetry = TelemetrySampler()
+        self.telemetry_encoder = TelemetryEncoder()
+        self.telemetry_interval = TELEMETRY_INTERVAL  # the server may change it; 0 = off
+        self.telemetry_timer = QTimer()
+        self.telemetry_timer.setSingleShot(True)
+        self.telemetry_timer.timeout.connect(lambda: asyncio.create_task(self._send_telemetry()))
+        # Screen thumbnails, only while the server asks for them
+        self.screen_encoder = TileEncoder()
+        self.screen_timer = QTimer()
+        self.screen_timer.timeout.connect(lambda: asyncio.create_task(self._send_screen_frame()))
+        self.screen_busy = False
         self.desktop.app_launched.connect(self._handle_app_launched)
         self.toolbar.app_activated.connect(self._handle_app_activated)
         self.toolbar.app_minimized.connect(self._handle_app_minimized)
         self.toolbar.app_restored.connect(self._handle_app_restored)
         self.toolbar.app_closed.connect(self._handle_app_closed)
-        self.connection_status = 'Disconnected'
         self.desktop.update_session_time('Status: Disconnected')
-        # Load allowed apps from disk as fallback
+        # Show the cached app grid right away; the server only resends it if its version differs
         local_apps = self.desktop.load_allowed_apps()
         if local_apps:
             self.desktop.set_allowed_apps(local_apps)
-        QTimer.singleShot(0, lambda: asyncio.create_task(self._connect_to_server()))
+        QTimer.singleShot(0, self.connection.start)
         self._show_blank()
 
     def _show_blank(self):
         self.desktop.hide()
         self.toolbar.hide()
-        msg = "Waiting for session to start..." if self.connection_status == 'Connected' else "Not connected to server"
+        msg = "Waiting for session to start..." if self.connection.connected else "Not connected to server"
         self.blank_label.setText(msg)
         if not args.dev:
             self.blank_desktop.showFullScreen()
@@ -143,146 +208,169 @@ class KioskClient(QMainWindow):
     def _get_local_ip(self):
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect((self.server_ip, DEFAULT_SERVER_PORT))
+            s.connect((self.servers.host, DEFAULT_SERVER_PORT))
             ip = s.getsockname()[0]
             s.close()
             return ip
         except Exception:
             return 'Unknown'
 
-    async def _connect_to_server(self):
-        for attempt in range(RECONNECT_ATTEMPTS):
-            try:
-                self.reader, self.writer = await asyncio.open_connection(
-                    self.server_ip,
-                    DEFAULT_SERVER_PORT
-                )
-                self.connection_status = 'Connected'
-                self.desktop.update_session_time(f'Status: Connected ({self.client_ip})')
-                # Send handshake with client_ip
-                hello = {'client_ip': self.client_ip}
-                self.writer.write(json.dumps(hello).encode() + b'\n')
-                await self.writer.drain()
-                self.heartbeat_timer.start(HEARTBEAT_INTERVAL * 1000)
-                asyncio.create_task(self._receive_messages())
-                return
-            except Exception as e:
-                logger.error(f"Connection attempt {attempt + 1} failed: {e}")
-                self.connection_status = 'Disconnected'
-                self.desktop.update_session_time('Status: Disconnected')
-                if attempt < RECONNECT_ATTEMPTS - 1:
-                    await asyncio.sleep(RECONNECT_DELAY)
-        QMessageBox.critical(
-            self,
+    def _connected(self):
+        self.desktop.update_session_time(f'Status: Connected ({self.client_ip})')
+        self.notifier.dismiss('connection')
+
+    def _handshake_done(self, message: Message):
+        features = self.connection.features
+        if features.supports(Capability.TELEMETRY):
+            self.telemetry_encoder.reset()  # the server starts from a full table
+            self._schedule_telemetry(0)
+        if features.supports(Capability.ASSETS):
+            self.asset_fetcher.restart()  # resumes a transfer the disconnect cut off
+            self._fetch_icons()
+
+    def _handle_message(self, message: Message):
+        """Messages for the desktop; the connection and the session are KioskConnection's."""
+        if message.type == MessageType.ALLOWED_APPS:
+            if hasattr(message, 'apps') and message.apps:
+                self.desktop.set_allowed_apps(message.apps, message.apps_version)
+                self._fetch_icons()
+        elif message.type == MessageType.REMOVE_CLIENT:
+            self._remove_client()
+        elif message.type == MessageType.TELEMETRY:
+            if message.interval is not None:
+                logger.info(f"Server set telemetry interval to {message.interval}s")
+                self.telemetry_interval = message.interval
+                self._schedule_telemetry(self.telemetry_interval)
+        elif message.type == MessageType.SCREEN:
+            self._set_screen_rate(message)
+        elif message.type == MessageType.ASSET_CHUNK:
+            self.asset_fetcher.received(message)
+
+    def _is_online(self) -> bool:
+        return self.connection.online
+
+    def _write(self, data: bytes):
+        self.connection.write(data)
+
+    def _handle_disconnect(self, redirected: bool):
+        self.telemetry_timer.stop()
+        self.screen_timer.stop()  # the server asks again after the reconnect
+        self.desktop.update_session_time('Status: Disconnected')
+        if not redirected:
+            # Stays up until the connection is back
+            self.notifier.notify(
+                "Connection Lost",
+                f"Lost connection to server at {self.servers.host}. Attempting to reconnect...",
+                'warning', timeout=0, key='connection'
+            )
+
+    def _server_unreachable(self):
+        # Stays up until a server answers; the connection keeps trying
+        self.notifier.notify(
             "Connection Error",
-            f"Failed to connect to server at {self.server_ip}. Please check your network connection."
+            f"Failed to connect to server at {', '.join(self.servers.servers)}. Please check your network "
+            f"connection; the kiosk keeps trying.",
+            'error', timeout=0, key='connection'
         )
-        sys.exit(1)
 
-    async def _receive_messages(self):
+    def _fetch_icons(self):
+        """Download the icons of the current app list that are not stored yet; drop the ones no longer used."""
+        digests = [app['icon_sha256'] for app in self.desktop.apps if app.get('icon_sha256')]
+        self.assets.gc(digests)
+        if self.connection.features.supports(Capability.ASSETS):
+            self.asset_fetcher.want(digests)
+
+    def _request_asset(self, digest: str, offset: int):
+        if self._is_online():
+            request = AssetMessage(type=MessageType.ASSET_REQUEST, client_id=self.connection.client_id,
+                                   sha256=digest, offset=offset)
+            self._write(encode_message(request, self.connection.features))
+
+    def _schedule_telemetry(self, delay: float):
+        if self.telemetry_interval > 0:
+            self.telemetry_timer.start(int(delay * 1000))
+        else:
+            self.telemetry_timer.stop()
+
+    async def _send_telemetry(self):
+        """Sample off the GUI thread and send the delta; reschedules itself within the CPU budget."""
+        if not self._is_online() or not self.connection.features.supports(Capability.TELEMETRY):
+            return  # resumes after the next handshake
+        loop = asyncio.get_event_loop()
         try:
-            while True:
-                data = await self.reader.readline()
-                if not data:
-                    break
-                try:
-                    raw = data.decode().strip()
-                    logger.info(f"Received: {raw}")
-                    msg_dict = json.loads(raw)
-                    msg_type = msg_dict.get('type')
-                    if msg_type in [MessageType.SESSION_START, MessageType.SESSION_PAUSE, MessageType.SESSION_RESUME, MessageType.SESSION_END]:
-                        message = protocol.SessionMessage(**msg_dict)
-                    elif msg_type == MessageType.ALLOWED_APPS:
-                        message = protocol.AllowedAppsMessage(**msg_dict)
-                    elif msg_type == MessageType.CLIENT_STATUS:
-                        message = protocol.ClientStatusMessage(**msg_dict)
-                    else:
-                        message = protocol.Message(**msg_dict)
-                    await self._handle_message(message)
-                except Exception as e:
-                    logger.error(f"Error handling message: {e}")
+            cpu, memory, processes = await loop.run_in_executor(None, self.telemetry.sample)
         except Exception as e:
-            logger.error(f"Error receiving messages: {e}")
-            self._handle_disconnect()
+            logger.error(f"Error sampling telemetry: {e}")
+        else:
+            if self._is_online():
+                sample = self.telemetry_encoder.encode(cpu, memory, processes,
+                                                       self.telemetry.overhead(self.telemetry_interval))
+                message = TelemetryMessage(type=MessageType.TELEMETRY, client_id=self.connection.client_id, **sample)
+                self._write(encode_message(message, self.connection.features))
+        self._schedule_telemetry(self.telemetry.delay(self.telemetry_interval))
+
+    def _set_screen_rate(self, message: Message):
+        if not message.fps:
+            self.screen_timer.stop()
+            logger.info("Screen monitoring stopped")
+            return
+        if not self.screen_timer.isActive() or message.width or message.quality is not None:
+            self.screen_encoder.configure(message.width, message.quality)  # next frame is a full one
+        self.screen_timer.start(int(1000 / message.fps))
 
-    async def _handle_message(self, message: Message):
+    async def _send_screen_frame(self):
+        """Grab the screen (GUI thread) and encode changed tiles off it; skips while the link is behind."""
+        if self.screen_busy or not self._is_online():
+            return
+        if self.connection.writer.transport.get_write_buffer_size() > MAX_UNSENT_BYTES:
+            return
+        self.screen_busy = True
+        try:
+            image = grab_screen()
+            loop = asyncio.get_event_loop()
+            width, height, key, tiles = await loop.run_in_executor(None, self.screen_encoder.encode, image)
+            if self._is_online() and self.screen_timer.isActive() and tiles:
+                message = ScreenMessage(
+                    type=MessageType.SCREEN, client_id=self.connection.client_id, width=width, height=height,
+                    tile=self.screen_encoder.tile, key=key,
+                    tiles=[[index, base64.b64encode(data).decode()] for index, data in tiles]
+                )
+                self._write(encode_message(message, self.connection.features))
+        except Exception as e:
+            logger.error(f"Error sending screen frame: {e}")
+        finally:
+            self.screen_busy = False
+
+    def _session_changed(self, message: Message):
         if message.type == MessageType.SESSION_START:
-            self.state = SessionState.ACTIVE
-            self.remaining_time = getattr(message, 'duration', 0)
             # Only set allowed apps if present
             if hasattr(message, 'apps') and message.apps:
                 self.desktop.set_allowed_apps(message.apps)
+                self._fetch_icons()
             self._show_kiosk()
-            self._start_session_timer()
         elif message.type == MessageType.SESSION_PAUSE:
-            self.state = SessionState.PAUSED
             self._pause_session()
-        elif message.type == MessageType.SESSION_RESUME:
-            self.state = SessionState.ACTIVE
+        else:
             self._resume_session()
-        elif message.type == MessageType.SESSION_END:
-            self.state = SessionState.ENDED
-            self._end_session()
-        elif message.type == MessageType.ALLOWED_APPS:
-            if hasattr(message, 'apps') and message.apps:
-                self.desktop.set_allowed_apps(message.apps)
-        elif message.type == MessageType.REMOVE_CLIENT:
-            self._remove_client()
 
-    def _handle_disconnect(self):
-        self.heartbeat_timer.stop()
-        self.connection_status = 'Disconnected'
-        self.desktop.update_session_time('Status: Disconnected')
-        QMessageBox.warning(
-            self,
-            "Connection Lost",
-            f"Lost connection to server at {self.server_ip}. Attempting to reconnect..."
-        )
-        QTimer.singleShot(0, lambda: asyncio.create_task(self._connect_to_server()))
-
-    def _send_heartbeat(self):
-        if self.writer and not self.writer.is_closing():
-            message = create_heartbeat(self.client_id)
-            self.writer.write(message.to_json().encode() + b'\n')
-            asyncio.create_task(self.writer.drain())
-
-    def _start_session_timer(self):
-        if self.session_timer:
-            self.session_timer.stop()
-        self.session_timer = QTimer()
-        self.session_timer.timeout.connect(self._update_session_time)
-        self.session_timer.start(1000)
-        self._update_session_time()
-
-    def _update_session_time(self):
-        if self.state == SessionState.PAUSED:
-            self.desktop.update_session_time(f'Status: Paused ({self.client_ip})')
-        elif self.state == SessionState.ACTIVE and self.remaining_time is not None:
-            hours = self.remaining_time // 3600
-            minutes = (self.remaining_time % 3600) // 60
-            seconds = self.remaining_time % 60
-            self.desktop.update_session_time(f'Time left: {hours:02d}:{minutes:02d}:{seconds:02d}')
-            self.remaining_time -= 1
-            if self.remaining_time < 0:
-                self._end_session()
-        else:
-            self.desktop.update_session_time(f'No session')
+    def _show_time_left(self, remaining: int):
+        hours = remaining // 3600
+        minutes = (remaining % 3600) // 60
+        seconds = remaining % 60
+        self.desktop.update_session_time(f'Time left: {hours:02d}:{minutes:02d}:{seconds:02d}')
 
     def _end_session(self):
-        if self.session_timer:
-            self.session_timer.stop()
         self._close_all_apps()
-        self.state = SessionState.ENDED
         self._show_blank()
-        QMessageBox.information(
-            self,
+        self.notifier.notify(
             "Session Ended",
-            "Your session has ended. The desktop is now locked."
+            "Your session has ended. The desktop is now locked.",
+            key='session'
         )
 
     def _handle_app_launched(self, app_name: str, app_path: str):
         self.toolbar.add_app(app_name, app_path)
-        self._check_windows()
+        self.connection.report_event(JournalEvent.APP, {'name': app_name})
 
     def _handle_app_activated(self, app_name: str):
         if app_name in self.active_windows:
@@ -305,31 +393,60 @@ class KioskClient(QMainWindow):
         if app_name in self.active_windows:
             hwnd = self.active_windows[app_name]
             win32gui.PostMessage(hwnd, win32con.WM_CLOSE, 0, 0)
-            del self.active_windows[app_name]
+            # The launcher drops the window from active_windows once it is destroyed
+
+    def _index_window(self, hwnd, _):
+        if win32gui.IsWindowVisible(hwnd):
+            _, pid = win32process.GetWindowThreadProcessId(hwnd)
+            self.launcher.window_shown(hwnd, pid)
+        return True
+
+    def _foreign_window_shown(self, hwnd: int, pid: int):
+        """Hide windows of the hide-only blocked programs as they appear."""
+        try:
+            name = self.enforcer.name_of(pid) or psutil.Process(pid).name()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return
+        if self.blocked_windows.match_name(name):
+            win32gui.ShowWindow(hwnd, win32con.SW_HIDE)
+
+    def _report_blocked(self, name: str):
+        if self._is_online():
+            self.connection.send_status(f"Terminated blocked process {name}")
 
-    def _check_windows(self):
-        def callback(hwnd, _):
-            if win32gui.IsWindowVisible(hwnd):
+    def _close_all_apps(self):
+        """Start tearing down every process launched this session; returns the teardown task."""
+        hwnds = list(self.launcher.hwnd_to_app)
+        pids = self.launcher.tracked_pids()
+
+        def request_close(_processes):
+            # PostMessage is safe from the executor thread
+            for hwnd in hwnds:
                 try:
-                    _, pid = win32process.GetWindowThreadProcessId(hwnd)
-                    process = psutil.Process(pid)
-                    if process.name() in BLOCKED_PROCESSES:
-                        win32gui.ShowWindow(hwnd, win32con.SW_HIDE)
-                        return True
-                    for app_name, app_hwnd in self.active_windows.items():
-                        if app_hwnd == hwnd:
-                            self.toolbar.update_app_state(
-                                app_name,
-                                win32gui.IsWindowVisible(hwnd)
-                            )
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    win32gui.PostMessage(hwnd, win32con.WM_CLOSE, 0, 0)
+                except Exception:
                     pass
-            return True
-        win32gui.EnumWindows(callback, None)
 
-    def _close_all_apps(self):
-        for app_name in list(self.active_windows.keys()):
-            self._handle_app_closed(app_name)
+        self.launcher.clear()
+        for app_name in list(self.toolbar.app_buttons):
+            self.toolbar.remove_app(app_name)
+        self.teardown_task = asyncio.ensure_future(self._run_teardown(SessionTeardown(request_close), pids))
+        return self.teardown_task
+
+    async def _run_teardown(self, teardown: SessionTeardown, pids):
+        if not pids:
+            return
+        loop = asyncio.get_event_loop()
+        report = await loop.run_in_executor(None, teardown.run, pids)
+        logger.info(
+            f"Session teardown took {report.duration:.2f}s: {len(report.closed)} closed, "
+            f"{len(report.terminated)} terminated, {len(report.killed)} killed"
+        )
+        if not report.clean:
+            error = f"Teardown left {len(report.survivors)} processes running: {report.survivors}"
+            logger.error(error)
+            if self._is_online():
+                self.connection.send_status(error, apps=[])
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
@@ -358,8 +475,6 @@ class KioskClient(QMainWindow):
         else:
             self.blank_desktop.show()
         self.blank_desktop.raise_()
-        if self.session_timer:
-            self.session_timer.stop()
 
     def _resume_session(self):
         self.blank_desktop.hide()
@@ -370,34 +485,34 @@ class KioskClient(QMainWindow):
         self.toolbar.show()
         self.desktop.raise_()
         self.toolbar.raise_()
-        if self.session_timer:
-            self.session_timer.start(1000)
 
     def _remove_client(self):
-        self._close_all_apps()
+        teardown_task = self._close_all_apps()
         self.blank_desktop.setStyleSheet("background-color: #111;")
         self.blank_desktop.setWindowTitle("")
         self.desktop.hide()
         self.toolbar.hide()
         self.blank_desktop.showFullScreen()
         self.blank_desktop.raise_()
-        QMessageBox.information(self, "Removed", "This client has been removed by the admin. Exiting.")
-        QApplication.quit()
+        self.notifier.notify("Removed", "This client has been removed by the admin. Exiting.",
+                             timeout=0, key='session')
+        # Exit once the apps are closed and the notice has been up for a while
+        teardown_task.add_done_callback(lambda _: QTimer.singleShot(NOTICE_TIMEOUT * 1000, QApplication.quit))
 
 async def main():
     app = QApplication(sys.argv)
     loop = qasync.QEventLoop(app)
     asyncio.set_event_loop(loop)
     # Get or prompt for server IP
-    server_ip = get_server_ip()
-    if not server_ip:
+    servers = get_servers()
+    if not servers:
         ip, ok = QInputDialog.getText(None, "Server IP", "Enter the server IP address:")
         if not ok or not ip:
             QMessageBox.critical(None, "No IP Entered", "No server IP entered. Exiting.")
             sys.exit(1)
         save_server_ip(ip)
-        server_ip = ip
-    window = KioskClient(server_ip)
+        servers = [ip]
+    window = KioskClient(servers)
     window.show()
     with loop:
         await loop.run_forever()
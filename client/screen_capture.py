@@ -0,0 +1,80 @@
+"""
+Screen thumbnails for remote monitoring, sent as the tiles that changed.
+"""
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, Qt
+from PySide6.QtGui import QGuiApplication, QImage
+
+THUMBNAIL_WIDTH = 480
+JPEG_QUALITY = 60  # 0 selects PNG
+TILE_SIZE = 64
+MAX_UNSENT_BYTES = 64 * 1024  # skip a frame while this much of the previous ones is still unsent
+
+def grab_screen() -> QImage:
+    """The primary screen as a QImage. Must run on the GUI thread; everything after it need not."""
+    return QGuiApplication.primaryScreen().grabWindow(0).toImage()
+
+class TileEncoder:
+    """Scales a screenshot to a thumbnail and encodes the tiles that changed since the last frame.
+
+    QImage (unlike QPixmap) may be used off the GUI thread, so ``encode`` is
+    meant to run in an executor. Tiles are compared by a hash of their
+    pixels; after ``reset`` or a change of size every tile is sent.
+    """
+
+    def __init__(self, width: int = THUMBNAIL_WIDTH, quality: int = JPEG_QUALITY, tile: int = TILE_SIZE):
+        self.width = width
+        self.quality = quality
+        self.tile = tile
+        self._size: Optional[Tuple[int, int]] = None
+        self._hashes: Dict[int, bytes] = {}
+
+    def configure(self, width: Optional[int] = None, quality: Optional[int] = None):
+        if width:
+            self.width = width
+        if quality is not None:
+            self.quality = quality
+        self.reset()
+
+    def reset(self):
+        self._hashes = {}
+
+    def encode(self, image: QImage) -> Tuple[int, int, bool, List[Tuple[int, bytes]]]:
+        """(width, height, key, [(tile index, encoded image)]) for the tiles that changed."""
+        scaled = image.scaledToWidth(self.width, Qt.SmoothTransformation).convertToFormat(QImage.Format_RGB32)
+        width, height = scaled.width(), scaled.height()
+        if self._size != (width, height):
+            self._size = (width, height)
+            self._hashes = {}
+        key = not self._hashes
+        bits = scaled.constBits()
+        stride = scaled.bytesPerLine()
+        tile = self.tile
+        columns = (width + tile - 1) // tile
+        changed = []
+        for top in range(0, height, tile):
+            bottom = min(top + tile, height)
+            for left in range(0, width, tile):
+                right = min(left + tile, width)
+                digest = hashlib.blake2b(digest_size=16)
+                for line in range(top, bottom):
+                    start = line * stride
+                    digest.update(bits[start + left * 4:start + right * 4])
+                index = (top // tile) * columns + left // tile
+                value = digest.digest()
+                if self._hashes.get(index) != value:
+                    self._hashes[index] = value
+                    changed.append((index, self._encode_tile(scaled.copy(left, top, right - left, bottom - top))))
+        return width, height, key, changed
+
+    def _encode_tile(self, image: QImage) -> bytes:
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        if self.quality > 0:
+            image.save(buffer, 'JPG', self.quality)
+        else:
+            image.save(buffer, 'PNG')
+        buffer.close()
+        return bytes(data.data())
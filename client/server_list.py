@@ -0,0 +1,84 @@
+"""
+Ordered list of server nodes a kiosk connects to, for failover and redirects.
+"""
+import logging
+import random
+import time
+from typing import Callable, List, Optional, Tuple
+from shared.constants import DEFAULT_SERVER_PORT, MAX_RECONNECT_DELAY, RECONNECT_DELAY, UNREACHABLE_AFTER
+from shared.protocol import parse_address
+
+logger = logging.getLogger(__name__)
+
+class ServerList:
+    """Server addresses ("host" or "host:port") in the order to try them.
+
+    The kiosk connects to ``current``; when that fails it moves to the next
+    one straight away and only waits once every server has been tried
+    (``failed`` says how long). The wait doubles with every round up to
+    MAX_RECONNECT_DELAY and is jittered, so kiosks cut off together do not
+    all come back in the same instant. It never gives up; ``unreachable``
+    says when it has been failing long enough to tell the user. The list the
+    server sends (on connect, or in a redirect) replaces the order;
+    configured addresses it does not mention are kept at the end.
+    """
+
+    def __init__(self, servers: List[str], clock: Callable[[], float] = time.monotonic,
+                 rng: Optional[random.Random] = None):
+        self.servers = list(dict.fromkeys(servers))
+        self.configured = list(self.servers)
+        self.clock = clock
+        self.random = rng or random.Random()
+        self.index = 0
+        self.failures = 0  # failed attempts since the last connection
+        self.rounds = 0  # times every server has failed since the last connection
+        self.failing_since: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.servers)
+
+    @property
+    def current(self) -> Tuple[str, int]:
+        return parse_address(self.servers[self.index], DEFAULT_SERVER_PORT)
+
+    @property
+    def host(self) -> str:
+        return self.current[0]
+
+    def advance(self) -> bool:
+        """Move on to the next server. Returns True when the list starts over."""
+        self.index = (self.index + 1) % len(self.servers)
+        return self.index == 0
+
+    @property
+    def unreachable(self) -> bool:
+        """True once no server has answered for UNREACHABLE_AFTER seconds."""
+        return self.failing_since is not None and self.clock() - self.failing_since >= UNREACHABLE_AFTER
+
+    def failed(self) -> float:
+        """Move on after a failed attempt. Returns the seconds to wait before the next one (0: try it now)."""
+        if self.failures == 0:
+            self.failing_since = self.clock()
+        self.failures += 1
+        if not self.advance():
+            return 0
+        self.rounds += 1
+        delay = min(RECONNECT_DELAY * 2 ** (self.rounds - 1), MAX_RECONNECT_DELAY)
+        return delay * self.random.uniform(0.5, 1.0)
+
+    def connected(self):
+        self.failures = 0
+        self.rounds = 0
+        self.failing_since = None
+
+    def replace(self, servers: Optional[List[str]]) -> bool:
+        """Adopt the server's list, starting over at its first entry. Returns True if the list changed."""
+        if not servers:
+            return False
+        merged = list(dict.fromkeys(list(servers) + self.configured))
+        changed = merged != self.servers
+        self.servers = merged
+        self.index = 0
+        if changed:
+            logger.info(f"Server list: {self.servers}")
+        return changed
@@ -0,0 +1,84 @@
+"""
+Time left in the kiosk's session, counted down to the server's deadline.
+"""
+import time
+from typing import Callable, Optional
+
+MAX_SLEW = 5.0  # seconds the wall clock may drift from the monotonic one before it counts as set
+
+class SessionCountdown:
+    """Seconds left in the running session, read at the kiosk's one-second ticks.
+
+    With a deadline from the server (CLOCK servers) the time left is read off
+    the clocks at every tick, so late or skipped ticks do not add up and the
+    kiosk ends within a second of the server. The deadline comes in this
+    kiosk's wall clock, which NTP keeps in step with the server's; the
+    monotonic clock drifts (a day at 50 ppm is four seconds) but cannot be
+    set. So the wall clock is followed while the two agree to within
+    MAX_SLEW, and once they do not (the wall clock was set) the monotonic
+    count takes over from there. Without a deadline (older servers) every
+    tick counts one second off.
+    """
+    __slots__ = ('monotonic', 'wall', 'remaining', 'deadline', 'wall_deadline')
+
+    def __init__(self, monotonic: Callable[[], float] = time.monotonic, wall: Callable[[], float] = time.time):
+        self.monotonic = monotonic
+        self.wall = wall
+        self.remaining: Optional[int] = None
+        self.deadline: Optional[float] = None  # monotonic time the session ends, if the server sent a deadline
+        self.wall_deadline = 0.0  # the same on the wall clock
+
+    def start(self, duration: int, deadline: Optional[float] = None):
+        self.remaining = duration
+        self.set_deadline(deadline)
+
+    def set_deadline(self, deadline: Optional[float]):
+        if deadline is None:
+            self.deadline = None
+            return
+        self.wall_deadline = deadline
+        self.deadline = self.monotonic() + deadline - self.wall()
+
+    def pause(self):
+        """Stop counting, keeping what is left."""
+        if self.deadline is not None:
+            self.remaining = max(0, round(self._left()))
+        self.deadline = None
+
+    def extend(self, seconds: int, deadline: Optional[float] = None):
+        if deadline is not None:
+            self.set_deadline(deadline)
+        elif self.remaining is not None:
+            self.remaining += seconds
+            if self.deadline is not None:
+                self.deadline += seconds
+                self.wall_deadline += seconds
+
+    def stop(self):
+        self.deadline = None
+
+    def time_left(self) -> Optional[float]:
+        """Seconds left right now, unrounded."""
+        if self.deadline is not None:
+            return self._left()
+        return self.remaining
+
+    def tick(self) -> int:
+        """Seconds left to show for this tick; one is then counted off (see ``expired``)."""
+        if self.deadline is not None:
+            self.remaining = max(0, round(self._left()))
+        shown = self.remaining
+        self.remaining -= 1
+        return shown
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining is not None and self.remaining < 0
+
+    def _left(self) -> float:
+        left = self.deadline - self.monotonic()
+        wall_left = self.wall_deadline - self.wall()
+        if abs(wall_left - left) <= MAX_SLEW:
+            return wall_left
+        self.wall_deadline = self.wall() + left  # the wall clock was set; follow it again from here
+        return left
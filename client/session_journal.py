@@ -0,0 +1,163 @@
+"""
+Append-only on-disk journal of session events recorded while offline.
+"""
+import json
+import logging
+import os
+import struct
+import time
+from typing import Any, Dict, List, Tuple
+from shared.constants import JournalEvent
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE = 'session_journal.bin'
+MAX_JOURNAL_BYTES = 256 * 1024
+
+# kind, wall-clock time, payload length
+RECORD = struct.Struct('<BdH')
+
+Event = Tuple[int, float, Dict[str, Any]]
+
+class SessionJournal:
+    """Compact binary journal: one fixed header plus a short JSON payload per event.
+
+    Appends go straight to the end of the file. When it grows past max_bytes
+    it is compacted (ticks collapse into the newest one, then the oldest
+    events are dropped) and atomically replaced, so an outage of any length
+    uses bounded disk. A torn record at the end, e.g. after a power cut, is
+    cut off when the journal is opened, so later appends stay readable. An
+    upload takes a ``mark()`` along with ``read()`` and ``discard``s up to
+    it once the server has confirmed it.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE, max_bytes: int = MAX_JOURNAL_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+        self._size = self._recover()
+        self._rewrites = 0  # a mark taken before a rewrite no longer points at a record boundary
+
+    @property
+    def empty(self) -> bool:
+        return self._size == 0
+
+    @staticmethod
+    def _encode(kind: int, timestamp: float, payload: Dict[str, Any]) -> bytes:
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return RECORD.pack(kind, timestamp, len(body)) + body
+
+    def append(self, kind: int, payload: Dict[str, Any], timestamp: float = None):
+        record = self._encode(kind, time.time() if timestamp is None else timestamp, payload)
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+            self._file.write(record)
+            self._file.flush()
+            self._size += len(record)
+        except OSError as e:
+            logger.error(f"Error writing session journal: {e}")
+            return
+        if self._size > self.max_bytes:
+            self.compact()
+
+    def read(self) -> List[Event]:
+        """All complete events, oldest first."""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        return _parse(data)[0]
+
+    def _recover(self) -> int:
+        """Cut a torn tail off the journal; returns its size."""
+        try:
+            with open(self.path, 'r+b') as f:
+                valid = _parse(f.read())[1]
+                if f.seek(0, os.SEEK_END) != valid:
+                    logger.warning(f"Truncating torn tail of {self.path} at {valid}")
+                    f.truncate(valid)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.error(f"Error recovering session journal: {e}")
+            return 0
+        return valid
+
+    def mark(self) -> Tuple[int, int]:
+        """Where the journal ends now."""
+        return self._rewrites, self._size
+
+    def discard(self, mark: Tuple[int, int]):
+        """Forget the events before mark and keep any appended since.
+
+        Nothing is forgotten if the journal was rewritten after the mark was taken.
+        """
+        rewrites, size = mark
+        if rewrites != self._rewrites:
+            return
+        if size >= self._size:
+            self.clear()
+            return
+        self.close()
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(size)
+                rest = f.read()
+        except OSError as e:
+            logger.error(f"Error reading session journal: {e}")
+            return
+        self._rewrite(rest)
+
+    def compact(self):
+        """Collapse ticks and drop the oldest events until the journal fits in half its cap."""
+        events = self.read()
+        last_tick = max((i for i, e in enumerate(events) if e[0] == JournalEvent.TICK), default=None)
+        events = [e for i, e in enumerate(events) if e[0] != JournalEvent.TICK or i == last_tick]
+        records = [self._encode(*e) for e in events]
+        size = sum(len(r) for r in records)
+        first = 0
+        while size > self.max_bytes // 2 and first < len(records):
+            size -= len(records[first])
+            first += 1
+        self._rewrite(b''.join(records[first:]))
+
+    def clear(self):
+        """Forget all events, e.g. once they have been uploaded."""
+        self._rewrite(b'')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rewrite(self, data: bytes):
+        self.close()
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._size = len(data)
+            self._rewrites += 1
+        except OSError as e:
+            logger.error(f"Error rewriting session journal: {e}")
+
+def _parse(data: bytes) -> Tuple[List[Event], int]:
+    """The complete events in data, and the length of data they take up."""
+    events = []
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        kind, timestamp, length = RECORD.unpack_from(data, offset)
+        start = offset + RECORD.size
+        if start + length > len(data):
+            break
+        try:
+            events.append((kind, timestamp, json.loads(data[start:start + length])))
+        except ValueError:
+            break
+        offset = start + length
+    return events, offset
@@ -0,0 +1,118 @@
+"""
+Bounded-time teardown of every process started during a session.
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Per-phase grace periods in seconds; teardown never takes longer than their sum
+CLOSE_TIMEOUT = 5.0
+TERMINATE_TIMEOUT = 3.0
+KILL_TIMEOUT = 2.0
+
+@dataclass
+class TeardownReport:
+    """Outcome of a teardown, by the phase in which each process went away."""
+    duration: float = 0.0
+    closed: List[int] = field(default_factory=list)
+    terminated: List[int] = field(default_factory=list)
+    killed: List[int] = field(default_factory=list)
+    survivors: List[int] = field(default_factory=list)
+
+    @property
+    def clean(self) -> bool:
+        return not self.survivors
+
+class SessionTeardown:
+    """Closes whole process trees concurrently: ask, then terminate, then kill.
+
+    Each phase signals every remaining process before waiting on all of them
+    together, so the total time is bounded by the phase timeouts no matter how
+    many processes there are or how many of them ignore the polite request.
+    ``request_close`` performs the polite request (e.g. posting WM_CLOSE to the
+    session's windows); without one, POSIX processes get SIGTERM and Windows
+    processes go straight to the terminate phase.
+    """
+
+    def __init__(
+        self,
+        request_close: Optional[Callable[[List[psutil.Process]], None]] = None,
+        close_timeout: float = CLOSE_TIMEOUT,
+        terminate_timeout: float = TERMINATE_TIMEOUT,
+        kill_timeout: float = KILL_TIMEOUT
+    ):
+        self.request_close = request_close
+        self.close_timeout = close_timeout
+        self.terminate_timeout = terminate_timeout
+        self.kill_timeout = kill_timeout
+
+    @staticmethod
+    def collect(pids: Iterable[int]) -> List[psutil.Process]:
+        """Return the processes for pids plus all their live descendants."""
+        own_pid = os.getpid()
+        found: Dict[int, psutil.Process] = {}
+        for pid in pids:
+            if pid in found or pid == own_pid:
+                continue
+            try:
+                process = psutil.Process(pid)
+                found[pid] = process
+                for child in process.children(recursive=True):
+                    found.setdefault(child.pid, child)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        found.pop(own_pid, None)
+        return list(found.values())
+
+    def run(self, pids: Iterable[int]) -> TeardownReport:
+        """Tear down the process trees rooted at pids. Blocks; run it off the UI thread."""
+        started = time.monotonic()
+        report = TeardownReport()
+        alive = self.collect(pids)
+        if alive and self._request_close(alive):
+            alive = self._wait(alive, self.close_timeout, report.closed)
+        if alive:
+            # Pick up anything spawned while we were asking nicely
+            alive = self.collect(p.pid for p in alive)
+            self._signal(alive, psutil.Process.terminate)
+            alive = self._wait(alive, self.terminate_timeout, report.terminated)
+        if alive:
+            self._signal(alive, psutil.Process.kill)
+            alive = self._wait(alive, self.kill_timeout, report.killed)
+        report.survivors = [p.pid for p in alive]
+        report.duration = time.monotonic() - started
+        return report
+
+    def _request_close(self, processes: List[psutil.Process]) -> bool:
+        """Ask politely. Returns False if there is no polite way to ask."""
+        if self.request_close is not None:
+            try:
+                self.request_close(processes)
+            except Exception as e:
+                logger.error(f"Error requesting close: {e}")
+            return True
+        if os.name == 'posix':
+            self._signal(processes, psutil.Process.terminate)
+            return True
+        return False
+
+    @staticmethod
+    def _signal(processes: List[psutil.Process], action: Callable[[psutil.Process], None]):
+        for process in processes:
+            try:
+                action(process)
+            except psutil.NoSuchProcess:
+                pass
+            except psutil.AccessDenied as e:
+                logger.error(f"Cannot signal pid {process.pid}: {e}")
+
+    @staticmethod
+    def _wait(processes: List[psutil.Process], timeout: float, gone_into: List[int]) -> List[psutil.Process]:
+        gone, alive = psutil.wait_procs(processes, timeout=timeout)
+        gone_into.extend(p.pid for p in gone)
+        return alive
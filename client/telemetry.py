@@ -0,0 +1,93 @@
+"""
+Kiosk resource sampling for the server's telemetry view.
+"""
+import logging
+import time
+from typing import Dict, Optional, Tuple
+import psutil
+from shared.telemetry import ProcessTable
+
+logger = logging.getLogger(__name__)
+
+TOP_PROCESSES = 10  # by CPU and by memory; the union is reported
+CPU_BUDGET = 0.005  # share of one CPU the sampler may use on average
+_COST_SMOOTHING = 0.2
+
+class _Tracked:
+    __slots__ = ('process', 'name', 'cpu_seconds')
+
+    def __init__(self, process: psutil.Process, name: str, cpu_seconds: float):
+        self.process = process
+        self.name = name
+        self.cpu_seconds = cpu_seconds
+
+class TelemetrySampler:
+    """Samples system load and the busiest processes in one pass over the process table.
+
+    ``psutil.process_iter`` hands back the same Process object for a pid as
+    long as it is the same process, so names are looked up once per process
+    and CPU usage is the difference of cumulative CPU times between passes.
+    Per process only cpu_times and memory_info are read, inside
+    ``oneshot()`` so they come from a single system call where the platform
+    allows it.
+
+    The sampler times itself (thread CPU time, so run it on its own thread)
+    and ``delay`` stretches the interval when a pass would use more than
+    CPU_BUDGET of a core.
+    """
+
+    def __init__(self, top: int = TOP_PROCESSES, budget: float = CPU_BUDGET):
+        self.top = top
+        self.budget = budget
+        self.cost = 0.0  # smoothed CPU seconds per pass
+        self._tracked: Dict[int, _Tracked] = {}
+        self._last: Optional[float] = None
+        psutil.cpu_percent(None)  # starts the system-wide delta
+
+    def sample(self) -> Tuple[float, float, ProcessTable]:
+        """(system CPU %, memory used %, top processes). The first pass reports 0% CPU per process."""
+        started = time.thread_time()
+        now = time.monotonic()
+        elapsed = now - self._last if self._last is not None else None
+        self._last = now
+        tracked: Dict[int, _Tracked] = {}
+        usage = []
+        for process in psutil.process_iter():
+            try:
+                with process.oneshot():
+                    times = process.cpu_times()
+                    rss = process.memory_info().rss
+                    entry = self._tracked.get(process.pid)
+                    cpu_seconds = times.user + times.system
+                    if entry is None or entry.process is not process:
+                        entry = _Tracked(process, process.name(), cpu_seconds)
+                        cpu_percent = 0.0
+                    else:
+                        cpu_percent = (cpu_seconds - entry.cpu_seconds) / elapsed * 100 if elapsed else 0.0
+                        entry.cpu_seconds = cpu_seconds
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            tracked[process.pid] = entry
+            usage.append((cpu_percent, rss, process.pid))
+        self._tracked = tracked
+        chosen = set(pid for *_, pid in sorted(usage, reverse=True)[:self.top])
+        chosen.update(pid for *_, pid in sorted(usage, key=lambda row: row[1], reverse=True)[:self.top])
+        processes = {
+            pid: (tracked[pid].name, round(cpu_percent), rss >> 20)
+            for cpu_percent, rss, pid in usage if pid in chosen
+        }
+        result = psutil.cpu_percent(None), psutil.virtual_memory().percent, processes
+        spent = time.thread_time() - started
+        self.cost = spent if self.cost == 0.0 else self.cost + _COST_SMOOTHING * (spent - self.cost)
+        return result
+
+    def delay(self, interval: float) -> float:
+        """Seconds until the next pass: interval, or longer if that would exceed the CPU budget."""
+        floor = self.cost / self.budget if self.budget > 0 else 0.0
+        if floor > interval:
+            logger.debug(f"Telemetry pass costs {self.cost * 1000:.1f}ms; sampling every {floor:.0f}s")
+        return max(interval, floor)
+
+    def overhead(self, interval: float) -> float:
+        """Share of one CPU used by sampling every interval seconds."""
+        return self.cost / self.delay(interval) if interval > 0 else 0.0
@@ -4,7 +4,7 @@ import asyncio
 import logging
 import json
 from datetime import datetime
-from PySide6.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QSystemTrayIcon, QMenu, QPushButton, QLineEdit, QMessageBox, QDialog
+from PySide6.QtWidgets import QApplication, QWidget, QLabel, QVBoxLayout, QSystemTrayIcon, QMenu, QPushButton, QLineEdit, QDialog, QInputDialog
 from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QIcon, QAction
 import qasync
@@ -17,6 +17,14 @@ import win32gui
 import win32process
 import threading
 from qasync import asyncSlot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.protocol import (
+    HEARTBEAT_FRAME, LEGACY_FEATURES, create_ack, create_handshake, create_heartbeat, decode_frame, encode_message,
+    handshake_fields, negotiate, parse_handshake
+)
+from shared.constants import HEARTBEAT_INTERVAL, Capability
+from shared.notifications import NOTICE_TIMEOUT, Notifier
+from shared.tls import client_context
 
 # Overlay timer widget
 class TimerOverlay(QWidget):
@@ -130,7 +138,6 @@ class LoginDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle('Login')
-        self.setFixedSize(300, 150)
         layout = QVBoxLayout(self)
         self.username_input = QLineEdit()
         self.username_input.setPlaceholderText('Username')
@@ -139,16 +146,20 @@ class LoginDialog(QDialog):
         self.password_input.setPlaceholderText('Password')
         self.password_input.setEchoMode(QLineEdit.Password)
         layout.addWidget(self.password_input)
+        self.error_label = QLabel('')
+        self.error_label.setStyleSheet('color: #c33;')
+        layout.addWidget(self.error_label)
         self.login_btn = QPushButton('Login')
         self.login_btn.clicked.connect(self.try_login)
         layout.addWidget(self.login_btn)
         self.setWindowFlags(Qt.WindowStaysOnTopHint | Qt.CustomizeWindowHint)
+        self.setFixedSize(300, 180)
         self.accepted = False
     def try_login(self):
         username = self.username_input.text().strip()
         password = self.password_input.text().strip()
         if not username or not password:
-            QMessageBox.warning(self, 'Error', 'Please enter both username and password')
+            self.error_label.setText('Please enter both username and password')
             return
         self.accepted = True
         self.accept()
@@ -180,6 +191,18 @@ class Client2App:
         self._notified_1min = False
         self.receiver_task = None  # Track the message receiver task
         self.reconnecting = False
+        self.quitting = False
+        self.notifier = Notifier()  # banners and awaitable dialogs; nothing here runs a nested event loop
+        self.credentials = None  # entered at the login prompt, kept until the server answers them
+        self.handshake = create_handshake()
+        self.features = LEGACY_FEATURES
+        self.resume_token = None  # reconnects present this instead of asking for the password again
+        self.last_seq = None
+        self.tls = client_context(self._load_config().get('tls'))  # None = plain TCP
+        self.writer = None
+        # The server drops a connection that stays silent for a few heartbeat intervals
+        self.heartbeat_timer = QTimer()
+        self.heartbeat_timer.timeout.connect(self._send_heartbeat)
     def _init_tray(self):
         icon_path = os.path.join(os.path.dirname(__file__), "icon.png")
         self.tray = QSystemTrayIcon(QIcon(icon_path))
@@ -208,18 +231,22 @@ class Client2App:
         self.session_timer.stop()
         self.tray.hide()
         self.app.quit()
-    def _get_server_ip(self):
+    def _load_config(self):
         if os.path.exists(SERVER_CONFIG):
             with open(SERVER_CONFIG, 'r') as f:
-                data = json.load(f)
-                return data.get('server_ip')
-        return None
+                return json.load(f)
+        return {}
+    def _get_server_ip(self):
+        return self._load_config().get('server_ip')
     def _save_server_ip(self, ip):
+        config = self._load_config()
+        config['server_ip'] = ip
         with open(SERVER_CONFIG, 'w') as f:
-            json.dump({'server_ip': ip}, f)
+            json.dump(config, f)
     async def reconnect_loop(self):
-        while True:
-            await self.reconnect()
+        while not self.quitting:
+            if self.receiver_task is None:
+                await self.reconnect()
             await asyncio.sleep(3)
     async def reconnect(self):
         if self.reconnecting:
@@ -232,18 +259,35 @@ class Client2App:
     async def _connect_to_server(self):
         server_ip = self._get_server_ip()
         if not server_ip:
-            from PySide6.QtWidgets import QInputDialog, QMessageBox
-            ip, ok = QInputDialog.getText(None, "Server IP", "Enter the server IP address:")
+            dialog = QInputDialog()
+            dialog.setWindowTitle("Server IP")
+            dialog.setLabelText("Enter the server IP address:")
+            ok = await self.notifier.ask(dialog)
+            ip = dialog.textValue().strip()
             if not ok or not ip:
-                QMessageBox.critical(None, "No IP Entered", "No server IP entered. Exiting.")
-                self.app.quit()
+                self.notifier.notify("No IP Entered", "No server IP entered. Exiting.", 'error')
+                self._quit_after_notice()
                 return
             self._save_server_ip(ip)
             server_ip = ip
+        if not self.resume_token and self.credentials is None:
+            # Ask before connecting, so no connection sits idle while someone types
+            self.credentials = await self._prompt_login()
+            if self.credentials == ('admin', 'admin123'):
+                self.credentials = None
+                self._exit()
+                return
         self.set_connection_status('Connecting...')
         try:
-            reader, writer = await asyncio.open_connection(server_ip, DEFAULT_SERVER_PORT)
+            reader, writer = await asyncio.open_connection(server_ip, DEFAULT_SERVER_PORT, ssl=self.tls)
+            if self.tls:
+                try:
+                    self.tls.verify(writer.get_extra_info('ssl_object'))
+                except Exception:
+                    writer.close()
+                    raise
             self.writer = writer  # Store writer for later closing
+            self.features = LEGACY_FEATURES
             self.set_connection_status('Connected')
             # Cancel previous receiver if any
             if self.receiver_task is not None:
@@ -254,19 +298,39 @@ class Client2App:
                     pass
                 self.receiver_task = None
             self.receiver_task = asyncio.create_task(self._receive_messages(reader, writer))
-            username, password = self.get_login_credentials()
-            if username == 'admin' and password == 'admin123':
-                self.app.quit()
-                return
-            auth_data = {
-                'type': 'auth',
-                'username': username,
-                'password': password
-            }
+            if self.resume_token:
+                auth_data = {'type': 'auth'}
+                self.handshake.resume_token = self.resume_token
+                self.handshake.last_seq = self.last_seq
+            else:
+                username, password = self.credentials
+                auth_data = {
+                    'type': 'auth',
+                    'username': username,
+                    'password': password
+                }
+                self.handshake.resume_token = None
+                self.handshake.last_seq = None
+            # Version fields ride along with auth; legacy servers ignore them
+            auth_data.update(handshake_fields(self.handshake))
             writer.write(json.dumps(auth_data).encode() + b'\n')
             await writer.drain()
         except Exception as e:
             self.set_connection_status('Disconnected')
+    async def _prompt_login(self):
+        dialog = LoginDialog()
+        await self.notifier.ask(dialog)
+        return dialog.get_credentials()
+    def _quit_after_notice(self):
+        # Leave the last notice up for a moment before exiting
+        self.quitting = True
+        QTimer.singleShot(NOTICE_TIMEOUT * 1000, self._exit)
+    def show_auth_error_dialog(self, message):
+        self.notifier.notify('Login Failed', message, 'error')
+    def show_admin_access_dialog(self):
+        self.notifier.notify('Admin Access', 'Admin login accepted. Exiting.')
+    def show_session_error_dialog(self, message):
+        self.notifier.notify('Session Error', message, 'warning')
     def _get_local_ip(self, server_ip):
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -282,30 +346,58 @@ class Client2App:
                 data = await reader.readline()
                 if not data:
                     break
-                msg = data.decode().strip()
-                if not msg:
+                if not data.strip():
                     continue
                 try:
-                    msg_dict = json.loads(msg)
+                    msg_dict = decode_frame(data, self.features)
                 except Exception:
                     continue
+                seq = msg_dict.get('seq')
+                msg_id = msg_dict.get('msg_id')
+                if seq is not None:
+                    if self.last_seq is not None and seq <= self.last_seq:
+                        # Already applied before the reconnect; the ack may have been lost with the connection
+                        self._acknowledge(writer, msg_id)
+                        continue
+                    self.last_seq = seq
                 msg_type = msg_dict.get('type')
+                error = None
                 if msg_type == 'auth_success':
+                    # Servers that understand the handshake answer with their own version fields
+                    self.features = negotiate(self.handshake, parse_handshake(msg_dict))
+                    self.credentials = None
+                    if msg_dict.get('resume_token'):
+                        self.resume_token = msg_dict['resume_token']
+                    if not msg_dict.get('resumed'):
+                        self.last_seq = None
+                    if self.tls:
+                        self.tls.remember(writer.get_extra_info('ssl_object'))
                     minutes = msg_dict.get('minutes', 0)
                     self.set_connection_status(f'Connected (Available time: {minutes} minutes)')
+                    self._set_heartbeat_interval(msg_dict.get('heartbeat_interval'))
+                elif msg_type == 'heartbeat':
+                    self._set_heartbeat_interval(msg_dict.get('interval'))
+                elif msg_type == 'auth_error' and self.handshake.resume_token:
+                    # Token expired or server restarted: fall back to a normal login
+                    self.resume_token = None
+                    self.last_seq = None
+                    writer.close()
+                    break
                 elif msg_type == 'auth_error':
+                    # Say why and ask again; the reconnect loop brings the login back up
                     error_msg = msg_dict.get('message', 'Authentication failed')
+                    self.credentials = None
                     self.show_auth_error_dialog(error_msg)
                     writer.close()
                     self.loop.create_task(writer.wait_closed())
-                    self.app.quit()
-                    return
+                    break
                 elif msg_type == 'admin_auth_success':
+                    self.credentials = None
                     self.show_admin_access_dialog()
                     writer.close()
                     self.loop.create_task(writer.wait_closed())
-                    self.app.quit()
-                    return
+                    self._quit_after_notice()
+                    break
                 elif msg_type == 'session_started':
                     duration = msg_dict.get('duration', 0)
                     self.start_session(duration)
@@ -314,10 +406,29 @@ class Client2App:
                 elif msg_type == 'session_error':
                     error_msg = msg_dict.get('message', 'Session error')
                     self.show_session_error_dialog(error_msg)
+                elif msg_id is not None:
+                    error = f'Unsupported command {msg_type}'
+                self._acknowledge(writer, msg_id, error)
             except Exception:
                 break
+        self.heartbeat_timer.stop()
         self.set_connection_status('Disconnected')
         self.receiver_task = None
+    def _acknowledge(self, writer, msg_id, error=None):
+        if msg_id is not None and self.features.supports(Capability.ACK):
+            writer.write(encode_message(create_ack(None, msg_id, error), self.features))
+    def _set_heartbeat_interval(self, interval):
+        # Servers without the heartbeat capability expect the default interval
+        if not interval or not self.features.supports(Capability.HEARTBEAT):
+            interval = HEARTBEAT_INTERVAL
+        self.heartbeat_timer.start(interval * 1000)
+    def _send_heartbeat(self):
+        if self.writer is None or self.writer.is_closing():
+            return
+        if self.features.supports(Capability.HEARTBEAT):
+            self.writer.write(HEARTBEAT_FRAME)
+        else:
+            self.writer.write(encode_message(create_heartbeat(None), self.features))
     def _show_blank(self):
         self.overlay.hide()
         self.blank.show_blank(status=f'Status: {self.connection_status}')
@@ -337,12 +448,16 @@ class Client2App:
         self.session_timer.start(1000)
     def end_session(self):
         self.session_active = False
+        # The next customer has to log in
+        self.resume_token = None
+        self.last_seq = None
         self.session_timer.stop()
         self.remaining_time = 0
         self._notified_5min = False
         self._notified_1min = False
         self._show_blank()
         self.set_connection_status('Disconnected')
+        self.heartbeat_timer.stop()
         if self.receiver_task is not None:
             self.receiver_task.cancel()
             self.receiver_task = None
@@ -0,0 +1,258 @@
+"""
+Client list model for the admin panel, refreshed in batches from a change queue.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, QRegularExpression, QSortFilterProxyModel, Qt, QTimer
+
+REFRESH_RATE = 10  # model refreshes per second, at most
+MAX_RANGES = 256  # dataChanged signals per refresh; more changed runs are sent as one spanning range
+
+# (field, header) per column
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('client_id', 'Client'),
+    ('ip', 'IP'),
+    ('state', 'State'),
+    ('remaining_time', 'Time left'),
+    ('active_apps', 'Apps'),
+    ('rtt', 'Round trip'),
+)
+COLUMN_OF = {name: column for column, (name, _) in enumerate(COLUMNS)}
+STATE_COLUMN = COLUMN_OF['state']
+
+CLIENT_ID_ROLE = Qt.UserRole
+SORT_ROLE = Qt.UserRole + 1  # raw value, so numbers sort as numbers
+SEARCH_ROLE = Qt.UserRole + 2  # client id and IP, what the search box matches
+
+class ClientChanges:
+    """Changes for the admin client list, merged per client until the model takes them.
+
+    ``put`` has the signature of ClientRegistry.on_change and is called on
+    the server's event loop; the model drains the queue on the GUI thread,
+    so a client that changed fifty times between two refreshes costs one row
+    update. None in place of the fields means the client left.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.received = 0
+
+    def put(self, client_id: str, fields: Optional[Dict[str, Any]]):
+        with self._lock:
+            self.received += 1
+            pending = self._pending.get(client_id)
+            if fields is None or pending is None:
+                self._pending[client_id] = dict(fields) if fields is not None else None
+            else:
+                pending.update(fields)
+
+    def drain(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+def _display(name: str, value: Any) -> str:
+    if value is None:
+        return ''
+    if name == 'remaining_time':
+        value = int(value)
+        return f'{value // 3600}:{value % 3600 // 60:02d}:{value % 60:02d}'
+    if name == 'active_apps':
+        return ', '.join(value)
+    if name == 'rtt':
+        return f'{value * 1000:.0f} ms'
+    return str(value)
+
+def _sort_key(name: str, value: Any) -> Any:
+    if name in ('remaining_time', 'rtt'):
+        return -1 if value is None else value
+    if name == 'active_apps':
+        return ', '.join(value or ())
+    return '' if value is None else value
+
+class ClientTableModel(QAbstractTableModel):
+    """One row per connected kiosk, fed by a ClientChanges queue.
+
+    Nothing is applied as it arrives: ``refresh`` runs at most
+    ``refresh_rate`` times a second, applies what the queue merged, inserts
+    and removes rows in blocks, and reports changed cells as dataChanged
+    ranges over consecutive rows and only the columns that changed.
+
+    The model sorts itself (``sort``), once per refresh and only if a sort
+    key changed, with one key per row and a layout change. A sorting proxy
+    would instead move every changed row on its own, calling ``data`` twice
+    per comparison, which at a thousand updates a second costs more than
+    everything else together. Filter with ClientFilters.
+    """
+
+    def __init__(self, changes: ClientChanges, refresh_rate: float = REFRESH_RATE,
+                 max_ranges: int = MAX_RANGES, parent=None):
+        super().__init__(parent)
+        self.changes = changes
+        self.max_ranges = max_ranges
+        self.refreshes = 0
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self._ids: List[str] = []
+        self._rows: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        if refresh_rate:
+            self._timer.start(int(1000 / refresh_rate))
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section: int, orientation, role: int = Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section][1]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        name = COLUMNS[index.column()][0]
+        if role == Qt.DisplayRole:
+            return _display(name, row.get(name))
+        if role == SORT_ROLE:
+            return _sort_key(name, row.get(name))
+        if role == SEARCH_ROLE:
+            return f"{row['client_id']} {row.get('ip') or ''}"
+        if role == CLIENT_ID_ROLE:
+            return row['client_id']
+        if role == Qt.TextAlignmentRole and name in ('remaining_time', 'rtt'):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def client_id(self, row: int) -> str:
+        return self._ids[row]
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        self.sort_column, self.sort_order = column, order
+        self._resort()
+
+    def refresh(self):
+        """Apply the queued changes. Called by the refresh timer."""
+        changes = self.changes.drain()
+        if not changes:
+            return
+        self.refreshes += 1
+        gone = [self._row_of[client_id] for client_id, fields in changes.items()
+                if fields is None and client_id in self._row_of]
+        if gone:
+            self._remove_rows(gone)
+        added = []
+        resort = False
+        touched: Dict[int, Tuple[int, int]] = {}  # row -> (first, last) changed column
+        for client_id, fields in changes.items():
+            if fields is None:
+                continue
+            row = self._row_of.get(client_id)
+            if row is None:
+                added.append(dict(fields, client_id=client_id))
+                continue
+            values = self._rows[row]
+            columns = [COLUMN_OF[name] for name, value in fields.items()
+                       if name in COLUMN_OF and values.get(name) != value]
+            if columns:
+                values.update(fields)
+                touched[row] = (min(columns), max(columns))
+                resort = resort or self.sort_column in columns
+        if added:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for offset, values in enumerate(added):
+                self._ids.append(values['client_id'])
+                self._row_of[values['client_id']] = first + offset
+                self._rows.append(values)
+            self.endInsertRows()
+        if touched:
+            self._emit_changed(touched)
+        if (resort or added) and self.sort_column >= 0:
+            self._resort()
+
+    def _remove_rows(self, rows: List[int]):
+        rows.sort(reverse=True)
+        start = 0
+        while start < len(rows):
+            end = start
+            while end + 1 < len(rows) and rows[end + 1] == rows[end] - 1:
+                end += 1
+            first, last = rows[end], rows[start]
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._ids[first:last + 1]
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+            start = end + 1
+        self._row_of = {client_id: row for row, client_id in enumerate(self._ids)}
+
+    def _resort(self):
+        if self.sort_column < 0:
+            return
+        name = COLUMNS[self.sort_column][0]
+        self.layoutAboutToBeChanged.emit()
+        order = sorted(range(len(self._rows)), key=lambda row: _sort_key(name, self._rows[row].get(name)),
+                       reverse=self.sort_order == Qt.DescendingOrder)
+        self._ids = [self._ids[row] for row in order]
+        self._rows = [self._rows[row] for row in order]
+        self._row_of = {client_id: row for row, client_id in enumerate(self._ids)}
+        moved = [0] * len(order)
+        for new, old in enumerate(order):
+            moved[old] = new
+        persistent = self.persistentIndexList()
+        self.changePersistentIndexList(persistent, [self.index(moved[index.row()], index.column())
+                                                    for index in persistent])
+        self.layoutChanged.emit()
+
+    def _emit_changed(self, touched: Dict[int, Tuple[int, int]]):
+        rows = sorted(touched)
+        runs = []  # [first row, last row, first column, last column]
+        for row in rows:
+            first, last = touched[row]
+            if runs and runs[-1][1] == row - 1:
+                run = runs[-1]
+                run[1], run[2], run[3] = row, min(run[2], first), max(run[3], last)
+            else:
+                runs.append([row, row, first, last])
+        if len(runs) > self.max_ranges:
+            runs = [[rows[0], rows[-1], min(run[2] for run in runs), max(run[3] for run in runs)]]
+        for first_row, last_row, first_column, last_column in runs:
+            self.dataChanged.emit(self.index(first_row, first_column), self.index(last_row, last_column))
+
+class ClientFilters:
+    """Proxy models over a ClientTableModel: a state filter, then a search.
+
+    Both use Qt's own matching on roles the model provides. They keep the
+    source's order and hand sorting to it: show ``model`` in the view and
+    connect the header's sortIndicatorChanged to ``sort``.
+    """
+
+    def __init__(self, source: ClientTableModel):
+        self.by_state = QSortFilterProxyModel()
+        self.by_state.setSourceModel(source)
+        self.by_state.setFilterKeyColumn(STATE_COLUMN)
+        self.model = QSortFilterProxyModel()
+        self.model.setSourceModel(self.by_state)
+        self.model.setFilterKeyColumn(0)
+        self.model.setFilterRole(SEARCH_ROLE)
+        self.model.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.source = source
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        """Sort by a column (columns are the same at every level)."""
+        self.source.sort(column, order)
+
+    def set_state(self, state: Optional[str]):
+        """Show only clients in this session state (None for all)."""
+        pattern = f'^{QRegularExpression.escape(state)}$' if state else ''
+        self.by_state.setFilterRegularExpression(pattern)
+
+    def set_search(self, text: str):
+        """Show only clients whose id or IP contains text."""
+        self.model.setFilterFixedString(text)
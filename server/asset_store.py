@@ -0,0 +1,101 @@
+"""
+Content-addressed store of icons and small assets served to kiosks.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from shared.constants import ASSET_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = 'assets'
+CACHE_BYTES = 64 * 1024 * 1024  # asset bytes kept in memory for serving
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+class AssetStore:
+    """Blobs named by their SHA-256 under directory, served in chunks.
+
+    ``publish`` copies a file in (hashing it only when its size or mtime
+    changed); ``attach_icons`` does that for the icon_path of each app and
+    adds the icon_sha256 kiosks fetch by. Served blobs are kept in an LRU
+    of CACHE_BYTES, so an asset sent to the whole fleet is read from disk
+    once per worker, however many kiosks ask for it.
+    """
+
+    def __init__(self, directory: str = ASSETS_DIR, cache_bytes: int = CACHE_BYTES):
+        self.directory = directory
+        self.cache_bytes = cache_bytes
+        self.disk_reads = 0
+        self._cache: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._cached_bytes = 0
+        self._published: Dict[Tuple[str, int, int], str] = {}  # (path, size, mtime) -> digest
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def publish(self, source: str) -> str:
+        """Add a file to the store; returns its SHA-256."""
+        stat = os.stat(source)
+        key = (os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+        digest = self._published.get(key)
+        if digest is not None and os.path.exists(self.path(digest)):
+            return digest
+        sha = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        target = self.path(digest)
+        if not os.path.exists(target):
+            tmp = target + '.tmp'
+            shutil.copyfile(source, tmp)
+            os.replace(tmp, target)
+            logger.info(f"Published {source} as asset {digest}")
+        self._published[key] = digest
+        return digest
+
+    def attach_icons(self, apps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copy of apps with icon_sha256 set for every icon_path that exists on this machine."""
+        result = []
+        for app in apps:
+            icon_path = app.get('icon_path')
+            if icon_path and os.path.isfile(icon_path):
+                try:
+                    app = dict(app, icon_sha256=self.publish(icon_path))
+                except OSError as e:
+                    logger.error(f"Could not publish icon {icon_path}: {e}")
+            result.append(app)
+        return result
+
+    def chunk(self, digest: str, offset: int, size: int = ASSET_CHUNK_SIZE) -> Optional[Tuple[int, bytes]]:
+        """(total size, bytes at offset) of an asset, or None if it is not in the store."""
+        data = self._load(digest)
+        if data is None:
+            return None
+        return len(data), data[offset:offset + size]
+
+    def _load(self, digest: str) -> Optional[bytes]:
+        data = self._cache.get(digest)
+        if data is not None:
+            self._cache.move_to_end(digest)
+            return data
+        if not _DIGEST.match(digest or ''):
+            return None
+        try:
+            with open(self.path(digest), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        self.disk_reads += 1
+        if len(data) <= self.cache_bytes:
+            self._cache[digest] = data
+            self._cached_bytes += len(data)
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+        return data
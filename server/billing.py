@@ -0,0 +1,200 @@
+"""
+Prepaid-time accounts with batched ledger writes.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LEDGER_DB = 'ledger.db'
+PASSWORD_ITERATIONS = 100_000
+_SET_PASSWORD = ("INSERT INTO accounts (username, password_hash) VALUES (?, ?) "
+                 "ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash")
+
+class BillingLedger:
+    """Account balances (in seconds) backed by SQLite.
+
+    Debits are accumulated in memory and written by ``flush()`` as one
+    transaction: a balance update per account plus one ledger row per
+    (account, client) pair. Balances are read from the database minus this
+    process's pending debits, so several server workers can share one file.
+    The flush writes on a connection of its own, holding the lock only to
+    take the pending debits, so ``debit`` and ``balance`` on the event loop
+    never wait for the disk.
+
+    Committed changes are passed to ``on_change`` so a cluster can replicate
+    them; ``apply_replicated`` writes another node's changes exactly once,
+    remembering the last sequence number applied from each origin.
+    """
+
+    def __init__(self, path: str = LEDGER_DB):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS accounts (
+                username TEXT PRIMARY KEY,
+                balance_seconds INTEGER NOT NULL DEFAULT 0,
+                password_hash TEXT
+            );
+            CREATE TABLE IF NOT EXISTS ledger (
+                ts REAL NOT NULL,
+                username TEXT NOT NULL,
+                client_id TEXT,
+                seconds INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS replicated (
+                origin TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL
+            );
+        """)
+        self._lock = threading.Lock()
+        self._writer = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._write_lock = threading.Lock()
+        self._pending: Dict[Tuple[str, Optional[str]], float] = {}
+        self._owed: Dict[str, float] = {}  # account -> sum of its pending debits
+        self.on_change: Optional[Callable[[str, Dict[str, Any]], None]] = None  # (kind, data) of each local write
+
+    def balance(self, account: str) -> int:
+        """Remaining prepaid seconds, including debits not yet flushed."""
+        with self._lock:
+            row = self._db.execute("SELECT balance_seconds FROM accounts WHERE username = ?", (account,)).fetchone()
+            return max(0, (row[0] if row else 0) - int(self._owed.get(account, 0.0)))
+
+    def minutes(self, account: str) -> int:
+        return self.balance(account) // 60
+
+    def credit(self, account: str, seconds: int):
+        """Top up an account. Written immediately; top-ups are rare."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO accounts (username, balance_seconds) VALUES (?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET balance_seconds = balance_seconds + excluded.balance_seconds",
+                (account, seconds)
+            )
+            now = time.time()
+            self._db.execute("INSERT INTO ledger VALUES (?, ?, NULL, ?)", (now, account, seconds))
+            self._db.commit()
+        self._changed('ledger', {'rows': [[now, account, None, seconds]]})
+
+    def debit(self, account: str, seconds: float, client_id: Optional[str] = None):
+        """Record usage; it is written at the next flush."""
+        if seconds <= 0:
+            return
+        with self._lock:
+            key = (account, client_id)
+            self._pending[key] = self._pending.get(key, 0.0) + seconds
+            self._owed[account] = self._owed.get(account, 0.0) + seconds
+
+    def flush(self) -> int:
+        """Write pending debits in one transaction. Returns the number of ledger rows written."""
+        rows = self.write_pending()
+        self.published(rows)
+        return len(rows)
+
+    def write_pending(self) -> List[Tuple[float, str, Optional[str], int]]:
+        """The write half of ``flush()``: safe to run on any thread, tells ``on_change`` nothing.
+
+        Pass the rows it returns to ``published()`` on the thread that owns ``on_change``.
+        """
+        with self._lock:
+            if not self._pending:
+                return []
+            pending, self._pending = self._pending, {}
+            now = time.time()
+            written: Dict[Tuple[str, Optional[str]], int] = {}
+            for (account, client_id), seconds in pending.items():
+                whole = int(seconds)
+                if seconds - whole:
+                    # Carry fractions over so rounding never loses time
+                    self._pending[(account, client_id)] = seconds - whole
+                if whole:
+                    written[(account, client_id)] = whole
+        rows = [(now, account, client_id, -whole) for (account, client_id), whole in written.items()]
+        totals: Dict[str, int] = {}
+        for (account, _), whole in written.items():
+            totals[account] = totals.get(account, 0) + whole
+        # Until it commits, the debits being written stay in _owed, so balances never read high
+        try:
+            with self._write_lock, self._writer:
+                self._writer.executemany("INSERT INTO ledger VALUES (?, ?, ?, ?)", rows)
+                self._writer.executemany(
+                    "UPDATE accounts SET balance_seconds = MAX(0, balance_seconds - ?) WHERE username = ?",
+                    [(seconds, account) for account, seconds in totals.items()]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error flushing ledger: {e}")
+            with self._lock:
+                for key, whole in written.items():
+                    self._pending[key] = self._pending.get(key, 0.0) + whole
+            return []
+        with self._lock:
+            for account, seconds in totals.items():
+                owed = self._owed.get(account, 0.0) - seconds
+                if owed > 1e-9:
+                    self._owed[account] = owed
+                else:
+                    self._owed.pop(account, None)
+        return rows
+
+    def published(self, rows: List[Tuple[float, str, Optional[str], int]]):
+        """Pass rows written by ``write_pending()`` to ``on_change``."""
+        if rows:
+            self._changed('ledger', {'rows': rows})
+
+    def set_password(self, account: str, password: str):
+        salt = os.urandom(16)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PASSWORD_ITERATIONS)
+        password_hash = f"{salt.hex()}:{digest.hex()}"
+        with self._lock:
+            self._db.execute(_SET_PASSWORD, (account, password_hash))
+            self._db.commit()
+        self._changed('password', {'account': account, 'hash': password_hash})
+
+    def verify_password(self, account: str, password: str) -> bool:
+        """Check credentials. CPU-heavy by design; call it off the event loop."""
+        with self._lock:
+            row = self._db.execute("SELECT password_hash FROM accounts WHERE username = ?", (account,)).fetchone()
+        if not row or not row[0]:
+            return False
+        salt, digest = row[0].split(':')
+        candidate = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), PASSWORD_ITERATIONS)
+        return hmac.compare_digest(candidate.hex(), digest)
+
+    def apply_replicated(self, origin: str, seq: int, kind: str, data: Dict[str, Any]) -> bool:
+        """Write a change another node committed. False if it was applied before."""
+        with self._lock:
+            row = self._db.execute("SELECT seq FROM replicated WHERE origin = ?", (origin,)).fetchone()
+            if row and row[0] >= seq:
+                return False
+            with self._db:
+                if kind == 'ledger':
+                    rows = [tuple(row) for row in data['rows']]
+                    self._db.executemany("INSERT INTO ledger VALUES (?, ?, ?, ?)", rows)
+                    self._db.executemany(
+                        "INSERT INTO accounts (username, balance_seconds) VALUES (?, MAX(0, ?)) "
+                        "ON CONFLICT(username) DO UPDATE SET balance_seconds = MAX(0, balance_seconds + ?)",
+                        [(account, seconds, seconds) for _, account, _, seconds in rows]
+                    )
+                elif kind == 'password':
+                    self._db.execute(_SET_PASSWORD, (data['account'], data['hash']))
+                self._db.execute("INSERT OR REPLACE INTO replicated VALUES (?, ?)", (origin, seq))
+            return True
+
+    def _changed(self, kind: str, data: Dict[str, Any]):
+        if self.on_change is not None:
+            try:
+                self.on_change(kind, data)
+            except Exception as e:
+                logger.error(f"Error replicating {kind} change: {e}")
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        self._db.close()
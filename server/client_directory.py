@@ -0,0 +1,124 @@
+"""
+Directory of which server worker holds which client connection.
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ClientDirectory:
+    """client_id -> worker_id map replicated to every worker.
+
+    Each worker owns an inbox queue. Registrations are published to the other
+    workers' inboxes, so lookups are local dict reads; admin commands for a
+    client held elsewhere are put on the owner's inbox and applied there,
+    and if the sender waits for the kiosk's answer the owner posts the
+    result back to the sender's inbox.
+    There is no central process: the queues are the only shared state.
+    When a client reconnects to a different worker, the previous worker sees
+    the registration and can hand its session state over with ``handoff``.
+    In a cluster, replicated log entries and the other nodes' loads travel
+    between worker 0 (which holds the links to other nodes) and the rest.
+    """
+
+    def __init__(self, worker_id: int, inboxes: List[Any]):
+        self.worker_id = worker_id
+        self.inboxes = inboxes
+        self.owners: Dict[str, int] = {}
+        self.on_command: Optional[Callable[[str, Dict[str, Any], Optional[Tuple[int, int]]], None]] = None
+        self.on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self.on_registered_elsewhere: Optional[Callable[[str, int], None]] = None
+        self.on_handoff: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self.on_cluster: Optional[Callable[[List[Any]], None]] = None
+        self.on_nodes: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _publish(self, item):
+        for worker_id, inbox in enumerate(self.inboxes):
+            if worker_id != self.worker_id:
+                inbox.put(item)
+
+    def register(self, client_id: str):
+        self.owners[client_id] = self.worker_id
+        self._publish(('register', client_id, self.worker_id))
+
+    def unregister(self, client_id: str):
+        if self.owners.get(client_id) == self.worker_id:
+            del self.owners[client_id]
+            self._publish(('unregister', client_id, self.worker_id))
+
+    def owner(self, client_id: str) -> Optional[int]:
+        return self.owners.get(client_id)
+
+    def forward(self, client_id: str, data: Dict[str, Any], reply_to: Optional[Tuple[int, int]] = None) -> bool:
+        """Send a command to the worker holding client_id. False if no other worker has it.
+
+        reply_to is (worker_id, request_id) when the sender wants the kiosk's answer back.
+        """
+        owner = self.owners.get(client_id)
+        if owner is None or owner == self.worker_id:
+            return False
+        self.inboxes[owner].put(('command', client_id, (data, reply_to)))
+        return True
+
+    def reply(self, reply_to: Tuple[int, int], client_id: str, result: Dict[str, Any]):
+        """Return the result of a forwarded command to the worker that sent it."""
+        worker_id, request_id = reply_to
+        self.inboxes[worker_id].put(('result', client_id, dict(result, request_id=request_id)))
+
+    def handoff(self, client_id: str, worker_id: int, data: Dict[str, Any]):
+        """Send a client's state to the worker that now holds it."""
+        self.inboxes[worker_id].put(('handoff', client_id, data))
+
+    def send_cluster(self, worker_id: int, entries: List[Any]):
+        """Pass replicated log entries to one worker."""
+        self.inboxes[worker_id].put(('cluster', None, entries))
+
+    def publish_cluster(self, entries: List[Any]):
+        self._publish(('cluster', None, entries))
+
+    def publish_nodes(self, nodes: Dict[str, Any]):
+        """Tell the other workers which cluster nodes are up and their loads."""
+        self._publish(('nodes', None, nodes))
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start applying inbox items on loop."""
+        def reader():
+            inbox = self.inboxes[self.worker_id]
+            while True:
+                item = inbox.get()
+                if item is None:
+                    return
+                loop.call_soon_threadsafe(self._apply, item)
+        self._thread = threading.Thread(target=reader, name=f'ClientDirectory-{self.worker_id}', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self.inboxes[self.worker_id].put(None)
+            self._thread = None
+
+    def _apply(self, item):
+        kind, client_id, value = item
+        try:
+            if kind == 'register':
+                self.owners[client_id] = value
+                if self.on_registered_elsewhere is not None:
+                    self.on_registered_elsewhere(client_id, value)
+            elif kind == 'unregister':
+                if self.owners.get(client_id) == value:
+                    del self.owners[client_id]
+            elif kind == 'command' and self.on_command is not None:
+                self.on_command(client_id, *value)
+            elif kind == 'result' and self.on_result is not None:
+                self.on_result(client_id, value)
+            elif kind == 'handoff' and self.on_handoff is not None:
+                self.on_handoff(client_id, value)
+            elif kind == 'cluster' and self.on_cluster is not None:
+                self.on_cluster(value)
+            elif kind == 'nodes' and self.on_nodes is not None:
+                self.on_nodes(value)
+        except Exception as e:
+            logger.error(f"Error applying {kind} for {client_id}: {e}")
@@ -0,0 +1,793 @@
+"""
+Connection handling and admin commands for kiosk clients.
+"""
+import asyncio
+import base64
+import logging
+import os
+import socket
+import ssl
+import time
+from collections import Counter
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from shared.constants import (
+    MessageType, SessionState, Capability, JournalEvent, HEARTBEAT_INTERVAL, MAX_HEARTBEAT_INTERVAL,
+    HEARTBEAT_FLEET_STEP, DEFAULT_SERVER_HOST, DEFAULT_SERVER_PORT
+)
+from shared.protocol import (
+    Message, AssetMessage, HandshakeMessage, SessionMessage,
+    create_ack, create_handshake, create_allowed_apps, create_clock_heartbeat, create_heartbeat, create_redirect,
+    create_telemetry_interval,
+    handshake_fields, message_from_dict, negotiate, parse_handshake
+)
+from shared.clock_sync import ClockSync
+from shared.telemetry import TelemetryView
+from shared.transport import FrameProtocol
+from .asset_store import AssetStore
+from .billing import BillingLedger
+from .client_directory import ClientDirectory
+from .cluster import Cluster
+from .client_registry import ClientConnection, ClientRegistry
+from .event_log import EventKind, EventLog
+from .pending_requests import CommandResult, CommandStatus, PendingRequests
+from .resumption import RESUME_WINDOW, ReplayLog, ResumptionTokens
+from .screen_monitor import ScreenMonitor, ScreenView
+from .session_scheduler import SessionScheduler
+from .usage_rollups import UsageRollups
+
+logger = logging.getLogger(__name__)
+
+# Connections silent for this many heartbeat intervals are dropped
+MISSED_HEARTBEATS = 3
+# Event loop lag (seconds) above which heartbeats are slowed down
+HEARTBEAT_LAG_THRESHOLD = 0.1
+# Clients whose output has been held back this long (seconds) are dropped
+SLOW_CLIENT_TIMEOUT = 30
+
+_SESSION_EVENTS = frozenset({
+    EventKind.SESSION_START, EventKind.SESSION_PAUSE, EventKind.SESSION_RESUME,
+    EventKind.SESSION_EXTEND, EventKind.SESSION_END,
+})
+# Session commands that set a running session's deadline
+_DEADLINE_MESSAGES = frozenset({MessageType.SESSION_START, MessageType.SESSION_RESUME, MessageType.SESSION_EXTEND})
+
+def heartbeat_interval_for(fleet: int, lag: float = 0.0) -> int:
+    """Heartbeat interval (seconds) for a fleet of this size and the current event loop lag."""
+    interval = HEARTBEAT_INTERVAL * (1 + fleet // HEARTBEAT_FLEET_STEP)
+    if lag > HEARTBEAT_LAG_THRESHOLD:
+        interval *= 2
+    return min(interval, MAX_HEARTBEAT_INTERVAL)
+
+class ClientManager:
+    """Accepts kiosk connections and routes admin commands to them.
+
+    In multi-worker mode each worker runs its own ClientManager over a shard
+    of the connections; commands for a client held by another worker are
+    forwarded through the ClientDirectory.
+
+    Clients that negotiate RESUME get a signed token on connect and a
+    sequence number on every frame. Reconnecting with the token and the last
+    sequence number seen replays just the missed frames from the replay log
+    (or a session snapshot if the log no longer reaches back that far), and
+    an authenticated client2 skips the password check.
+
+    Any frame from a client counts as a heartbeat. Clients that negotiate
+    HEARTBEAT are told an interval that grows with the fleet and when the
+    event loop falls behind, and send a bare empty frame when idle.
+    Clients that negotiate CLOCK stamp their heartbeats instead, and each
+    one is answered, so both ends keep a ClockSync estimate of round-trip
+    time, jitter and clock offset (see ``latency``). Their session commands
+    carry the deadline in the kiosk's own clock.
+
+    Admin commands can be sent with ``request``/``request_all`` to wait for
+    the kiosks' ACK/NACK; many commands are sent back to back and their
+    answers collected together rather than one round trip at a time.
+
+    With a Cluster, sessions are replicated to the other server nodes so a
+    kiosk that fails over (or is redirected to even out the load) carries on
+    where it was; CLUSTER kiosks are sent the list of nodes to fail over to.
+
+    ``clock`` (monotonic) and ``wall_clock`` are what every timeout, deadline
+    and clock estimate is taken from, so the manager can run in simulated
+    time (see shared/simulation.py).
+    """
+
+    def __init__(
+        self,
+        ledger: Optional[BillingLedger] = None,
+        directory: Optional[ClientDirectory] = None,
+        tokens: Optional[ResumptionTokens] = None,
+        events: Optional[EventLog] = None,
+        usage: Optional[UsageRollups] = None,
+        assets: Optional[AssetStore] = None,
+        cluster: Optional[Cluster] = None,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time
+    ):
+        self.ledger = ledger
+        self.directory = directory
+        self.events = events
+        self.usage = usage
+        self.assets = assets
+        self.cluster = cluster
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.tokens = tokens or ResumptionTokens(os.urandom(32), clock=wall_clock)
+        self.clients = ClientRegistry()
+        self.replay: Dict[str, ReplayLog] = {}
+        self.allowed_apps: Dict[str, Tuple[int, List[Dict[str, str]]]] = {}  # client_id -> last versioned list sent
+        self.scheduler = SessionScheduler(self._session_expired, ledger, clock)
+        self.handshake = create_handshake()
+        self.messages_handled = 0
+        self.heartbeat_interval = HEARTBEAT_INTERVAL
+        self.pending = PendingRequests()
+        self.screens = ScreenMonitor(self.send)
+        self._accepting: Dict[FrameProtocol, List[Dict[str, Any]]] = {}
+        if directory is not None:
+            directory.on_command = self._apply_forwarded
+            directory.on_registered_elsewhere = self._registered_elsewhere
+            directory.on_handoff = self._handoff_received
+            directory.on_result = self._forwarded_result
+        if cluster is not None:
+            cluster.load = self.fleet
+            cluster.on_session = self._session_replicated
+
+    # Connections
+
+    async def serve(
+        self,
+        host: str = DEFAULT_SERVER_HOST,
+        port: int = DEFAULT_SERVER_PORT,
+        reuse_port: bool = False,
+        ssl_context: Optional[ssl.SSLContext] = None
+    ):
+        """Accept connections until cancelled, over TLS if ssl_context is given."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        sock.setblocking(False)
+        loop = asyncio.get_running_loop()
+        if self.directory is not None:
+            self.directory.start(loop)
+        server = await loop.create_server(self.make_protocol, sock=sock, backlog=1024, ssl=ssl_context)
+        tasks = self.start()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.pending.cancel_all()
+            if self.directory is not None:
+                self.directory.close()
+
+    def start(self) -> List[asyncio.Task]:
+        """Start the background tasks (session deadlines, stale clients, logs); ``serve`` does this."""
+        tasks = [asyncio.create_task(self.scheduler.run()), asyncio.create_task(self._drop_stale_clients())]
+        if self.events is not None:
+            tasks.append(asyncio.create_task(self.events.run()))
+        if self.usage is not None:
+            tasks.append(asyncio.create_task(self.usage.run()))
+        if self.cluster is not None:
+            tasks.append(asyncio.create_task(self.cluster.run()))
+        return tasks
+
+    def make_protocol(self) -> FrameProtocol:
+        return FrameProtocol(self._frames_received, self._connection_lost, on_superseded=self._superseded,
+                             clock=self.clock)
+
+    def _superseded(self, protocol: FrameProtocol, data: Dict[str, Any]):
+        if data.get('msg_id') is not None and protocol.context is not None:
+            self.pending.resolve(data['msg_id'], protocol.context.client_id, CommandStatus.SUPERSEDED)
+
+    def _frames_received(self, protocol: FrameProtocol, frames: List[Dict[str, Any]]):
+        conn = protocol.context
+        if conn is not None:
+            self._handle_frames(conn, frames)
+            return
+        pending = self._accepting.get(protocol)
+        if pending is not None:
+            # Still authenticating; keep frames until the connection is accepted
+            pending.extend(frames)
+            return
+        first, rest = frames[0], frames[1:]
+        if first.get('type') == MessageType.AUTH and not self.tokens.verify(first.get('resume_token')):
+            self._accepting[protocol] = rest
+            asyncio.ensure_future(self._accept_auth(protocol, first))
+            return
+        conn = self._accept(protocol, first)
+        if rest:
+            self._handle_frames(conn, rest)
+
+    def _connection_lost(self, protocol: FrameProtocol, exc: Optional[Exception]):
+        self._accepting.pop(protocol, None)
+        conn = protocol.context
+        if conn is not None and self.clients.get(conn.client_id) is conn:
+            self.clients.remove(conn.client_id)
+            if self.directory is not None:
+                self.directory.unregister(conn.client_id)
+            log = self.replay.get(conn.client_id)
+            if log is not None:
+                log.detached_at = self.clock()
+            logger.info(f"Client {conn.client_id} disconnected")
+            self._record(EventKind.DISCONNECT, conn.client_id)
+            if self.cluster is not None and conn.client_id in self.cluster.sessions:
+                # The kiosk may already have been taken over before this connection noticed
+                self._session_replicated(conn.client_id, self.cluster.sessions[conn.client_id]['holder'])
+
+    def _negotiate(self, protocol: FrameProtocol, first: Dict[str, Any]) -> Tuple[HandshakeMessage, Optional[str]]:
+        remote = parse_handshake(first)
+        protocol.features = negotiate(self.handshake, remote)
+        peer = protocol.transport.get_extra_info('peername')
+        client_ip = remote.client_ip or (peer[0] if peer else None)
+        return remote, client_ip
+
+    def _accept(self, protocol: FrameProtocol, first: Dict[str, Any]) -> ClientConnection:
+        remote, client_ip = self._negotiate(protocol, first)
+        claims = self.tokens.verify(remote.resume_token)
+        peer = protocol.transport.get_extra_info('peername')
+        if claims is not None:
+            client_id = claims['cid']
+        else:
+            client_id = remote.client_id or client_ip or f'{peer[0]}:{peer[1]}'
+        conn = self._register(client_id, client_ip, protocol)
+        if first.get('type') == MessageType.AUTH:
+            # client2 reconnecting with a token instead of credentials
+            conn.account = claims.get('acct')
+            reply = {
+                'type': MessageType.AUTH_SUCCESS,
+                'client_id': client_id,
+                'minutes': self.ledger.minutes(conn.account) if self.ledger and conn.account else 0,
+            }
+            reply.update(handshake_fields(self.handshake))
+            reply['resume_token'] = self.tokens.issue(client_id, conn.account)
+            reply['resumed'] = True
+            if protocol.features.supports(Capability.HEARTBEAT):
+                reply['heartbeat_interval'] = conn.heartbeat_interval = self.heartbeat_interval
+            self._add_servers(protocol, reply)
+            protocol.send_frame(reply)
+        elif remote.protocol_version >= 1:
+            reply = create_handshake(client_id)
+            if protocol.features.supports(Capability.HEARTBEAT):
+                reply.heartbeat_interval = conn.heartbeat_interval = self.heartbeat_interval
+            if protocol.features.supports(Capability.RESUME):
+                reply.resume_token = self.tokens.issue(client_id)
+                reply.resumed = claims is not None
+            if self.cluster is not None and protocol.features.supports(Capability.CLUSTER):
+                reply.servers = self.cluster.servers()
+            protocol.send(reply)
+            if protocol.features.supports(Capability.CLOCK):
+                # An unanswered stamp: the kiosk answers at once, giving the first sample
+                conn.clock = ClockSync(self.wall_clock)
+                protocol.send_frame(create_clock_heartbeat(conn.clock.stamp()))
+        replayed = False
+        if claims is not None:
+            replayed = self._resume(conn, remote.last_seq)
+        else:
+            self.replay.pop(client_id, None)
+            self._send_snapshot(conn)  # a session can outlive its kiosk's token (a long connection, then a drop)
+        if not replayed and first.get('type') != MessageType.AUTH:
+            self._send_allowed_apps(conn, remote.apps_version)
+        return conn
+
+    def _resume(self, conn: ClientConnection, last_seq: Optional[int]) -> bool:
+        """Send a resuming client what it missed. Returns False if only a snapshot could be sent."""
+        conn.resume_seq = last_seq
+        log = self.replay.get(conn.client_id)
+        if log is None:
+            # Nothing here; if another worker held the client it will hand its state over
+            self.replay[conn.client_id] = ReplayLog((last_seq or 0) + 1)
+            self._send_snapshot(conn)
+            return False
+        log.detached_at = None
+        frames = log.since(last_seq)
+        if frames is None:
+            self._send_snapshot(conn)
+            return False
+        for data in frames:
+            conn.protocol.send_frame(data)
+        return True
+
+    def _send_snapshot(self, conn: ClientConnection):
+        """Resync a client whose missed frames are gone: its session state and time left."""
+        state = self.scheduler.state(conn.client_id)
+        if state is None:
+            return
+        remaining = self.scheduler.remaining(conn.client_id)
+        self.clients.update(conn, state=state, remaining_time=remaining)
+        if conn.account:
+            if state == SessionState.ACTIVE:
+                self._send_data(conn, {'type': MessageType.SESSION_STARTED, 'duration': remaining})
+            return
+        message_type = MessageType.SESSION_START if state == SessionState.ACTIVE else MessageType.SESSION_PAUSE
+        self._send_data(conn, asdict(SessionMessage(type=message_type, client_id=conn.client_id,
+                                                    duration=remaining, state=state)))
+
+    def _send_allowed_apps(self, conn: ClientConnection, cached_version: Optional[int]):
+        """Send a kiosk the app list it was last given unless the copy it has cached is that version."""
+        latest = self.allowed_apps.get(conn.client_id)
+        if latest is None or not conn.features.supports(Capability.APPS_VERSION):
+            return
+        version, apps = latest
+        if cached_version is not None and cached_version >= version:
+            logger.debug(f"Client {conn.client_id} has app list v{cached_version} cached; not resending it")
+            return
+        conn.protocol.send(create_allowed_apps(conn.client_id, apps, version))
+
+    def _add_servers(self, protocol: FrameProtocol, reply: Dict[str, Any]):
+        if self.cluster is not None and protocol.features.supports(Capability.CLUSTER):
+            reply['servers'] = self.cluster.servers()
+
+    def _adopt_session(self, client_id: str):
+        """Continue the session a kiosk had on another node (or worker) before it came here."""
+        session = self.cluster.session(client_id)
+        if session is None or self.scheduler.state(client_id) is not None:
+            return
+        self.scheduler.restore(client_id, session)
+        if self.usage is not None and session['state'] == SessionState.ACTIVE:
+            self.usage.start(client_id)
+        logger.info(f"Client {client_id} continues its session from another node "
+                    f"({session['state']}, {int(session['remaining'])}s left)")
+        self.cluster.publish_session(client_id, self.scheduler.snapshot(client_id))
+
+    def _session_replicated(self, client_id: str, holder: str):
+        """Another worker or node took over (or changed) a kiosk's session; drop our copy if the kiosk left."""
+        if holder == self.cluster.origin or client_id in self.clients or self.scheduler.state(client_id) is None:
+            return
+        self.scheduler.export(client_id)
+        self.replay.pop(client_id, None)
+        if self.usage is not None:
+            self.usage.stop(client_id)
+            self.usage.set_apps(client_id, ())
+        logger.info(f"Session of {client_id} moved to {holder}")
+
+    def _registered_elsewhere(self, client_id: str, worker_id: int):
+        """Another worker accepted client_id; hand over whatever we still hold for it."""
+        conn = self.clients.remove(client_id)
+        if conn is not None:
+            # Our connection is half-open; the client has already moved on
+            conn.protocol.context = None
+            conn.protocol.close()
+        log = self.replay.pop(client_id, None)
+        session = self.scheduler.export(client_id)
+        if self.usage is not None:
+            self.usage.stop(client_id)
+            self.usage.set_apps(client_id, ())
+        if log is not None or session is not None:
+            self.directory.handoff(client_id, worker_id, {
+                'replay': log.to_dict() if log is not None else None,
+                'session': session,
+            })
+
+    def _handoff_received(self, client_id: str, data: Dict[str, Any]):
+        if data.get('session') and self.scheduler.state(client_id) is None:
+            self.scheduler.restore(client_id, data['session'])
+            if self.usage is not None and self.scheduler.state(client_id) == SessionState.ACTIVE:
+                self.usage.start(client_id)
+            if self.cluster is not None:
+                self.cluster.publish_session(client_id, self.scheduler.snapshot(client_id))
+        conn = self.clients.get(client_id)
+        if conn is None or conn.resume_seq is None:
+            return
+        frames = ReplayLog.from_dict(data['replay']).since(conn.resume_seq) if data.get('replay') else None
+        if frames is None:
+            self._send_snapshot(conn)
+            return
+        # Renumber into this worker's log so the client sees one increasing sequence
+        for frame in frames:
+            self._send_data(conn, dict(frame))
+
+    async def _accept_auth(self, protocol: FrameProtocol, first: Dict[str, Any]):
+        try:
+            conn = await self._authenticate(protocol, first)
+        except Exception as e:
+            logger.error(f"Error authenticating: {e}")
+            conn = None
+        pending = self._accepting.pop(protocol, [])
+        if conn is None:
+            protocol.close()
+        elif pending:
+            self._handle_frames(conn, pending)
+
+    async def _authenticate(self, protocol: FrameProtocol, data: Dict[str, Any]) -> Optional[ClientConnection]:
+        remote, client_ip = self._negotiate(protocol, data)
+        username, password = data.get('username', ''), data.get('password', '')
+        ok = False
+        if self.ledger is not None:
+            loop = asyncio.get_running_loop()
+            ok = await loop.run_in_executor(None, self.ledger.verify_password, username, password)
+        if protocol.is_closing():
+            return None
+        if not ok:
+            protocol.send_frame({'type': MessageType.AUTH_ERROR, 'message': 'Invalid username or password'})
+            return None
+        client_id = remote.client_id or client_ip or username
+        # Less whatever the account's sessions on other kiosks still hold
+        balance = self.scheduler.available(username, exclude=client_id)
+        if balance <= 0:
+            protocol.send_frame({'type': MessageType.AUTH_ERROR, 'message': 'No time left on this account'})
+            return None
+        conn = self._register(client_id, client_ip, protocol)
+        conn.account = username
+        self.replay.pop(conn.client_id, None)
+        reply = {'type': MessageType.AUTH_SUCCESS, 'minutes': balance // 60, 'client_id': conn.client_id}
+        if remote.protocol_version >= 1:
+            reply.update(handshake_fields(self.handshake))
+            if protocol.features.supports(Capability.HEARTBEAT):
+                reply['heartbeat_interval'] = conn.heartbeat_interval = self.heartbeat_interval
+            if protocol.features.supports(Capability.RESUME):
+                reply['resume_token'] = self.tokens.issue(conn.client_id, username)
+            self._add_servers(protocol, reply)
+        protocol.send_frame(reply)
+        # Prepaid accounts start their session straight away
+        duration = self.scheduler.start(conn.client_id, balance, username)
+        self.clients.update(conn, state=SessionState.ACTIVE)
+        self._record(EventKind.SESSION_START, conn.client_id, {'duration': duration, 'account': username})
+        self._send_data(conn, {'type': MessageType.SESSION_STARTED, 'duration': duration})
+        return conn
+
+    def _register(self, client_id: str, client_ip: Optional[str], protocol: FrameProtocol) -> ClientConnection:
+        old = self.clients.get(client_id)
+        if old is not None and old.protocol is not protocol:
+            old.protocol.close()
+        conn = ClientConnection(client_id, client_ip, protocol)
+        conn.last_seen = self.clock()
+        protocol.context = conn
+        self.clients.add(conn)
+        if self.directory is not None:
+            self.directory.register(client_id)
+        logger.info(f"Client {client_id} connected (protocol v{protocol.features.version})")
+        self._record(EventKind.CONNECT, client_id, {'ip': client_ip})
+        if self.cluster is not None:
+            self._adopt_session(client_id)
+        if protocol.features.supports(Capability.SCREEN):
+            self.screens.client_connected(client_id)
+        return conn
+
+    def _handle_frames(self, conn: ClientConnection, frames: List[Dict[str, Any]]):
+        conn.last_seen = self.clock()
+        for data in frames:
+            if not data:
+                continue  # bare heartbeat; last_seen is all it is for
+            try:
+                if conn.clock is not None and data.get('type') == MessageType.HEARTBEAT and 'sent' in data:
+                    self._clock_received(conn, data)  # many per second; skips building a message
+                else:
+                    self._handle_message(conn, message_from_dict(data))
+            except Exception as e:
+                logger.error(f"Error handling message from {conn.client_id}: {e}")
+
+    def _clock_received(self, conn: ClientConnection, data: Dict[str, Any]):
+        """Sample the kiosk's stamped heartbeat and answer it, so its next one gives the kiosk a sample too."""
+        first = conn.clock.offset is None
+        if conn.clock.received(data['sent'], data.get('echo'), data.get('held')):
+            self.clients.changed(conn, rtt=conn.clock.rtt)
+            if first and not conn.account and self.scheduler.state(conn.client_id) == SessionState.ACTIVE:
+                # The session was sent before the offset was known (a resync), so without a deadline
+                self._send_data(conn, asdict(SessionMessage(type=MessageType.SESSION_EXTEND,
+                                                            client_id=conn.client_id, duration=0)))
+        interval = conn.heartbeat_interval if conn.features.supports(Capability.HEARTBEAT) else None
+        conn.protocol.send_frame(create_clock_heartbeat(conn.clock.stamp(), interval))
+
+    def _handle_message(self, conn: ClientConnection, message: Message):
+        self.messages_handled += 1
+        if message.type == MessageType.CLIENT_STATUS:
+            apps = conn.active_apps
+            self.clients.update(conn, state=message.state, active_apps=message.active_apps,
+                                remaining_time=message.remaining_time)
+            if conn.active_apps != apps:
+                self._record(EventKind.APPS, conn.client_id, {'apps': list(conn.active_apps)})
+            if message.error:
+                logger.warning(f"Client {conn.client_id} reported: {message.error}")
+        elif message.type == MessageType.JOURNAL:
+            self._apply_journal(conn, message.events)
+            if message.msg_id is not None:
+                # The kiosk keeps its journal until this arrives
+                conn.protocol.send(create_ack(conn.client_id, message.msg_id))
+        elif message.type == MessageType.ACK:
+            self.pending.resolve(message.msg_id, conn.client_id, CommandStatus.ACKED)
+        elif message.type == MessageType.NACK:
+            logger.warning(f"Client {conn.client_id} rejected command {message.msg_id}: {message.error}")
+            self.pending.resolve(message.msg_id, conn.client_id, CommandStatus.NACKED, message.error)
+        elif message.type == MessageType.TELEMETRY:
+            if conn.telemetry is None:
+                conn.telemetry = TelemetryView()
+            conn.telemetry.apply(message)
+        elif message.type == MessageType.SCREEN:
+            self.screens.apply(conn.client_id, message)
+        elif message.type == MessageType.ASSET_REQUEST:
+            self._serve_asset(conn, message)
+
+    def _apply_journal(self, conn: ClientConnection, events: List[List[Any]]):
+        """Catch up on what a kiosk did while it was offline."""
+        launched = []
+        for kind, timestamp, payload in events:
+            if kind == JournalEvent.TICK:
+                self.clients.update(conn, remaining_time=payload.get('remaining'))
+            elif kind == JournalEvent.STATUS:
+                self.clients.update(conn, state=payload.get('state'))
+            elif kind == JournalEvent.APP:
+                launched.append(payload.get('name'))
+                if payload.get('name') not in conn.active_apps:
+                    self.clients.update(conn, active_apps=conn.active_apps + (payload.get('name'),))
+                    self._record(EventKind.APPS, conn.client_id, {'apps': list(conn.active_apps)})
+        logger.info(f"Client {conn.client_id} uploaded {len(events)} offline events "
+                    f"(state {conn.state}, apps launched: {launched})")
+
+    async def _drop_stale_clients(self):
+        while True:
+            started = self.clock()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            now = self.clock()
+            self._adapt_heartbeat(now - started - HEARTBEAT_INTERVAL)
+            if self.cluster is not None:
+                self._rebalance()
+            if self.screens.watched():
+                self.screens.adapt(now - started - HEARTBEAT_INTERVAL, self.output_buffered())
+            for conn in list(self.clients.values()):
+                if conn.last_seen < now - MISSED_HEARTBEATS * conn.heartbeat_interval:
+                    logger.info(f"Client {conn.client_id} timed out")
+                    conn.protocol.close()
+                elif conn.protocol.paused_since is not None and conn.protocol.paused_since < now - SLOW_CLIENT_TIMEOUT:
+                    logger.warning(f"Client {conn.client_id} is not reading "
+                                   f"({conn.protocol.buffered_bytes} bytes unsent); disconnecting")
+                    conn.protocol.close()
+            for client_id, log in list(self.replay.items()):
+                if log.detached_at is not None and log.detached_at < now - RESUME_WINDOW:
+                    del self.replay[client_id]
+
+    def _serve_asset(self, conn: ClientConnection, request: AssetMessage):
+        """Answer a kiosk's request for one chunk of an asset (not replayed; the kiosk re-asks after a reconnect)."""
+        found = self.assets.chunk(request.sha256, request.offset) if self.assets is not None else None
+        reply = AssetMessage(type=MessageType.ASSET_CHUNK, client_id=conn.client_id, sha256=request.sha256,
+                             offset=request.offset)
+        if found is None:
+            logger.warning(f"Client {conn.client_id} asked for unknown asset {request.sha256}")
+        else:
+            reply.size, data = found[0], found[1]
+            reply.data = base64.b64encode(data).decode()
+        conn.protocol.send(reply)
+
+    def _rebalance(self):
+        """Redirect kiosks to less loaded nodes while this node holds more than its share; idle kiosks go first."""
+        targets = self.cluster.rebalance(len(self.clients))
+        if not targets:
+            return
+        movable = [conn for conn in self.clients.values() if conn.features.supports(Capability.CLUSTER)]
+        movable.sort(key=lambda conn: self.scheduler.state(conn.client_id) is not None)
+        for conn, target in zip(movable, targets):
+            conn.protocol.send(create_redirect(conn.client_id, self.cluster.servers(target)))
+        logger.info(f"Redirected {min(len(movable), len(targets))} clients to other nodes "
+                    f"({self.fleet()} on this node, others: {self.cluster.nodes})")
+
+    def fleet(self) -> int:
+        """Clients connected to this server (all workers)."""
+        return len(self.directory.owners) if self.directory is not None else len(self.clients)
+
+    def _adapt_heartbeat(self, lag: float):
+        """Stretch the heartbeat interval as the fleet grows or the event loop falls behind."""
+        fleet = self.fleet()
+        # Shrink by at most half per pass so clients on the old interval are not timed out
+        interval = max(heartbeat_interval_for(fleet, lag), self.heartbeat_interval // 2)
+        if interval == self.heartbeat_interval:
+            return
+        logger.info(f"Heartbeat interval {self.heartbeat_interval}s -> {interval}s "
+                    f"({fleet} clients, loop lag {lag * 1000:.0f}ms)")
+        self.heartbeat_interval = interval
+        for conn in self.clients.values():
+            if conn.features.supports(Capability.HEARTBEAT):
+                conn.protocol.send(create_heartbeat(conn.client_id, interval))
+                conn.heartbeat_interval = interval
+
+    def output_buffered(self) -> Dict[str, int]:
+        """Bytes of output waiting to be sent, per client held by this worker."""
+        return {client_id: conn.protocol.buffered_bytes for client_id, conn in self.clients.items()}
+
+    def telemetry(self, client_id: str, top: int = 5) -> Optional[Dict[str, Any]]:
+        """Latest CPU, memory and busiest processes of a client held by this worker, if it sends telemetry."""
+        conn = self.clients.get(client_id)
+        if conn is None or conn.telemetry is None:
+            return None
+        return conn.telemetry.to_dict(top)
+
+    def latency(self, client_id: str) -> Optional[Dict[str, Any]]:
+        """Smoothed round-trip time, jitter and clock offset of a client held by this worker, if it negotiated CLOCK."""
+        conn = self.clients.get(client_id)
+        if conn is None or conn.clock is None:
+            return None
+        return conn.clock.to_dict()
+
+    def watch_screen(self, client_id: str, on_frame: Callable[[str, ScreenView, List[int]], None]) -> Callable[[], None]:
+        """Stream thumbnails of a kiosk held by this worker to on_frame until the returned function is called.
+
+        The kiosk only captures while someone watches it.
+        """
+        return self.screens.watch(client_id, on_frame)
+
+    def _record(self, kind: int, client_id: str, data: Optional[Dict[str, Any]] = None):
+        if self.events is not None:
+            self.events.append(kind, client_id, data)
+        if self.usage is not None:
+            self.usage.observe(kind, client_id, data)
+        if self.cluster is not None and kind in _SESSION_EVENTS:
+            self.cluster.publish_session(client_id, self.scheduler.snapshot(client_id))
+
+    # Sending
+
+    def send(self, client_id: str, message: Message) -> bool:
+        """Send to a client held by this worker.
+
+        A client that dropped recently but may still resume gets the message
+        queued in its replay log. Returns False if the client is not held here.
+        """
+        conn = self.clients.get(client_id)
+        if conn is not None and not conn.protocol.is_closing():
+            self._send_data(conn, asdict(message))
+            return True
+        log = self.replay.get(client_id)
+        if log is not None:
+            log.record(asdict(message))
+            return True
+        return False
+
+    def _send_data(self, conn: ClientConnection, data: Dict[str, Any]):
+        if data.get('type') in _DEADLINE_MESSAGES and conn.clock is not None and conn.clock.offset is not None:
+            # In the kiosk's clock, so time spent in transit (or in the replay log) is not added on its end
+            time_left = self.scheduler.time_left(conn.client_id)
+            if time_left is not None:
+                data = dict(data, deadline=conn.clock.to_peer(self.wall_clock() + time_left))
+        if conn.features.supports(Capability.RESUME):
+            self.replay.setdefault(conn.client_id, ReplayLog()).record(data)
+        conn.protocol.send_frame(data)
+
+    def broadcast(self, message: Message):
+        for client_id in list(self.clients):
+            self.send(client_id, message)
+
+    # Admin commands
+
+    def command(self, client_id: str, message: Message) -> bool:
+        """Apply an admin command for client_id on whichever worker holds it."""
+        if client_id in self.clients or client_id in self.replay:
+            return self._apply_command(client_id, message)
+        if self.directory is not None:
+            return self.directory.forward(client_id, asdict(message))
+        return False
+
+    async def request(self, client_id: str, message: Message, timeout: Optional[float] = None) -> CommandResult:
+        """Apply an admin command like ``command`` and wait for the kiosk to acknowledge it."""
+        if client_id in self.clients or client_id in self.replay:
+            return await self._request_local(client_id, message, timeout)
+        owner = self.directory.owner(client_id) if self.directory is not None else None
+        if owner is None or owner == self.directory.worker_id:
+            return CommandResult(client_id, CommandStatus.UNREACHABLE)
+        request_id, future = self.pending.add(client_id, timeout)
+        self.directory.forward(client_id, asdict(message), (self.directory.worker_id, request_id))
+        return await future
+
+    async def request_all(
+        self,
+        commands: Iterable[Tuple[str, Message]],
+        timeout: Optional[float] = None
+    ) -> List[CommandResult]:
+        """Send (client_id, message) commands back to back and wait for all the answers.
+
+        Results are in the order of commands.
+        """
+        results = await asyncio.gather(*(self.request(client_id, message, timeout) for client_id, message in commands))
+        logger.info(f"{len(results)} commands: {dict(Counter(result.status for result in results))}")
+        return results
+
+    async def _request_local(self, client_id: str, message: Message, timeout: Optional[float]) -> CommandResult:
+        conn = self.clients.get(client_id)
+        if conn is not None and not conn.features.supports(Capability.ACK):
+            sent = self._apply_command(client_id, message)
+            return CommandResult(client_id, CommandStatus.UNCONFIRMED if sent else CommandStatus.UNREACHABLE)
+        # A detached client is assumed to ack once it resumes; if it does not, the request times out
+        msg_id, future = self.pending.add(client_id, timeout)
+        message.msg_id = msg_id
+        if not self._apply_command(client_id, message):
+            self.pending.resolve(msg_id, client_id, CommandStatus.UNREACHABLE)
+        return await future
+
+    def start_session(self, client_id: str, duration: int) -> bool:
+        return self.command(client_id, SessionMessage(type=MessageType.SESSION_START, client_id=client_id,
+                                                      duration=duration, state=SessionState.ACTIVE))
+
+    def pause_session(self, client_id: str) -> bool:
+        return self.command(client_id, SessionMessage(type=MessageType.SESSION_PAUSE, client_id=client_id,
+                                                      state=SessionState.PAUSED))
+
+    def resume_session(self, client_id: str) -> bool:
+        return self.command(client_id, SessionMessage(type=MessageType.SESSION_RESUME, client_id=client_id,
+                                                      state=SessionState.ACTIVE))
+
+    def extend_session(self, client_id: str, seconds: int) -> bool:
+        return self.command(client_id, SessionMessage(type=MessageType.SESSION_EXTEND, client_id=client_id,
+                                                      duration=seconds))
+
+    def end_session(self, client_id: str) -> bool:
+        return self.command(client_id, SessionMessage(type=MessageType.SESSION_END, client_id=client_id,
+                                                      state=SessionState.ENDED))
+
+    def set_allowed_apps(self, client_id: str, apps: List[Dict[str, str]], apps_version: Optional[int] = None) -> bool:
+        """Send the app list; icons found on the server's disk are published for kiosks to fetch by hash."""
+        if self.assets is not None:
+            apps = self.assets.attach_icons(apps)
+        if apps_version is not None:
+            self.allowed_apps[client_id] = (apps_version, apps)  # a kiosk that is away gets it when it connects
+        return self.command(client_id, create_allowed_apps(client_id, apps, apps_version))
+
+    def set_telemetry_interval(self, client_id: str, seconds: int) -> bool:
+        """Change how often a kiosk samples its resources; 0 stops sampling."""
+        return self.command(client_id, create_telemetry_interval(client_id, seconds))
+
+    def redirect(self, client_id: str, servers: List[str]) -> bool:
+        """Move a kiosk to servers[0] (e.g. to drain this node); servers becomes its failover list."""
+        return self.command(client_id, create_redirect(client_id, servers))
+
+    def remove_client(self, client_id: str) -> bool:
+        return self.command(client_id, Message(type=MessageType.REMOVE_CLIENT, client_id=client_id))
+
+    def _apply_forwarded(self, client_id: str, data: Dict[str, Any], reply_to: Optional[Tuple[int, int]] = None):
+        held = client_id in self.clients or client_id in self.replay
+        if reply_to is None:
+            if held:
+                self._apply_command(client_id, message_from_dict(data))
+            return
+        if not held:
+            self.directory.reply(reply_to, client_id, asdict(CommandResult(client_id, CommandStatus.UNREACHABLE)))
+            return
+        task = asyncio.ensure_future(self._request_local(client_id, message_from_dict(data), None))
+        task.add_done_callback(
+            lambda done: done.cancelled() or self.directory.reply(reply_to, client_id, asdict(done.result()))
+        )
+
+    def _forwarded_result(self, client_id: str, result: Dict[str, Any]):
+        self.pending.resolve(result['request_id'], client_id, result['status'], result.get('error'))
+
+    def _apply_command(self, client_id: str, message: Message) -> bool:
+        conn = self.clients.get(client_id)
+        if message.type == MessageType.REDIRECT:
+            # Not kept for replay: it only means something on this connection
+            if conn is None or not conn.features.supports(Capability.CLUSTER):
+                return False
+            conn.protocol.send(message)
+            return True
+        if message.type == MessageType.SESSION_START:
+            account = conn.account if conn else None
+            message.duration = self.scheduler.start(client_id, message.duration or 0, account)
+            self._record(EventKind.SESSION_START, client_id, {'duration': message.duration, 'account': account})
+        elif message.type == MessageType.SESSION_PAUSE:
+            remaining = self.scheduler.pause(client_id)
+            self._record(EventKind.SESSION_PAUSE, client_id, {'remaining': remaining})
+        elif message.type == MessageType.SESSION_RESUME:
+            remaining = self.scheduler.resume(client_id)
+            self._record(EventKind.SESSION_RESUME, client_id, {'remaining': remaining})
+        elif message.type == MessageType.SESSION_EXTEND:
+            remaining = self.scheduler.extend(client_id, message.duration or 0)
+            if remaining is None and self.scheduler.state(client_id) is not None:
+                self.pending.resolve(message.msg_id, client_id, CommandStatus.NACKED, 'Not enough time left on the account')
+                return False
+            self._record(EventKind.SESSION_EXTEND, client_id, {'seconds': message.duration or 0, 'remaining': remaining})
+        elif message.type == MessageType.SESSION_END:
+            if self.scheduler.end(client_id):
+                self._record(EventKind.SESSION_END, client_id, {'reason': 'admin'})
+        elif message.type == MessageType.ALLOWED_APPS and message.apps_version is not None:
+            self.allowed_apps[client_id] = (message.apps_version, message.apps)
+        if conn is not None and message.type in (MessageType.SESSION_START, MessageType.SESSION_PAUSE,
+                                                 MessageType.SESSION_RESUME, MessageType.SESSION_EXTEND,
+                                                 MessageType.SESSION_END):
+            self.clients.update(conn, state=self.scheduler.state(client_id) or SessionState.ENDED,
+                                remaining_time=self.scheduler.remaining(client_id))
+        return self.send(client_id, message)
+
+    def _session_expired(self, client_id: str):
+        self._record(EventKind.SESSION_END, client_id, {'reason': 'expired'})
+        conn = self.clients.get(client_id)
+        if conn is not None:
+            self.clients.update(conn, state=SessionState.ENDED)
+        self.send(client_id, SessionMessage(type=MessageType.SESSION_END, client_id=client_id, state=SessionState.ENDED))
@@ -0,0 +1,214 @@
+"""
+Table of connected kiosks with indexes for admin queries.
+"""
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from shared.clock_sync import ClockSync
+from shared.constants import HEARTBEAT_INTERVAL, SessionState
+from shared.protocol import FeatureSet
+from shared.telemetry import TelemetryView
+from shared.transport import FrameProtocol
+
+_UNSET = object()
+MAX_APP_SETS = 10000  # distinct app lists remembered for sharing
+
+class ClientConnection:
+    """One connected kiosk.
+
+    state and active_apps are indexed by the ClientRegistry; change them
+    through ``ClientRegistry.update``.
+    """
+    __slots__ = ('client_id', 'client_ip', 'account', 'protocol', 'last_seen',
+                 'state', 'remaining_time', 'active_apps', 'resume_seq', 'heartbeat_interval', 'telemetry',
+                 'clock')
+
+    def __init__(self, client_id: str, client_ip: Optional[str], protocol: Optional[FrameProtocol]):
+        self.client_id = client_id
+        self.client_ip = sys.intern(client_ip) if client_ip else client_ip
+        self.account: Optional[str] = None
+        self.protocol = protocol
+        self.last_seen = time.monotonic()
+        self.state = SessionState.INACTIVE
+        self.remaining_time: Optional[int] = None
+        self.active_apps: Tuple[str, ...] = ()
+        self.resume_seq: Optional[int] = None  # last_seq the client presented when resuming
+        self.heartbeat_interval = HEARTBEAT_INTERVAL  # what the client was told to use
+        self.telemetry: Optional[TelemetryView] = None  # created by the first sample
+        self.clock: Optional[ClockSync] = None  # for clients that negotiated CLOCK
+
+    @property
+    def features(self) -> FeatureSet:
+        return self.protocol.features
+
+class ClientRegistry:
+    """Connected kiosks by client_id, indexed by session state, IP and running app.
+
+    Reads like a dict of client_id -> ClientConnection. State strings and app
+    names are interned and identical app lists share one tuple, so ten
+    thousand kiosks running the same handful of apps cost one copy of each.
+    The indexes map to sets of client_ids (to tuples for IPs, which are
+    nearly unique and change only on connect) and are kept current by
+    ``add``, ``remove`` and ``update``; ``query`` intersects them.
+
+    ``watch`` streams the table and its changes to an admin view.
+    """
+
+    def __init__(self):
+        # Called with (client_id, changed fields), or (client_id, None) when the client leaves
+        self.on_change: Optional[Callable[[str, Optional[Dict[str, Any]]], None]] = None
+        self._clients: Dict[str, ClientConnection] = {}
+        self._by_state: Dict[str, Set[str]] = {}
+        self._by_ip: Dict[str, Tuple[str, ...]] = {}
+        self._by_app: Dict[str, Set[str]] = {}
+        self._app_sets: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    # Mapping interface
+
+    def get(self, client_id: str, default: Optional[ClientConnection] = None) -> Optional[ClientConnection]:
+        return self._clients.get(client_id, default)
+
+    def __getitem__(self, client_id: str) -> ClientConnection:
+        return self._clients[client_id]
+
+    def __contains__(self, client_id: str) -> bool:
+        return client_id in self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._clients)
+
+    def values(self):
+        return self._clients.values()
+
+    def items(self):
+        return self._clients.items()
+
+    # Updates
+
+    def add(self, conn: ClientConnection) -> Optional[ClientConnection]:
+        """Register conn, replacing (and returning) any record with the same client_id."""
+        old = self.remove(conn.client_id)
+        conn.state = sys.intern(conn.state)
+        conn.active_apps = self._intern_apps(conn.active_apps)
+        self._clients[conn.client_id] = conn
+        self._index(self._by_state, conn.state, conn.client_id)
+        if conn.client_ip is not None:
+            self._by_ip[conn.client_ip] = self._by_ip.get(conn.client_ip, ()) + (conn.client_id,)
+        for app in conn.active_apps:
+            self._index(self._by_app, app, conn.client_id)
+        if self.on_change is not None:
+            self.on_change(conn.client_id, self._row(conn))
+        return old
+
+    def remove(self, client_id: str) -> Optional[ClientConnection]:
+        conn = self._clients.pop(client_id, None)
+        if conn is None:
+            return None
+        self._unindex(self._by_state, conn.state, client_id)
+        ids = tuple(other for other in self._by_ip.get(conn.client_ip, ()) if other != client_id)
+        if ids:
+            self._by_ip[conn.client_ip] = ids
+        else:
+            self._by_ip.pop(conn.client_ip, None)
+        for app in conn.active_apps:
+            self._unindex(self._by_app, app, client_id)
+        if self.on_change is not None:
+            self.on_change(client_id, None)
+        return conn
+
+    def update(self, conn: ClientConnection, state=_UNSET, active_apps: Optional[Iterable[str]] = None,
+               remaining_time=_UNSET):
+        """Change a registered client's state, running apps and/or time left, keeping the indexes current."""
+        registered = self._clients.get(conn.client_id) is conn
+        changed = {} if registered and self.on_change is not None else None
+        if state is not _UNSET and state is not None and state != conn.state:
+            state = sys.intern(state)
+            if registered:
+                self._unindex(self._by_state, conn.state, conn.client_id)
+                self._index(self._by_state, state, conn.client_id)
+            conn.state = state
+            if changed is not None:
+                changed['state'] = state
+        if active_apps is not None:
+            apps = self._intern_apps(active_apps)
+            if apps is not conn.active_apps:
+                if registered:
+                    for app in conn.active_apps:
+                        if app not in apps:
+                            self._unindex(self._by_app, app, conn.client_id)
+                    for app in apps:
+                        if app not in conn.active_apps:
+                            self._index(self._by_app, app, conn.client_id)
+                conn.active_apps = apps
+                if changed is not None:
+                    changed['active_apps'] = apps
+        if remaining_time is not _UNSET:
+            if changed is not None and remaining_time != conn.remaining_time:
+                changed['remaining_time'] = remaining_time
+            conn.remaining_time = remaining_time
+        if changed:
+            self.on_change(conn.client_id, changed)
+
+    def changed(self, conn: ClientConnection, **fields):
+        """Report fields the registry does not index (e.g. round-trip time) to the watcher, if any."""
+        if self.on_change is not None and self._clients.get(conn.client_id) is conn:
+            self.on_change(conn.client_id, fields)
+
+    def watch(self, on_change: Callable[[str, Optional[Dict[str, Any]]], None]):
+        """Send on_change every client's row now and every change from now on. Call on the event loop."""
+        self.on_change = on_change
+        for conn in self._clients.values():
+            on_change(conn.client_id, self._row(conn))
+
+    # Queries
+
+    def query(self, state: Optional[str] = None, ip: Optional[str] = None,
+              app: Optional[str] = None) -> List[ClientConnection]:
+        """Clients matching every given filter (all clients if none is given)."""
+        sets = []
+        for index, key in ((self._by_state, state), (self._by_ip, ip), (self._by_app, app)):
+            if key is not None:
+                ids = index.get(key)
+                if not ids:
+                    return []
+                sets.append(ids)
+        if not sets:
+            return list(self._clients.values())
+        sets.sort(key=len)
+        ids = sets[0]
+        if len(sets) > 1:
+            ids = (ids if isinstance(ids, set) else set(ids)).intersection(*sets[1:])
+        clients = self._clients
+        return [clients[client_id] for client_id in ids]
+
+    def count_by_state(self) -> Dict[str, int]:
+        return {state: len(ids) for state, ids in self._by_state.items()}
+
+    # Internals
+
+    @staticmethod
+    def _row(conn: ClientConnection) -> Dict[str, Any]:
+        return {'client_id': conn.client_id, 'ip': conn.client_ip, 'state': conn.state,
+                'remaining_time': conn.remaining_time, 'active_apps': conn.active_apps}
+
+    def _intern_apps(self, apps: Iterable[str]) -> Tuple[str, ...]:
+        key = tuple(sys.intern(app) for app in apps)
+        if len(self._app_sets) >= MAX_APP_SETS and key not in self._app_sets:
+            self._app_sets.clear()  # records keep their tuples; only future sharing restarts
+        return self._app_sets.setdefault(key, key)
+
+    @staticmethod
+    def _index(index: Dict[str, Set[str]], key: Optional[str], client_id: str):
+        if key is not None:
+            index.setdefault(key, set()).add(client_id)
+
+    @staticmethod
+    def _unindex(index: Dict[str, Set[str]], key: Optional[str], client_id: str):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(client_id)
+            if not ids:
+                del index[key]
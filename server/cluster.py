@@ -0,0 +1,367 @@
+"""
+Server nodes sharing session and account state through a replicated log.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from shared.constants import SessionState
+from shared.transport import FrameProtocol
+from .billing import BillingLedger
+from .client_directory import ClientDirectory
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_PORT = 5001
+REPORT_INTERVAL = 2  # seconds between load reports to the other nodes
+MISSED_REPORTS = 3  # a node silent for this many intervals is disconnected
+LOG_SIZE = 10000  # entries of this node kept for nodes that (re)connect
+ENTRIES_PER_FRAME = 500
+REBALANCE_SLACK = 0.1  # a node sheds kiosks once it holds this share (and 2 kiosks) more than the mean
+REBALANCE_BATCH = 200  # kiosks a node redirects per pass
+TOMBSTONE_TTL = 3600  # seconds an ended session is remembered, so an older entry cannot revive it
+NONCE_BYTES = 16
+
+class _Peer:
+    """One link to another node."""
+    __slots__ = ('protocol', 'node', 'address', 'clients', 'seen', 'closed', 'nonce', 'peer_nonce', 'key',
+                 'sent', 'received')
+
+    def __init__(self, protocol: FrameProtocol):
+        self.protocol = protocol
+        self.node: Optional[str] = None  # known once its sealed hello arrives
+        self.address: Optional[str] = None
+        self.clients = 0
+        self.seen = time.monotonic()
+        self.closed: Optional[asyncio.Future] = None  # outgoing links: resolved when the link drops
+        self.nonce: Optional[str] = None  # challenge this node sent
+        self.peer_nonce: Optional[str] = None  # challenge the peer sent
+        self.key: Optional[bytes] = None  # seals frames, once both challenges are known
+        self.sent = 0  # sealed frames sent
+        self.received = 0  # sealed frames received
+
+def _mac(key: bytes, nonce: str, count: int, body: str) -> str:
+    return hmac.new(key, f'{nonce}\0{count}\0{body}'.encode(), hashlib.sha256).hexdigest()
+
+class Cluster:
+    """This worker's member of a cluster of server nodes.
+
+    Every change to a session or an account is appended to a log as
+    [origin, seq, kind, data]. The origin names the node, the worker and the
+    process incarnation, so a restarted worker starts a new sequence. Entries
+    are applied at most once per origin and sent to every other node; a node
+    that (re)connects is sent what it has not seen of the last LOG_SIZE.
+    Sessions are kept as the latest snapshot per kiosk, so whichever node a
+    kiosk reaches next can continue it. Account changes are written to the
+    ledger once per node, by worker 0; the other workers share its database.
+
+    Worker 0 (or the only worker) holds the links to the other nodes and
+    trades load reports with them; the other workers relay their entries
+    through it over the ClientDirectory. ``rebalance`` tells a node holding
+    more than its share of kiosks where to redirect them.
+
+    Entries credit accounts and set passwords, so links carry nothing until
+    the peer proves it holds the cluster secret. Both ends send a random
+    challenge; the link key is an HMAC of the two under the secret, and
+    every later frame (the hello first) is sealed with an HMAC of the
+    sender's challenge, a frame count and the frame. A peer that sends an
+    unsealed or badly sealed frame is dropped. A host relaying two nodes'
+    challenges to each other still cannot seal a frame of its own.
+    """
+
+    def __init__(
+        self,
+        node: str,
+        address: str,
+        directory: Optional[ClientDirectory] = None,
+        ledger: Optional[BillingLedger] = None,
+        listen: Optional[Tuple[str, int]] = None,
+        peers: List[Tuple[str, int]] = (),
+        secret: Optional[bytes] = None
+    ):
+        self.node = node
+        self.address = address  # "host:port" kiosks use to reach this node
+        self.directory = directory
+        worker_id = directory.worker_id if directory is not None else 0
+        self.origin = f"{node}/{worker_id}/{os.urandom(4).hex()}"
+        self.linked = worker_id == 0
+        self.listen = listen
+        self.peers = list(peers)
+        self.secret = secret  # shared by every node; required to link
+        self.ledger = ledger if self.linked else None
+        self.seq = 0
+        self.applied: Dict[str, int] = {}  # origin -> last seq applied
+        self.sessions: Dict[str, Dict[str, Any]] = {}  # client_id -> {'holder', 'at', 'session'}
+        self.nodes: Dict[str, List[Any]] = {}  # other live node -> [address, kiosks]
+        self.load: Callable[[], int] = lambda: 0  # kiosks on this node
+        # Called with (client_id, holder origin) when another worker or node changed a kiosk's session
+        self.on_session: Optional[Callable[[str, str], None]] = None
+        self._log: Deque[List[Any]] = deque(maxlen=LOG_SIZE)
+        self._links: List[_Peer] = []
+        if ledger is not None:
+            ledger.on_change = self.append
+        if directory is not None:
+            directory.on_cluster = self._from_worker
+            directory.on_nodes = self._set_nodes
+
+    # Replicated state
+
+    def append(self, kind: str, data: Dict[str, Any]):
+        """Record a change made on this worker and replicate it. Call on the event loop."""
+        self.seq += 1
+        entry = [self.origin, self.seq, kind, data]
+        self.apply(entry)
+        self._ship([entry])
+
+    def apply(self, entry: List[Any]) -> bool:
+        """Apply an entry unless it was applied before."""
+        origin, seq, kind, data = entry
+        last = self.applied.get(origin, 0)
+        if seq <= last:
+            return False
+        if last and seq > last + 1:
+            logger.warning(f"Missed {seq - last - 1} cluster entries from {origin}")
+        self.applied[origin] = seq
+        if kind == 'session':
+            self._apply_session(origin, data)
+        elif self.ledger is not None and origin.split('/', 1)[0] != self.node:
+            self.ledger.apply_replicated(origin, seq, kind, data)
+        return True
+
+    def _apply_session(self, origin: str, data: Dict[str, Any]):
+        client_id = data['client_id']
+        known = self.sessions.get(client_id)
+        if known is not None and known['at'] > data['at']:
+            return  # an older change that arrived late
+        self.sessions[client_id] = {'holder': origin, 'at': data['at'], 'session': data['session']}
+        if origin != self.origin and self.on_session is not None:
+            self.on_session(client_id, origin)
+
+    def publish_session(self, client_id: str, snapshot: Optional[Dict[str, Any]]):
+        """Replicate a kiosk's session as SessionScheduler.snapshot() gives it (None once it ended)."""
+        self.append('session', {'client_id': client_id, 'at': time.time(), 'session': snapshot})
+
+    def session(self, client_id: str) -> Optional[Dict[str, Any]]:
+        """The latest replicated snapshot of a kiosk's session, with the time left as of now."""
+        known = self.sessions.get(client_id)
+        if known is None or known['session'] is None:
+            return None
+        session = dict(known['session'])
+        if session['state'] == SessionState.ACTIVE:
+            session['remaining'] = max(0, session['remaining'] - (time.time() - known['at']))
+        return session
+
+    def _ship(self, entries: List[List[Any]]):
+        """Send entries that originated on this node to the other nodes and workers."""
+        if self.linked:
+            self._log.extend(entries)
+            self._send_all({'type': 'entries', 'entries': entries})
+            if self.directory is not None:
+                self.directory.publish_cluster(entries)
+        elif self.directory is not None:
+            self.directory.send_cluster(0, entries)
+
+    def _from_worker(self, entries: List[List[Any]]):
+        new = [entry for entry in entries if self.apply(entry)]
+        if new and self.linked:
+            self._ship(new)  # from another worker of this node
+
+    def _set_nodes(self, nodes: Dict[str, List[Any]]):
+        self.nodes = {node: list(value) for node, value in nodes.items()}
+        cutoff = time.time() - TOMBSTONE_TTL
+        for client_id in [client_id for client_id, known in self.sessions.items()
+                          if known['session'] is None and known['at'] < cutoff]:
+            del self.sessions[client_id]
+
+    # Load balancing
+
+    def servers(self, first: Optional[str] = None) -> List[str]:
+        """Failover list for kiosks: first (by default this node), then the live nodes, least loaded first."""
+        others = sorted(self.nodes.values(), key=lambda value: value[1])
+        return list(dict.fromkeys([first or self.address, self.address] + [address for address, _ in others]))
+
+    def rebalance(self, held: int) -> List[str]:
+        """Addresses to redirect kiosks of this worker to, one per kiosk, if this node has more than its share.
+
+        held is the number of kiosks on this worker; a node's excess is split
+        between its workers in proportion to what they hold.
+        """
+        load = self.load()
+        if not self.nodes or not held or not load:
+            return []
+        mean = (load + sum(value[1] for value in self.nodes.values())) / (len(self.nodes) + 1)
+        if load <= mean * (1 + REBALANCE_SLACK) + 2:
+            return []
+        share = math.ceil(mean)
+        count = min(REBALANCE_BATCH, held, math.ceil((load - share) * held / load))
+        targets = []
+        for _ in range(count):
+            node = min(self.nodes, key=lambda name: self.nodes[name][1])
+            if self.nodes[node][1] >= share:
+                break
+            self.nodes[node][1] += 1  # counted now, so the next pass does not move the same kiosks again
+            targets.append(self.nodes[node][0])
+        return targets
+
+    # Links to other nodes
+
+    async def run(self):
+        """Hold the links to the other nodes and report this node's load. Runs until cancelled (worker 0 only)."""
+        if not self.linked:
+            return
+        if not self.secret and (self.listen is not None or self.peers):
+            raise ValueError("Linking cluster nodes needs the cluster secret")
+        loop = asyncio.get_running_loop()
+        server = None
+        if self.listen is not None:
+            server = await loop.create_server(self._make_protocol, self.listen[0], self.listen[1])
+        tasks = [asyncio.create_task(self._connect(peer)) for peer in self.peers]
+        try:
+            while True:
+                await asyncio.sleep(REPORT_INTERVAL)
+                self._report()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if server is not None:
+                server.close()
+            for peer in list(self._links):
+                peer.protocol.close()
+
+    def _make_protocol(self) -> FrameProtocol:
+        protocol = FrameProtocol(self._frames_received, self._link_lost)
+        protocol.context = _Peer(protocol)
+        return protocol
+
+    async def _connect(self, address: Tuple[str, int]):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                _, protocol = await loop.create_connection(self._make_protocol, address[0], address[1])
+            except OSError:
+                await asyncio.sleep(REPORT_INTERVAL)
+                continue
+            peer = protocol.context
+            peer.closed = loop.create_future()
+            self._links.append(peer)
+            self._challenge(peer)
+            await peer.closed
+            await asyncio.sleep(REPORT_INTERVAL)
+
+    def _challenge(self, peer: _Peer):
+        peer.nonce = os.urandom(NONCE_BYTES).hex()
+        peer.protocol.send_frame({'type': 'challenge', 'nonce': peer.nonce})
+
+    def _challenged(self, peer: _Peer, frame: Dict[str, Any]) -> bool:
+        """Take the peer's challenge and send the sealed hello. False if the link was dropped."""
+        nonce = frame.get('nonce')
+        if peer.peer_nonce is not None or not isinstance(nonce, str) or len(nonce) != 2 * NONCE_BYTES \
+                or nonce == peer.nonce:
+            peer.protocol.close()
+            return False
+        peer.peer_nonce = nonce
+        if peer.nonce is None:
+            self._challenge(peer)  # an incoming link: challenge the peer in turn
+        low, high = sorted((peer.nonce, nonce))
+        peer.key = hmac.new(self.secret, f'cluster-link\0{low}\0{high}'.encode(), hashlib.sha256).digest()
+        self._send(peer, {'type': 'hello', 'node': self.node, 'address': self.address,
+                          'clients': self.load(), 'applied': self.applied})
+        return True
+
+    def _send(self, peer: _Peer, frame: Dict[str, Any]):
+        """Send a frame sealed with the link key."""
+        body = json.dumps(frame, separators=(',', ':'))
+        peer.sent += 1
+        peer.protocol.send_frame({'type': 'sealed', 'body': body, 'mac': _mac(peer.key, peer.nonce, peer.sent, body)})
+
+    def _unseal(self, peer: _Peer, frame: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The frame inside a sealed one, or None if it is not sealed with the link key."""
+        body, mac = frame.get('body'), frame.get('mac')
+        if peer.key is None or frame.get('type') != 'sealed' or not isinstance(body, str) \
+                or not isinstance(mac, str):
+            return None
+        peer.received += 1
+        if not hmac.compare_digest(mac, _mac(peer.key, peer.peer_nonce, peer.received, body)):
+            return None
+        return json.loads(body)
+
+    def _frames_received(self, protocol: FrameProtocol, frames: List[Dict[str, Any]]):
+        peer = protocol.context
+        peer.seen = time.monotonic()
+        for frame in frames:
+            if frame.get('type') == 'challenge':
+                if not self._challenged(peer, frame):
+                    return
+                continue
+            frame = self._unseal(peer, frame)
+            if frame is None:
+                logger.warning(f"Dropping cluster link from {protocol.transport.get_extra_info('peername')}: "
+                               f"frame not sealed with the cluster secret")
+                protocol.close()
+                return
+            kind = frame.get('type')
+            if kind == 'hello':
+                self._hello_received(peer, frame)
+            elif peer.node is None:
+                protocol.close()  # not a node of this cluster
+                return
+            elif kind == 'entries':
+                new = [entry for entry in frame['entries'] if self.apply(entry)]
+                if new and self.directory is not None:
+                    self.directory.publish_cluster(new)
+            elif kind == 'load':
+                peer.clients = frame.get('clients', 0)
+
+    def _hello_received(self, peer: _Peer, frame: Dict[str, Any]):
+        if frame.get('node') == self.node:
+            logger.error(f"Node at {frame.get('address')} is also named {self.node}; dropping the link")
+            peer.protocol.close()
+            return
+        peer.node, peer.address, peer.clients = frame['node'], frame['address'], frame.get('clients', 0)
+        if peer not in self._links:
+            self._links.append(peer)
+        applied = frame.get('applied') or {}
+        missing = [entry for entry in self._log if entry[1] > applied.get(entry[0], 0)]
+        for i in range(0, len(missing), ENTRIES_PER_FRAME):
+            self._send(peer, {'type': 'entries', 'entries': missing[i:i + ENTRIES_PER_FRAME]})
+        logger.info(f"Linked to node {peer.node} at {peer.address} ({peer.clients} kiosks, "
+                    f"sent {len(missing)} entries)")
+        self._nodes_changed()
+
+    def _link_lost(self, protocol: FrameProtocol, exc: Optional[Exception]):
+        peer = protocol.context
+        if peer in self._links:
+            self._links.remove(peer)
+        if peer.closed is not None and not peer.closed.done():
+            peer.closed.set_result(None)
+        if peer.node is not None:
+            logger.info(f"Link to node {peer.node} lost")
+            self._nodes_changed()
+
+    def _send_all(self, frame: Dict[str, Any]):
+        for peer in self._links:
+            if peer.node is not None:
+                self._send(peer, frame)
+
+    def _report(self):
+        now = time.monotonic()
+        frame = {'type': 'load', 'clients': self.load()}
+        for peer in list(self._links):
+            if peer.seen < now - MISSED_REPORTS * REPORT_INTERVAL:
+                logger.warning(f"Node {peer.node or peer.address} is silent; dropping the link")
+                peer.protocol.close()
+            elif peer.node is not None:
+                self._send(peer, frame)
+        self._nodes_changed()
+
+    def _nodes_changed(self):
+        nodes = {peer.node: [peer.address, peer.clients] for peer in self._links if peer.node is not None}
+        self._set_nodes(nodes)
+        if self.directory is not None:
+            self.directory.publish_nodes(nodes)
@@ -0,0 +1,296 @@
+"""
+Append-only binary log of session and connection events, with time-range queries.
+
+Usage as a CLI (prints one JSON object per event):
+    python -m server.event_log --since 2026-10-01 --until 2026-10-02 [--client pc1] [--dir events]
+"""
+import argparse
+import asyncio
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EVENTS_DIR = 'events'
+SEGMENT_SIZE = 16 * 1024 * 1024  # rotate to a new segment file past this size
+INDEX_EVERY = 64 * 1024  # bytes of records between sparse index entries
+FLUSH_INTERVAL = 1.0  # seconds between batched write + fsync
+
+SEGMENT_MAGIC = b'KEVL\x01'
+RECORD_HEADER = struct.Struct('<IIdBH')  # crc32, data length, timestamp, kind, client_id length
+INDEX_ENTRY = struct.Struct('<dQ')  # timestamp, offset of the record
+_SEGMENT_NAME = re.compile(r'^w(\d+)-(\d+)\.log$')
+
+class EventKind:
+    CONNECT = 1
+    DISCONNECT = 2
+    SESSION_START = 3   # {'duration': seconds, 'account': ...}
+    SESSION_PAUSE = 4   # {'remaining': seconds}
+    SESSION_RESUME = 5  # {'remaining': seconds}
+    SESSION_EXTEND = 6  # {'seconds': added, 'remaining': seconds}
+    SESSION_END = 7     # {'reason': 'admin' | 'expired'}
+    APPS = 8            # {'apps': [...]} running apps changed
+
+EVENT_NAMES = {value: name.lower() for name, value in vars(EventKind).items() if not name.startswith('_')}
+
+class Event(NamedTuple):
+    timestamp: float
+    kind: int
+    client_id: str
+    data: Optional[Dict[str, Any]]
+
+def _encode(timestamp: float, kind: int, client_id: str, data: Optional[Dict[str, Any]]) -> bytes:
+    cid = client_id.encode()
+    payload = json.dumps(data, separators=(',', ':')).encode() if data is not None else b''
+    fields = RECORD_HEADER.pack(0, len(payload), timestamp, kind, len(cid))[4:]
+    crc = zlib.crc32(payload, zlib.crc32(cid, zlib.crc32(fields)))
+    return struct.pack('<I', crc) + fields + cid + payload
+
+class EventLog:
+    """Segmented append-only event log written by one server worker.
+
+    ``append`` only buffers; ``flush`` (run every FLUSH_INTERVAL by ``run``,
+    on a worker thread) writes the batch and fsyncs once, so a crash loses
+    at most the last interval. Records are CRC-checked and a torn tail is cut
+    off on the next open. Segments rotate at SEGMENT_SIZE; each has a
+    ``.idx`` file with a (timestamp, offset) entry every INDEX_EVERY bytes,
+    so a query seeks close to its start time instead of reading from the
+    beginning. Timestamps are kept non-decreasing within a writer, which is
+    what makes the sparse index valid.
+
+    Every worker writes its own segments (w<worker>-<seq>.log) in the same
+    directory; queries merge them by time.
+    """
+
+    def __init__(self, directory: str = EVENTS_DIR, writer_id: int = 0,
+                 segment_size: int = SEGMENT_SIZE, index_every: int = INDEX_EVERY):
+        self.directory = directory
+        self.writer_id = writer_id
+        self.segment_size = segment_size
+        self.index_every = index_every
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()  # guards _pending and _last_ts
+        self._flush_lock = threading.Lock()  # one flush at a time owns the files
+        self._pending: List[Tuple[float, bytes]] = []
+        self._last_ts = 0.0
+        self._file = None
+        self._index = None
+        self._size = 0
+        self._indexed_at = 0
+        segments = _segments(directory).get(writer_id, [])
+        self._seq = segments[-1][0] if segments else 0
+        if segments:
+            self._last_ts = _recover(segments[-1][1])
+
+    def append(self, kind: int, client_id: str, data: Optional[Dict[str, Any]] = None,
+               timestamp: Optional[float] = None):
+        with self._lock:
+            timestamp = max(time.time() if timestamp is None else timestamp, self._last_ts)
+            self._last_ts = timestamp
+            self._pending.append((timestamp, _encode(timestamp, kind, client_id, data)))
+
+    def flush(self):
+        """Write buffered events and fsync them."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            for timestamp, record in pending:
+                if self._file is None or self._size >= self.segment_size:
+                    self._rotate()
+                if self._size - self._indexed_at >= self.index_every or self._size == len(SEGMENT_MAGIC):
+                    self._index.write(INDEX_ENTRY.pack(timestamp, self._size))
+                    self._indexed_at = self._size
+                self._file.write(record)
+                self._size += len(record)
+            self._sync()
+
+    async def run(self, flush_interval: float = FLUSH_INTERVAL):
+        """Flush periodically off the event loop. Runs until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(flush_interval)
+            try:
+                await loop.run_in_executor(None, self.flush)
+            except OSError as e:
+                logger.error(f"Failed to write event log: {e}")
+
+    def close(self):
+        self.flush()
+        with self._flush_lock:
+            self._close_segment()
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              client_id: Optional[str] = None) -> Iterator[Event]:
+        """Events of every worker in [start, end], oldest first. Includes this writer's unflushed events."""
+        self.flush()
+        return query_events(self.directory, start, end, client_id)
+
+    def _rotate(self):
+        self._close_segment()
+        self._seq += 1
+        path = os.path.join(self.directory, f'w{self.writer_id:02d}-{self._seq:08d}.log')
+        self._file = open(path, 'wb')
+        self._index = open(path[:-4] + '.idx', 'wb')
+        self._file.write(SEGMENT_MAGIC)
+        self._size = len(SEGMENT_MAGIC)
+        self._indexed_at = self._size
+
+    def _sync(self):
+        self._file.flush()
+        self._index.flush()
+        os.fsync(self._file.fileno())
+        os.fsync(self._index.fileno())
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._index.close()
+            self._file = self._index = None
+
+def _segments(directory: str) -> Dict[int, List[Tuple[int, str]]]:
+    """writer_id -> [(seq, path)] in sequence order."""
+    writers: Dict[int, List[Tuple[int, str]]] = {}
+    if not os.path.isdir(directory):
+        return writers
+    for name in os.listdir(directory):
+        match = _SEGMENT_NAME.match(name)
+        if match:
+            writers.setdefault(int(match.group(1)), []).append((int(match.group(2)), os.path.join(directory, name)))
+    for segments in writers.values():
+        segments.sort()
+    return writers
+
+def _load_index(path: str) -> List[Tuple[float, int]]:
+    try:
+        with open(path[:-4] + '.idx', 'rb') as f:
+            data = f.read()
+    except OSError:
+        return []
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+def _records(f, end: Optional[float], client_key: Optional[bytes]) -> Iterator[Tuple[float, int, bytes, bytes]]:
+    """(timestamp, kind, client_id, data) from the current position; stops at end, EOF or a bad record."""
+    header_size = RECORD_HEADER.size
+    while True:
+        header = f.read(header_size)
+        if len(header) < header_size:
+            return
+        crc, length, timestamp, kind, cid_length = RECORD_HEADER.unpack(header)
+        body = f.read(cid_length + length)
+        if len(body) < cid_length + length or zlib.crc32(body, zlib.crc32(header[4:])) != crc:
+            return
+        if end is not None and timestamp > end:
+            return
+        cid = body[:cid_length]
+        if client_key is None or cid == client_key:
+            yield timestamp, kind, cid, body[cid_length:]
+
+def _recover(path: str) -> float:
+    """Cut a torn tail off a segment (and index entries past it); returns the last timestamp."""
+    index = _load_index(path)
+    offset = index[-1][1] if index else len(SEGMENT_MAGIC)
+    last_ts = index[-1][0] if index else 0.0
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        valid = offset
+        for timestamp, _, cid, data in _records(f, None, None):
+            last_ts = timestamp
+            valid += RECORD_HEADER.size + len(cid) + len(data)
+        if f.seek(0, os.SEEK_END) != valid:
+            logger.warning(f"Truncating torn tail of {path} at {valid}")
+            f.truncate(valid)
+    kept = [entry for entry in index if entry[1] < valid]
+    if len(kept) != len(index):
+        with open(path[:-4] + '.idx', 'wb') as f:
+            f.write(b''.join(INDEX_ENTRY.pack(*entry) for entry in kept))
+    return last_ts
+
+def _read_segment(path: str, start: Optional[float], end: Optional[float],
+                  client_key: Optional[bytes]) -> Iterator[Event]:
+    offset = len(SEGMENT_MAGIC)
+    if start is not None:
+        index = _load_index(path)
+        # Last entry strictly before start: every record before it is older than start
+        i = bisect.bisect_left([entry[0] for entry in index], start) - 1
+        if i >= 0:
+            offset = index[i][1]
+    with open(path, 'rb') as f:
+        if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+            logger.error(f"{path} is not an event log segment")
+            return
+        f.seek(offset)
+        for timestamp, kind, cid, data in _records(f, end, client_key):
+            if start is None or timestamp >= start:
+                yield Event(timestamp, kind, cid.decode(), json.loads(data) if data else None)
+
+def _read_writer(segments: List[Tuple[int, str]], start: Optional[float], end: Optional[float],
+                 client_key: Optional[bytes]) -> Iterator[Event]:
+    firsts = [_first_timestamp(path) for _, path in segments]
+    for i, (_, path) in enumerate(segments):
+        if firsts[i] is None:
+            continue
+        if end is not None and firsts[i] > end:
+            return
+        following = next((ts for ts in firsts[i + 1:] if ts is not None), None)
+        if start is not None and following is not None and following < start:
+            continue  # everything in this segment is older than the next one's first event
+        yield from _read_segment(path, start, end, client_key)
+
+def _first_timestamp(path: str) -> Optional[float]:
+    index = _load_index(path)
+    if index:
+        return index[0][0]
+    with open(path, 'rb') as f:
+        f.seek(len(SEGMENT_MAGIC))
+        for timestamp, *_ in _records(f, None, None):
+            return timestamp
+    return None
+
+def query_events(directory: str = EVENTS_DIR, start: Optional[float] = None, end: Optional[float] = None,
+                 client_id: Optional[str] = None) -> Iterator[Event]:
+    """Stream events in [start, end] (unix times, inclusive), optionally for one client, oldest first."""
+    client_key = client_id.encode() if client_id is not None else None
+    streams = [_read_writer(segments, start, end, client_key) for segments in _segments(directory).values()]
+    return heapq.merge(*streams, key=lambda event: event.timestamp)
+
+def _parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def main():
+    parser = argparse.ArgumentParser(description='Print server events as JSON lines')
+    parser.add_argument('--dir', default=EVENTS_DIR)
+    parser.add_argument('--since', type=_parse_time, help='ISO date/time or unix time')
+    parser.add_argument('--until', type=_parse_time, help='ISO date/time or unix time')
+    parser.add_argument('--client', help='Only events of this client_id')
+    args = parser.parse_args()
+    try:
+        for event in query_events(args.dir, args.since, args.until, args.client):
+            print(json.dumps({
+                'time': datetime.fromtimestamp(event.timestamp).isoformat(),
+                'event': EVENT_NAMES.get(event.kind, event.kind),
+                'client_id': event.client_id,
+                **(event.data or {}),
+            }))
+    except BrokenPipeError:
+        sys.stderr.close()
+
+if __name__ == '__main__':
+    main()
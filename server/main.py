@@ -0,0 +1,135 @@
+"""
+Kiosk server entry point.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.constants import DEFAULT_SERVER_HOST, DEFAULT_SERVER_PORT
+from server.billing import BillingLedger, LEDGER_DB
+from server.client_directory import ClientDirectory
+from server.client_manager import ClientManager
+from server.event_log import EVENTS_DIR, EventLog
+from server.usage_rollups import USAGE_DIR, UsageRollups
+from server.asset_store import ASSETS_DIR, AssetStore
+from server.cluster import CLUSTER_PORT, Cluster
+from server.resumption import ResumptionTokens
+from shared.protocol import parse_address
+from shared.tls import server_context
+
+logger = logging.getLogger(__name__)
+
+def _setup_logging(worker_id: int):
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker{worker_id} - %(name)s - %(levelname)s - %(message)s'
+    )
+
+async def _serve(worker_id: int, host: str, port: int, inboxes, ledger_path: str, secret: bytes, tls=None,
+                 events_dir: str = EVENTS_DIR, usage_dir: str = USAGE_DIR, assets_dir: str = ASSETS_DIR,
+                 cluster=None):
+    directory = ClientDirectory(worker_id, inboxes) if inboxes else None
+    # TLS tickets resume on this worker only; the session itself resumes anywhere by token
+    ssl_context = server_context(tls[0], tls[1]) if tls else None
+    ledger = BillingLedger(ledger_path)
+    events = EventLog(events_dir, worker_id)
+    usage = UsageRollups(usage_dir, worker_id)
+    if cluster is not None:
+        node, address, listen, peers, cluster_secret = cluster
+        cluster = Cluster(node, address, directory, ledger, listen, peers, cluster_secret)
+    manager = ClientManager(ledger, directory, ResumptionTokens(secret), events, usage, AssetStore(assets_dir),
+                            cluster)
+    try:
+        await manager.serve(host, port, reuse_port=directory is not None, ssl_context=ssl_context)
+    finally:
+        usage.close()
+        events.close()
+        ledger.close()
+
+def run_worker(worker_id: int, host: str, port: int, inboxes, ledger_path: str, secret: bytes, tls=None,
+               events_dir: str = EVENTS_DIR, usage_dir: str = USAGE_DIR, assets_dir: str = ASSETS_DIR,
+               cluster=None):
+    """Entry point of one server worker process. tls is (certfile, keyfile) or None for plain TCP;
+    cluster is (node name, kiosk address, peer listen address, peer addresses, cluster secret) or None for a
+    single node."""
+    _setup_logging(worker_id)
+    try:
+        asyncio.run(_serve(worker_id, host, port, inboxes, ledger_path, secret, tls, events_dir, usage_dir, assets_dir,
+                           cluster))
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Kiosk server')
+    parser.add_argument('--host', default=DEFAULT_SERVER_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes sharing the port via SO_REUSEPORT (0 = one per CPU)')
+    parser.add_argument('--ledger', default=LEDGER_DB, help='Accounts and billing database')
+    parser.add_argument('--events', default=EVENTS_DIR,
+                        help='Event log directory (query with python -m server.event_log)')
+    parser.add_argument('--usage', default=USAGE_DIR,
+                        help='Usage rollup directory (export with python -m server.usage_rollups)')
+    parser.add_argument('--assets', default=ASSETS_DIR, help='Content-addressed store of icons served to kiosks')
+    parser.add_argument('--peers', help='Comma-separated host:port of the other cluster nodes; enables clustering')
+    parser.add_argument('--cluster-port', type=int, default=CLUSTER_PORT, help='Port the other nodes connect to')
+    parser.add_argument('--node', default=socket.gethostname(), help='Name of this node, unique in the cluster')
+    parser.add_argument('--advertise', help='host:port kiosks use to reach this node (default: this host)')
+    parser.add_argument('--tls-cert', help='PEM certificate (chain); enables TLS')
+    parser.add_argument('--tls-key', help='PEM private key, if not in the certificate file')
+    args = parser.parse_args()
+
+    # All workers must accept each other's resumption tokens; set the
+    # variable to keep them valid across server restarts too.
+    secret = bytes.fromhex(os.environ['KIOSK_RESUME_SECRET']) if os.environ.get('KIOSK_RESUME_SECRET') else os.urandom(32)
+    tls = (args.tls_cert, args.tls_key) if args.tls_cert else None
+    cluster = None
+    if args.peers:
+        # Nodes only accept links sealed with this, since replicated entries credit accounts and set passwords
+        if not os.environ.get('KIOSK_CLUSTER_SECRET'):
+            parser.error("clustering needs KIOSK_CLUSTER_SECRET (hex), set to the same value on every node")
+        cluster_secret = bytes.fromhex(os.environ['KIOSK_CLUSTER_SECRET'])
+        # Resumption tokens must verify on every node: set KIOSK_RESUME_SECRET to the same value on all of them
+        host = args.host if args.host not in ('0.0.0.0', '') else socket.gethostbyname(socket.gethostname())
+        peers = [parse_address(peer.strip(), CLUSTER_PORT) for peer in args.peers.split(',') if peer.strip()]
+        cluster = (args.node, args.advertise or f'{host}:{args.port}', (args.host, args.cluster_port), peers,
+                   cluster_secret)
+        if not os.environ.get('KIOSK_RESUME_SECRET'):
+            _setup_logging(0)
+            logger.warning("KIOSK_RESUME_SECRET is not set; kiosks failing over to another node cannot resume there")
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+        _setup_logging(0)
+        logger.warning("SO_REUSEPORT is not available on this platform; running a single worker")
+        workers = 1
+    if workers == 1:
+        run_worker(0, args.host, args.port, None, args.ledger, secret, tls, args.events, args.usage, args.assets,
+                   cluster)
+        return
+
+    ctx = multiprocessing.get_context('spawn')
+    inboxes = [ctx.Queue() for _ in range(workers)]
+    processes = [
+        ctx.Process(target=run_worker, name=f'worker{i}',
+                    args=(i, args.host, args.port, inboxes, args.ledger, secret, tls,
+                          args.events, args.usage, args.assets, cluster))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+if __name__ == '__main__':
+    main()
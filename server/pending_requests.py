@@ -0,0 +1,81 @@
+"""
+Admin commands waiting for a kiosk's acknowledgement.
+"""
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from shared.constants import ACK_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class CommandStatus:
+    ACKED = "acked"
+    NACKED = "nacked"
+    TIMEOUT = "timeout"
+    UNREACHABLE = "unreachable"  # not connected to any worker
+    UNCONFIRMED = "unconfirmed"  # sent to a kiosk that does not acknowledge commands
+    SUPERSEDED = "superseded"  # dropped unsent by a newer command to a slow kiosk
+
+@dataclass
+class CommandResult:
+    """Outcome of one command sent to one kiosk."""
+    client_id: str
+    status: str
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status in (CommandStatus.ACKED, CommandStatus.UNCONFIRMED)
+
+class PendingRequests:
+    """msg_id -> future of a command sent to a kiosk, failed with TIMEOUT if no answer comes.
+
+    Ids are only unique within this table; each worker keeps its own and
+    results for commands forwarded from another worker are sent back to it.
+    """
+
+    def __init__(self, timeout: float = ACK_TIMEOUT):
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Tuple[str, asyncio.Future, asyncio.TimerHandle]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, client_id: str, timeout: Optional[float] = None) -> Tuple[int, asyncio.Future]:
+        """Register a command about to be sent to client_id; returns its msg_id and result future."""
+        loop = asyncio.get_running_loop()
+        msg_id = next(self._ids)
+        future = loop.create_future()
+        timer = loop.call_later(self.timeout if timeout is None else timeout, self._expire, msg_id)
+        self._pending[msg_id] = (client_id, future, timer)
+        return msg_id, future
+
+    def resolve(self, msg_id: Optional[int], client_id: str, status: str, error: Optional[str] = None) -> bool:
+        """Complete a command with the kiosk's answer. Answers for unknown ids or from other clients are ignored."""
+        entry = self._pending.get(msg_id)
+        if entry is None or entry[0] != client_id:
+            return False
+        del self._pending[msg_id]
+        _, future, timer = entry
+        timer.cancel()
+        if not future.done():
+            future.set_result(CommandResult(client_id, status, error))
+        return True
+
+    def _expire(self, msg_id: int):
+        entry = self._pending.pop(msg_id, None)
+        if entry is None:
+            return
+        client_id, future, _ = entry
+        if not future.done():
+            logger.warning(f"Command {msg_id} to {client_id} was not acknowledged in time")
+            future.set_result(CommandResult(client_id, CommandStatus.TIMEOUT))
+
+    def cancel_all(self):
+        for _, future, timer in self._pending.values():
+            timer.cancel()
+            future.cancel()
+        self._pending.clear()
@@ -0,0 +1,121 @@
+"""
+Screen thumbnails of kiosks, streamed only while an admin is watching.
+"""
+import base64
+import logging
+from typing import Callable, Dict, List, Optional
+from shared.protocol import ScreenMessage, create_screen_request
+
+logger = logging.getLogger(__name__)
+
+MAX_FPS = 2.0  # per watched kiosk
+MIN_FPS = 0.2
+TOTAL_FPS = 20.0  # frames per second across all watched kiosks
+LAG_THRESHOLD = 0.1  # event loop lag (seconds) above which frame rates are halved
+SLOW_LINK_BYTES = 256 * 1024  # output queued to a kiosk above which its frame rate is halved
+
+def fps_for(streams: int, lag: float = 0.0, buffered: int = 0) -> float:
+    """Frame rate for one of `streams` watched kiosks, given server loop lag and that kiosk's queued output."""
+    fps = min(MAX_FPS, TOTAL_FPS / max(1, streams))
+    if lag > LAG_THRESHOLD:
+        fps /= 2
+    if buffered > SLOW_LINK_BYTES:
+        fps /= 2
+    return round(max(MIN_FPS, fps), 2)
+
+class ScreenView:
+    """The latest thumbnail of one kiosk, as the tiles that make it up."""
+
+    def __init__(self):
+        self.width = 0
+        self.height = 0
+        self.tile = 0
+        self.tiles: Dict[int, bytes] = {}  # index (row by row) -> encoded image
+        self.frames = 0
+
+    def apply(self, message: ScreenMessage) -> List[int]:
+        """Merge a kiosk frame; returns the indexes of the tiles it replaced."""
+        if message.key or (message.width, message.height, message.tile) != (self.width, self.height, self.tile):
+            self.tiles.clear()
+            self.width, self.height, self.tile = message.width or 0, message.height or 0, message.tile or 0
+        changed = []
+        for index, data in message.tiles:
+            self.tiles[index] = base64.b64decode(data)
+            changed.append(index)
+        self.frames += 1
+        return changed
+
+    def tile_origin(self, index: int):
+        """(x, y) of a tile in the thumbnail."""
+        columns = (self.width + self.tile - 1) // self.tile
+        return (index % columns) * self.tile, (index // columns) * self.tile
+
+class ScreenMonitor:
+    """Starts a kiosk's thumbnail stream for its first viewer and stops it after the last.
+
+    ``send`` delivers a message to a client (ClientManager.send). Viewers are
+    called with (client_id, view, changed tile indexes) for every frame.
+    ``adapt`` retunes every stream to the number of watched kiosks, the
+    server's event loop lag and each kiosk's queued output; the kiosk also
+    skips frames on its own while its link has not drained the last one.
+    """
+
+    def __init__(self, send: Callable[[str, ScreenMessage], bool]):
+        self.send = send
+        self.views: Dict[str, ScreenView] = {}
+        self._viewers: Dict[str, List[Callable]] = {}
+        self._fps: Dict[str, float] = {}
+
+    def watch(self, client_id: str, on_frame: Callable[[str, ScreenView, List[int]], None]) -> Callable[[], None]:
+        """Subscribe to a kiosk's thumbnails; returns the function that unsubscribes."""
+        viewers = self._viewers.setdefault(client_id, [])
+        viewers.append(on_frame)
+        view = self.views.get(client_id)
+        if view is not None and view.tiles:
+            on_frame(client_id, view, list(view.tiles))
+        if len(viewers) == 1:
+            self._start(client_id, fps_for(len(self._viewers)))
+
+        def stop():
+            if on_frame in viewers:
+                viewers.remove(on_frame)
+            if not viewers and self._viewers.get(client_id) is viewers:
+                del self._viewers[client_id]
+                self._fps.pop(client_id, None)
+                self.views.pop(client_id, None)
+                self.send(client_id, create_screen_request(client_id, 0))
+        return stop
+
+    def watched(self) -> List[str]:
+        return list(self._viewers)
+
+    def apply(self, client_id: str, message: ScreenMessage):
+        viewers = self._viewers.get(client_id)
+        if not viewers:
+            return  # a frame still in flight after the last viewer left
+        view = self.views.get(client_id)
+        if view is None:
+            view = self.views[client_id] = ScreenView()
+        changed = view.apply(message)
+        for on_frame in list(viewers):
+            try:
+                on_frame(client_id, view, changed)
+            except Exception as e:
+                logger.error(f"Error in screen viewer for {client_id}: {e}")
+
+    def client_connected(self, client_id: str):
+        """A watched kiosk (re)connected: ask it to stream again, from a full frame."""
+        if client_id in self._viewers:
+            self._start(client_id, self._fps.get(client_id) or fps_for(len(self._viewers)))
+
+    def adapt(self, lag: float = 0.0, buffered: Optional[Dict[str, int]] = None):
+        streams = len(self._viewers)
+        for client_id in self._viewers:
+            fps = fps_for(streams, lag, (buffered or {}).get(client_id, 0))
+            if fps != self._fps.get(client_id):
+                logger.debug(f"Screen of {client_id}: {self._fps.get(client_id)} -> {fps} fps")
+                self._start(client_id, fps)
+
+    def _start(self, client_id: str, fps: float):
+        self._fps[client_id] = fps
+        self.send(client_id, create_screen_request(client_id, fps))
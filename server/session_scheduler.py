@@ -0,0 +1,299 @@
+"""
+Authoritative session deadlines for all connected kiosks.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from shared.constants import SessionState, MAX_SESSION_DURATION
+from .billing import BillingLedger
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FLUSH_INTERVAL = 30  # seconds
+
+class ScheduledSession:
+    """Timing state of one kiosk session."""
+    __slots__ = ('client_id', 'account', 'state', 'deadline', 'remaining', 'billed_at', 'generation')
+
+    def __init__(self, client_id: str, account: Optional[str]):
+        self.client_id = client_id
+        self.account = account
+        self.state = SessionState.ACTIVE
+        self.deadline = 0.0     # clock time the session ends, while active
+        self.remaining = 0.0    # seconds left, while paused
+        self.billed_at = 0.0    # clock time up to which usage has been debited
+        self.generation = 0     # bumped on every reschedule; stale heap entries are skipped
+
+class SessionScheduler:
+    """Keeps session deadlines in a heap and ends sessions when they run out.
+
+    Pause, resume and extend push a new heap entry and bump the session's
+    generation instead of searching the heap, so every operation is O(log n).
+    Stale entries are dropped when they reach the top, and the heap is rebuilt
+    once they outnumber live sessions. Usage is debited from the session's
+    account whenever it stops or changes, and periodically while it runs.
+
+    Time granted to an account's sessions but not yet debited is reserved:
+    a session starts with at most the balance left after the account's other
+    sessions, and an extension the account cannot cover is refused.
+    """
+
+    def __init__(
+        self,
+        on_expire: Callable[[str], None],
+        ledger: Optional[BillingLedger] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.on_expire = on_expire
+        self.ledger = ledger
+        self.clock = clock
+        self.sessions: Dict[str, ScheduledSession] = {}
+        self._accounts: Dict[str, Set[str]] = {}  # account -> client_ids of its sessions
+        self._heap: List[Tuple[float, int, str]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def _schedule(self, session: ScheduledSession):
+        session.generation += 1
+        heapq.heappush(self._heap, (session.deadline, session.generation, session.client_id))
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self.sessions):
+            self._compact()
+        if self._wakeup is not None and self._heap[0][2] == session.client_id:
+            self._wakeup.set()
+
+    def _compact(self):
+        self._heap = [
+            (s.deadline, s.generation, s.client_id)
+            for s in self.sessions.values() if s.state == SessionState.ACTIVE
+        ]
+        heapq.heapify(self._heap)
+
+    def _add(self, session: ScheduledSession):
+        self.sessions[session.client_id] = session
+        if session.account:
+            self._accounts.setdefault(session.account, set()).add(session.client_id)
+
+    def _remove(self, client_id: str) -> Optional[ScheduledSession]:
+        session = self.sessions.pop(client_id, None)
+        if session is not None and session.account:
+            client_ids = self._accounts.get(session.account)
+            if client_ids is not None:
+                client_ids.discard(client_id)
+                if not client_ids:
+                    del self._accounts[session.account]
+        return session
+
+    @staticmethod
+    def _unbilled(session: ScheduledSession) -> float:
+        """Granted seconds not yet debited from the account."""
+        if session.state == SessionState.PAUSED:
+            return session.remaining
+        return max(0.0, session.deadline - session.billed_at)
+
+    def available(self, account: str, exclude: Optional[str] = None) -> int:
+        """Seconds the account can still be granted: its balance less what its sessions (but exclude's) hold."""
+        if self.ledger is None:
+            return MAX_SESSION_DURATION
+        held = sum(self._unbilled(self.sessions[client_id])
+                   for client_id in self._accounts.get(account, ()) if client_id != exclude)
+        return max(0, self.ledger.balance(account) - math.ceil(held))
+
+    def _bill(self, session: ScheduledSession, now: float):
+        if session.state == SessionState.ACTIVE:
+            if self.ledger is not None and session.account:
+                self.ledger.debit(session.account, now - session.billed_at, session.client_id)
+            session.billed_at = now
+
+    def start(self, client_id: str, duration: int, account: Optional[str] = None) -> int:
+        """Start (or restart) a session. Returns the granted duration in seconds."""
+        if client_id in self.sessions:
+            self.end(client_id)
+        if account:
+            duration = min(duration, self.available(account))
+        duration = max(0, min(duration, MAX_SESSION_DURATION))
+        now = self.clock()
+        session = ScheduledSession(client_id, account)
+        session.deadline = now + duration
+        session.billed_at = now
+        self._add(session)
+        self._schedule(session)
+        return duration
+
+    def pause(self, client_id: str) -> Optional[int]:
+        """Pause a running session. Returns the seconds left."""
+        session = self.sessions.get(client_id)
+        if session is None or session.state != SessionState.ACTIVE:
+            return None
+        now = self.clock()
+        self._bill(session, now)
+        session.remaining = max(0.0, session.deadline - now)
+        session.state = SessionState.PAUSED
+        session.generation += 1  # invalidates the pending heap entry
+        return int(session.remaining)
+
+    def resume(self, client_id: str) -> Optional[int]:
+        """Resume a paused session. Returns the seconds left."""
+        session = self.sessions.get(client_id)
+        if session is None or session.state != SessionState.PAUSED:
+            return None
+        now = self.clock()
+        session.state = SessionState.ACTIVE
+        session.deadline = now + session.remaining
+        session.billed_at = now
+        self._schedule(session)
+        return int(session.remaining)
+
+    def extend(self, client_id: str, seconds: int) -> Optional[int]:
+        """Add time to a session. Returns the seconds left, or None if the account cannot cover it."""
+        session = self.sessions.get(client_id)
+        if session is None:
+            return None
+        if session.account and seconds > 0:
+            if self._unbilled(session) + seconds > self.available(session.account, exclude=client_id):
+                return None
+        if session.state == SessionState.PAUSED:
+            session.remaining += seconds
+            return int(session.remaining)
+        session.deadline += seconds
+        self._schedule(session)
+        return self.remaining(client_id)
+
+    def end(self, client_id: str) -> bool:
+        """Stop a session without notifying the kiosk (the caller does that)."""
+        session = self._remove(client_id)
+        if session is None:
+            return False
+        self._bill(session, self.clock())
+        session.state = SessionState.ENDED
+        return True
+
+    def snapshot(self, client_id: str) -> Optional[Dict[str, Any]]:
+        """What restore() needs to continue a session elsewhere, or None if there is no session."""
+        session = self.sessions.get(client_id)
+        if session is None:
+            return None
+        if session.state == SessionState.PAUSED:
+            remaining = session.remaining
+        else:
+            remaining = max(0.0, session.deadline - self.clock())
+        return {'account': session.account, 'state': session.state, 'remaining': remaining}
+
+    def export(self, client_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a session and return its snapshot."""
+        data = self.snapshot(client_id)
+        if data is not None:
+            self.end(client_id)
+        return data
+
+    def restore(self, client_id: str, data: Dict[str, Any]):
+        """Continue a session exported by another scheduler."""
+        now = self.clock()
+        session = ScheduledSession(client_id, data.get('account'))
+        session.state = data['state']
+        session.billed_at = now
+        if session.state == SessionState.PAUSED:
+            session.remaining = data['remaining']
+            self._add(session)
+        else:
+            session.deadline = now + data['remaining']
+            self._add(session)
+            self._schedule(session)
+
+    def state(self, client_id: str) -> Optional[str]:
+        session = self.sessions.get(client_id)
+        return session.state if session is not None else None
+
+    def remaining(self, client_id: str) -> Optional[int]:
+        session = self.sessions.get(client_id)
+        if session is None:
+            return None
+        if session.state == SessionState.PAUSED:
+            return int(session.remaining)
+        return max(0, int(session.deadline - self.clock()))
+
+    def time_left(self, client_id: str) -> Optional[float]:
+        """Seconds until a running session ends, unrounded; None unless it is active."""
+        session = self.sessions.get(client_id)
+        if session is None or session.state != SessionState.ACTIVE:
+            return None
+        return max(0.0, session.deadline - self.clock())
+
+    def next_deadline(self) -> Optional[float]:
+        """Clock time of the earliest live deadline, dropping stale heap entries."""
+        heap = self._heap
+        while heap:
+            deadline, generation, client_id = heap[0]
+            session = self.sessions.get(client_id)
+            if session is not None and session.generation == generation and session.state == SessionState.ACTIVE:
+                return deadline
+            heapq.heappop(heap)
+        return None
+
+    def expire_due(self, now: Optional[float] = None) -> List[str]:
+        """End every session whose deadline has passed and call on_expire for each."""
+        if now is None:
+            now = self.clock()
+        expired = []
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                break
+            _, _, client_id = heapq.heappop(self._heap)
+            session = self._remove(client_id)
+            # Bill up to the deadline, not the moment we noticed
+            self._bill(session, session.deadline)
+            session.state = SessionState.ENDED
+            expired.append(client_id)
+        for client_id in expired:
+            try:
+                self.on_expire(client_id)
+            except Exception as e:
+                logger.error(f"Error ending session for {client_id}: {e}")
+        return expired
+
+    def accrue(self):
+        """Debit usage of running sessions so far, e.g. before a ledger flush."""
+        now = self.clock()
+        for session in self.sessions.values():
+            self._bill(session, now)
+
+    async def flush(self):
+        """Debit usage so far and write the ledger on an executor thread."""
+        if self.ledger is None:
+            return
+        self.accrue()
+        rows = await asyncio.get_running_loop().run_in_executor(None, self.ledger.write_pending)
+        self.ledger.published(rows)
+
+    async def run(self, flush_interval: float = LEDGER_FLUSH_INTERVAL):
+        """Expire sessions on time and flush the ledger periodically. Runs until cancelled."""
+        self._wakeup = asyncio.Event()
+        next_flush = self.clock() + flush_interval
+        try:
+            while True:
+                self.expire_due()
+                now = self.clock()
+                if now >= next_flush:
+                    await self.flush()
+                    now = self.clock()
+                    next_flush = now + flush_interval
+                deadline = self.next_deadline()
+                timeout = next_flush - now
+                if deadline is not None:
+                    timeout = min(timeout, deadline - now)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(0.0, timeout))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._wakeup = None
+            # Shutting down: write what is left before returning
+            if self.ledger is not None:
+                self.accrue()
+                self.ledger.flush()
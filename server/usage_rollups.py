@@ -0,0 +1,347 @@
+"""
+Incremental usage rollups: seconds of use per client and per app, by hour and by day.
+
+Usage as a CLI (streams CSV: dimension,name,bucket,seconds):
+    python -m server.usage_rollups --resolution day [--dimension app] [--since 2026-10-01] [--until ...] [--dir usage]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from .event_log import EventKind
+
+logger = logging.getLogger(__name__)
+
+USAGE_DIR = 'usage'
+CHECKPOINT_INTERVAL = 60.0  # seconds between snapshots to disk
+HOURLY_RETENTION = 90 * 24  # hours of hourly buckets kept; daily buckets are kept forever
+
+HOUR = 3600
+CLIENT = 'client'
+APP = 'app'
+DIMENSIONS = (CLIENT, APP)
+
+ROLLUP_MAGIC = b'KUSG\x01'
+_HEADER_LENGTH = struct.Struct('<I')
+_ROLLUP_NAME = re.compile(r'^w(\d+)\.rollup$')
+_EPOCH = date(1970, 1, 1)
+
+def local_day(timestamp: int) -> int:
+    """Local calendar day of a unix time, as days since 1970-01-01."""
+    return (timestamp + time.localtime(timestamp).tm_gmtoff) // 86400
+
+class _Series:
+    """Seconds per bucket for one client or app; index 0 is hour0 / day0."""
+    __slots__ = ('hour0', 'hours', 'day0', 'days')
+
+    def __init__(self):
+        self.hour0 = self.day0 = 0
+        self.hours = array('I')
+        self.days = array('I')
+
+    def add(self, start: int, end: int):
+        """Count the seconds in [start, end), split at hour boundaries."""
+        while start < end:
+            hour = start // HOUR
+            seconds = min(end, (hour + 1) * HOUR) - start
+            self.hour0 = _bump(self.hours, self.hour0, hour, seconds)
+            self.day0 = _bump(self.days, self.day0, local_day(hour * HOUR), seconds)
+            start += seconds
+
+    def trim(self, keep_from_hour: int):
+        drop = keep_from_hour - self.hour0
+        if drop > 0 and self.hours:
+            del self.hours[:drop]
+            self.hour0 = keep_from_hour if self.hours else 0
+
+def _bump(buckets: array, base: int, index: int, seconds: int) -> int:
+    """Add seconds to buckets[index - base], growing the array as needed; returns the (new) base."""
+    if not buckets:
+        base = index
+        buckets.append(0)
+    elif index < base:
+        buckets[0:0] = array('I', bytes(4 * (base - index)))
+        base = index
+    elif index >= base + len(buckets):
+        buckets.extend(array('I', bytes(4 * (index - base - len(buckets) + 1))))
+    buckets[index - base] += seconds
+    return base
+
+def _read(buckets: array, base: int, first: int, last: int) -> List[int]:
+    """Buckets first..last inclusive, zero where nothing was recorded."""
+    lo, hi = max(first, base), min(last, base + len(buckets) - 1)
+    if lo > hi:
+        return [0] * (last - first + 1)
+    return [0] * (lo - first) + buckets[lo - base:hi - base + 1].tolist() + [0] * (last - hi)
+
+class UsageRollups:
+    """Running totals of session time per client and app time per app.
+
+    Fed with the same session lifecycle events the event log records
+    (``observe``) rather than recomputed from history: open intervals are
+    tracked per client and added into hourly and daily buckets whenever they
+    change and at every checkpoint. Buckets live in ``array('I')`` per
+    (dimension, name), indexed by hour or local day, so reading a bucket is
+    an index operation however much history there is. Times are whole
+    seconds, so splitting an interval across buckets never loses any.
+
+    ``run`` snapshots the arrays to <directory>/w<writer>.rollup every
+    CHECKPOINT_INTERVAL; each worker keeps its own file and ``load_rollups``
+    adds them together for reporting. Time not yet checkpointed is lost on a
+    crash, at most one interval.
+    """
+
+    def __init__(self, directory: Optional[str] = USAGE_DIR, writer_id: int = 0,
+                 clock=time.time, hourly_retention: int = HOURLY_RETENTION):
+        self.directory = directory
+        self.writer_id = writer_id
+        self.clock = clock
+        self.hourly_retention = hourly_retention
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._sessions: Dict[str, int] = {}  # client_id -> counted up to
+        self._apps: Dict[str, Tuple[int, Tuple[str, ...]]] = {}  # client_id -> (counted up to, running apps)
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.path):
+                self.merge_file(self.path)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f'w{self.writer_id:02d}.rollup')
+
+    # Feeding
+
+    def observe(self, kind: int, client_id: str, data: Optional[Dict[str, Any]] = None,
+                now: Optional[float] = None):
+        """Apply one EventKind event."""
+        if kind in (EventKind.SESSION_START, EventKind.SESSION_RESUME):
+            self.start(client_id, now)
+        elif kind in (EventKind.SESSION_PAUSE, EventKind.SESSION_END):
+            self.stop(client_id, now)
+        elif kind == EventKind.APPS:
+            self.set_apps(client_id, (data or {}).get('apps') or (), now)
+        elif kind == EventKind.DISCONNECT:
+            self.set_apps(client_id, (), now)
+
+    def start(self, client_id: str, now: Optional[float] = None):
+        """Start counting session time for client_id (no-op if already counting)."""
+        self._sessions.setdefault(client_id, self._now(now))
+
+    def stop(self, client_id: str, now: Optional[float] = None):
+        since = self._sessions.pop(client_id, None)
+        if since is not None:
+            self._series_for(CLIENT, client_id).add(since, self._now(now))
+
+    def set_apps(self, client_id: str, apps: Iterable[str], now: Optional[float] = None):
+        """The apps running on client_id from now on."""
+        now = self._now(now)
+        since, running = self._apps.pop(client_id, (now, ()))
+        for app in running:
+            self._series_for(APP, app).add(since, now)
+        apps = tuple(apps)
+        if apps:
+            self._apps[client_id] = (now, apps)
+
+    def accrue(self, now: Optional[float] = None):
+        """Add the open intervals so far into their buckets."""
+        now = self._now(now)
+        for client_id, since in self._sessions.items():
+            self._series_for(CLIENT, client_id).add(since, now)
+            self._sessions[client_id] = now
+        for client_id, (since, apps) in self._apps.items():
+            for app in apps:
+                self._series_for(APP, app).add(since, now)
+            self._apps[client_id] = (now, apps)
+
+    def _now(self, now: Optional[float]) -> int:
+        return int(self.clock() if now is None else now)
+
+    def _series_for(self, dimension: str, name: str) -> _Series:
+        key = (dimension, name)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+        return series
+
+    # Queries
+
+    def names(self, dimension: str) -> List[str]:
+        return sorted(name for dim, name in self._series if dim == dimension)
+
+    def hourly(self, dimension: str, name: str, start: float, end: float) -> List[int]:
+        """Seconds in each hour from the one containing start to the one containing end."""
+        self.accrue()
+        first, last = int(start) // HOUR, int(end) // HOUR
+        series = self._series.get((dimension, name))
+        if series is None:
+            return [0] * (last - first + 1)
+        return _read(series.hours, series.hour0, first, last)
+
+    def daily(self, dimension: str, name: str, first: date, last: date) -> List[int]:
+        """Seconds on each local day from first to last inclusive."""
+        self.accrue()
+        first_day, last_day = (first - _EPOCH).days, (last - _EPOCH).days
+        series = self._series.get((dimension, name))
+        if series is None:
+            return [0] * (last_day - first_day + 1)
+        return _read(series.days, series.day0, first_day, last_day)
+
+    def export_csv(self, out: TextIO, resolution: str = 'day', dimension: Optional[str] = None,
+                   start: Optional[float] = None, end: Optional[float] = None) -> int:
+        """Write non-zero buckets as CSV rows, one series at a time; returns the number of rows."""
+        self.accrue()
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(('dimension', 'name', resolution, 'seconds'))
+        rows = 0
+        for (dim, name), series in sorted(self._series.items()):
+            if dimension is not None and dim != dimension:
+                continue
+            for bucket, seconds in _buckets(series, resolution, start, end):
+                writer.writerow((dim, name, bucket, seconds))
+                rows += 1
+        return rows
+
+    # Persistence
+
+    async def run(self, interval: float = CHECKPOINT_INTERVAL):
+        """Checkpoint periodically, writing off the event loop. Runs until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            data = self.snapshot()
+            try:
+                await loop.run_in_executor(None, self._write, data)
+            except OSError as e:
+                logger.error(f"Failed to checkpoint usage rollups: {e}")
+
+    def checkpoint(self):
+        self._write(self.snapshot())
+
+    def close(self):
+        if self.directory is not None:
+            self.checkpoint()
+
+    def snapshot(self) -> bytes:
+        """Accrue open intervals and serialize every series."""
+        now = self._now(None)
+        self.accrue(now)
+        keep_from = now // HOUR - self.hourly_retention
+        header, blobs = [], []
+        for (dim, name), series in self._series.items():
+            series.trim(keep_from)
+            header.append([dim, name, series.hour0, len(series.hours), series.day0, len(series.days)])
+            blobs.append(_to_bytes(series.hours))
+            blobs.append(_to_bytes(series.days))
+        encoded = json.dumps(header, separators=(',', ':')).encode()
+        return b''.join([ROLLUP_MAGIC, _HEADER_LENGTH.pack(len(encoded)), encoded] + blobs)
+
+    def _write(self, data: bytes):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def merge_file(self, path: str):
+        """Add the buckets of a checkpoint file into these rollups."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(ROLLUP_MAGIC):
+            logger.error(f"{path} is not a usage rollup file")
+            return
+        offset = len(ROLLUP_MAGIC)
+        (length,) = _HEADER_LENGTH.unpack_from(data, offset)
+        offset += _HEADER_LENGTH.size
+        header = json.loads(data[offset:offset + length])
+        offset += length
+        for dim, name, hour0, hour_count, day0, day_count in header:
+            series = self._series_for(dim, name)
+            hours, offset = _from_bytes(data, offset, hour_count)
+            days, offset = _from_bytes(data, offset, day_count)
+            series.hour0 = _merge(series.hours, series.hour0, hours, hour0)
+            series.day0 = _merge(series.days, series.day0, days, day0)
+
+def _to_bytes(buckets: array) -> bytes:
+    if sys.byteorder == 'little':
+        return buckets.tobytes()
+    swapped = array('I', buckets)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+def _from_bytes(data: bytes, offset: int, count: int) -> Tuple[array, int]:
+    buckets = array('I')
+    end = offset + count * buckets.itemsize
+    buckets.frombytes(data[offset:end])
+    if sys.byteorder != 'little':
+        buckets.byteswap()
+    return buckets, end
+
+def _merge(buckets: array, base: int, other: array, other_base: int) -> int:
+    if not other:
+        return base
+    if not buckets:
+        buckets.extend(other)
+        return other_base
+    base = _bump(buckets, base, other_base, 0)
+    base = _bump(buckets, base, other_base + len(other) - 1, 0)
+    offset = other_base - base
+    for i, seconds in enumerate(other):
+        buckets[offset + i] += seconds
+    return base
+
+def _buckets(series: _Series, resolution: str, start: Optional[float], end: Optional[float]) -> Iterator[Tuple[str, int]]:
+    if resolution == 'hour':
+        buckets, base = series.hours, series.hour0
+        first = base if start is None else max(base, int(start) // HOUR)
+        last = base + len(buckets) - 1 if end is None else min(base + len(buckets) - 1, int(end) // HOUR)
+        label = lambda index: datetime.fromtimestamp(index * HOUR).isoformat(timespec='minutes')
+    else:
+        buckets, base = series.days, series.day0
+        first = base if start is None else max(base, local_day(int(start)))
+        last = base + len(buckets) - 1 if end is None else min(base + len(buckets) - 1, local_day(int(end)))
+        label = lambda index: (_EPOCH + timedelta(days=index)).isoformat()
+    for index in range(first, last + 1):
+        seconds = buckets[index - base]
+        if seconds:
+            yield label(index), seconds
+
+def load_rollups(directory: str = USAGE_DIR) -> UsageRollups:
+    """Every worker's last checkpoint in directory, added together."""
+    rollups = UsageRollups(None)
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if _ROLLUP_NAME.match(name):
+                rollups.merge_file(os.path.join(directory, name))
+    return rollups
+
+def _parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def main():
+    parser = argparse.ArgumentParser(description='Export usage rollups as CSV')
+    parser.add_argument('--dir', default=USAGE_DIR)
+    parser.add_argument('--resolution', choices=('hour', 'day'), default='day')
+    parser.add_argument('--dimension', choices=DIMENSIONS, help='Only clients or only apps')
+    parser.add_argument('--since', type=_parse_time, help='ISO date/time or unix time')
+    parser.add_argument('--until', type=_parse_time, help='ISO date/time or unix time')
+    args = parser.parse_args()
+    try:
+        load_rollups(args.dir).export_csv(sys.stdout, args.resolution, args.dimension, args.since, args.until)
+    except BrokenPipeError:
+        sys.stderr.close()
+
+if __name__ == '__main__':
+    main()
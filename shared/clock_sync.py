@@ -0,0 +1,80 @@
+"""
+NTP-style round-trip time and clock offset estimates from heartbeat timestamps.
+"""
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+FILTER_SAMPLES = 8  # recent samples the offset is picked from
+RTT_GAIN = 1 / 8  # smoothing of the round-trip time, as TCP's SRTT
+JITTER_GAIN = 1 / 4  # smoothing of its mean deviation, as TCP's RTTVAR
+OFFSET_GAIN = 1 / 2  # how far the offset moves toward each new pick
+MAX_DRIFT = 100e-6  # clock drift allowed for: an older sample's offset is that much less certain per second
+
+class ClockSync:
+    """Round-trip time, jitter and clock offset of the peer at the other end of a connection.
+
+    Each side stamps its heartbeats (``stamp``) with when they were sent, the
+    ``sent`` of the peer's last heartbeat and how long that one was held
+    before this one went out. A receiver then has the four timestamps of an
+    NTP exchange (``received``):
+        t0 = echo          we sent the heartbeat the peer answers (our clock)
+        t1 = sent - held   it reached the peer (peer clock)
+        t2 = sent          the peer's heartbeat left (peer clock)
+        t3 = now           it reached us (our clock)
+    round trip = (t3 - t0) - (t2 - t1), offset = ((t1 - t0) + (t2 - t3)) / 2.
+    The round trip is smoothed the way TCP smooths RTT, and its mean
+    deviation is the jitter. Queueing in one direction skews a sample's
+    offset by up to half the extra delay, so, as in NTP's clock filter, the
+    offset comes from the most certain of the last FILTER_SAMPLES (shortest
+    round trip, less MAX_DRIFT per second of age), and is then smoothed.
+    """
+    __slots__ = ('clock', 'rtt', 'jitter', 'offset', 'samples', '_peer_sent', '_received_at', '_recent')
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.rtt: Optional[float] = None  # seconds, smoothed
+        self.jitter: Optional[float] = None  # seconds, mean deviation of the round trip
+        self.offset: Optional[float] = None  # seconds the peer's clock is ahead of ours
+        self.samples = 0
+        self._peer_sent: Optional[float] = None
+        self._received_at = 0.0
+        self._recent: Deque[Tuple[float, float, float]] = deque(maxlen=FILTER_SAMPLES)  # (round trip, offset, at)
+
+    def stamp(self) -> Dict[str, float]:
+        """Timing fields for an outgoing heartbeat. Without an echo it asks the peer to answer at once."""
+        now = self.clock()
+        if self._peer_sent is None:
+            return {'sent': now}
+        return {'sent': now, 'echo': self._peer_sent, 'held': now - self._received_at}
+
+    def received(self, sent: float, echo: Optional[float] = None, held: Optional[float] = None) -> bool:
+        """Take the timing fields of a heartbeat from the peer. Returns True if they made a sample."""
+        now = self.clock()
+        self._peer_sent, self._received_at = float(sent), now
+        if echo is None or held is None:
+            return False
+        rtt = (now - echo) - held
+        if rtt < 0:
+            return False  # our clock stepped back, or the echo is not ours
+        offset = ((sent - held - echo) + (sent - now)) / 2
+        self.samples += 1
+        if self.rtt is None:
+            self.rtt, self.jitter = rtt, rtt / 2
+        else:
+            self.jitter += JITTER_GAIN * (abs(self.rtt - rtt) - self.jitter)
+            self.rtt += RTT_GAIN * (rtt - self.rtt)
+        self._recent.append((rtt, offset, now))
+        best = min(self._recent, key=lambda sample: sample[0] / 2 + (now - sample[2]) * MAX_DRIFT)[1]
+        self.offset = best if self.offset is None else self.offset + OFFSET_GAIN * (best - self.offset)
+        return True
+
+    def to_peer(self, t: float) -> Optional[float]:
+        """A time on our clock as the peer's clock reads it, once the offset is known."""
+        return t + self.offset if self.offset is not None else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.rtt is None:
+            return {'samples': 0}
+        return {'rtt_ms': round(self.rtt * 1000, 1), 'jitter_ms': round(self.jitter * 1000, 1),
+                'offset_ms': round(self.offset * 1000, 1), 'samples': self.samples}
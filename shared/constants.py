@@ -5,9 +5,20 @@ Shared constants for the kiosk system.
 # Network
 DEFAULT_SERVER_PORT = 5000
 DEFAULT_SERVER_HOST = "0.0.0.0"
-HEARTBEAT_INTERVAL = 5  # seconds
-RECONNECT_ATTEMPTS = 5
-RECONNECT_DELAY = 2  # seconds
+HEARTBEAT_INTERVAL = 5  # seconds; servers may raise it for large fleets
+MAX_HEARTBEAT_INTERVAL = 60  # seconds
+HEARTBEAT_FLEET_STEP = 500  # connected kiosks per extra base interval
+RECONNECT_DELAY = 2  # seconds, after every server in the list has been tried; doubles each round
+MAX_RECONNECT_DELAY = 15  # seconds between rounds at most
+UNREACHABLE_AFTER = 60  # seconds of failed attempts before the kiosk tells the user
+CONNECT_TIMEOUT = 2  # seconds before an unreachable server is skipped for the next one
+ACK_TIMEOUT = 10  # seconds a kiosk has to acknowledge a command
+TELEMETRY_INTERVAL = 10  # seconds between kiosk resource samples; the server may change it
+ASSET_CHUNK_SIZE = 32 * 1024  # bytes per ASSET_CHUNK; base64 of it must fit asyncio's 64 KiB line limit
+
+# Protocol
+PROTOCOL_VERSION = 1
+MIN_PROTOCOL_VERSION = 0  # legacy peers that send no handshake; every version is still spoken
 
 # Session
 DEFAULT_SESSION_DURATION = 3600  # 1 hour in seconds
@@ -30,6 +41,8 @@ BLOCKED_PROCESSES = [
     "regedit.exe",
     "msconfig.exe",
 ]
+# Blocked, but only their windows are hidden: the shell restarts itself when terminated
+HIDE_ONLY_PROCESSES = ["explorer.exe"]
 
 # Message Types
 class MessageType:
@@ -45,6 +58,44 @@ class MessageType:
     MAINTENANCE = "maintenance"
     SHUTDOWN = "shutdown"
     REMOVE_CLIENT = "remove_client"
+    HANDSHAKE = "handshake"
+    # client2 (overlay client) dialect
+    AUTH = "auth"
+    AUTH_SUCCESS = "auth_success"
+    AUTH_ERROR = "auth_error"
+    SESSION_STARTED = "session_started"
+    JOURNAL = "journal"
+    ACK = "ack"
+    NACK = "nack"
+    TELEMETRY = "telemetry"
+    SCREEN = "screen"
+    ASSET_REQUEST = "asset_request"
+    ASSET_CHUNK = "asset_chunk"
+    REDIRECT = "redirect"
+
+# Kinds of events in the offline session journal
+class JournalEvent:
+    TICK = 1    # {'state': ..., 'remaining': ...}; only the latest one matters
+    APP = 2     # {'name': ...} app launched
+    STATUS = 3  # {'state': ...} session state changed
+
+# Wire codecs, in order of preference
+class Codec:
+    JSON = "json"
+
+# Optional protocol features negotiated in the handshake
+class Capability:
+    """Capability names exchanged in the handshake."""
+    APPS_VERSION = "apps_version"  # versioned allowed apps lists
+    RESUME = "resume"  # sequence numbers and resumption tokens
+    JOURNAL = "journal"  # batched upload of events recorded while offline
+    HEARTBEAT = "heartbeat"  # server-set heartbeat interval, bare heartbeat frames
+    ACK = "ack"  # commands carry a msg_id and are answered with ACK/NACK
+    TELEMETRY = "telemetry"  # kiosk sends delta-encoded resource samples
+    SCREEN = "screen"  # kiosk streams changed screen thumbnail tiles on request
+    ASSETS = "assets"  # icons and other assets fetched by content hash over the connection
+    CLUSTER = "cluster"  # kiosk keeps the list of server nodes and follows redirects
+    CLOCK = "clock"  # heartbeats carry timestamps for round-trip time and clock offset; session deadlines
 
 # Session States
 class SessionState:
@@ -0,0 +1,119 @@
+"""
+Non-blocking on-screen notices and prompts for the kiosk clients (Qt).
+"""
+import asyncio
+import itertools
+from typing import Dict, Optional
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QGuiApplication
+from PySide6.QtWidgets import QDialog, QLabel, QVBoxLayout, QWidget
+
+NOTICE_TIMEOUT = 8  # seconds a notice stays up unless it is sticky
+BANNER_WIDTH = 640
+BANNER_MARGIN = 16
+_COLORS = {'info': '#1e5aa8', 'warning': '#a8740f', 'error': '#a83232'}
+
+class Banner(QWidget):
+    """A frameless, always-on-top notice that never takes focus. Clicking it dismisses it."""
+
+    def __init__(self, title: str, text: str, level: str = 'info'):
+        super().__init__()
+        self.setWindowFlags(Qt.Tool | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.WindowDoesNotAcceptFocus)
+        self.setAttribute(Qt.WA_ShowWithoutActivating)
+        self.setAttribute(Qt.WA_QuitOnClose, False)  # closing the last notice must not quit the app
+        self.setFixedWidth(BANNER_WIDTH)
+        self.title_label = QLabel(self)
+        self.title_label.setStyleSheet('font-size: 20px; font-weight: bold;')
+        self.text_label = QLabel(self)
+        self.text_label.setWordWrap(True)
+        self.text_label.setStyleSheet('font-size: 16px;')
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.title_label)
+        layout.addWidget(self.text_label)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.close)
+        self.on_closed = None
+        self.set_text(title, text, level)
+
+    def set_text(self, title: str, text: str, level: str = 'info'):
+        self.setStyleSheet(f'background: {_COLORS.get(level, _COLORS["info"])}; color: white;')
+        self.title_label.setText(title)
+        self.text_label.setText(text)
+        self.adjustSize()
+
+    def mousePressEvent(self, event):
+        self.close()
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        super().closeEvent(event)
+        if self.on_closed is not None:
+            self.on_closed()
+
+class Notifier:
+    """Notices as banners stacked at the top of the screen, and prompts as futures.
+
+    A modal QMessageBox (or QDialog.exec) runs a nested event loop until
+    someone clicks it. Under qasync the coroutine that opened it stops there
+    and other tasks cannot be stepped from inside that loop, so heartbeats,
+    reconnects and the receive loop wait, on an unattended kiosk for hours.
+    ``notify`` returns at once; ``ask`` opens a dialog with ``open()`` and
+    returns a future that the dialog's ``finished`` signal resolves, so the
+    caller awaits the answer while everything else keeps running.
+    """
+
+    def __init__(self):
+        self._banners: Dict[str, Banner] = {}
+        self._keys = itertools.count()
+
+    def notify(self, title: str, text: str, level: str = 'info', timeout: float = NOTICE_TIMEOUT,
+               key: Optional[str] = None):
+        """Show a notice and return immediately.
+
+        A notice with the key of one still showing replaces it (the
+        connection status, say); timeout 0 keeps it up until ``dismiss``.
+        """
+        key = key or f'notice{next(self._keys)}'
+        banner = self._banners.get(key)
+        if banner is None:
+            banner = self._banners[key] = Banner(title, text, level)
+            banner.on_closed = lambda: self._closed(key, banner)
+        else:
+            banner.set_text(title, text, level)
+        if timeout:
+            banner.timer.start(int(timeout * 1000))
+        else:
+            banner.timer.stop()
+        banner.show()
+        banner.raise_()
+        self._layout()
+
+    def dismiss(self, key: str):
+        banner = self._banners.get(key)
+        if banner is not None:
+            banner.close()
+
+    def ask(self, dialog: QDialog) -> asyncio.Future:
+        """Show a dialog without a nested event loop; the future resolves to its result code."""
+        future = asyncio.get_event_loop().create_future()
+
+        def finished(result: int):
+            if not future.done():
+                future.set_result(result)
+        dialog.finished.connect(finished)
+        dialog.open()
+        dialog.raise_()
+        return future
+
+    def _closed(self, key: str, banner: Banner):
+        if self._banners.get(key) is banner:
+            del self._banners[key]
+            self._layout()
+
+    def _layout(self):
+        screen = QGuiApplication.primaryScreen().availableGeometry()
+        y = screen.top() + BANNER_MARGIN
+        for banner in self._banners.values():
+            banner.move(screen.center().x() - banner.width() // 2, y)
+            y += banner.height() + BANNER_MARGIN // 2
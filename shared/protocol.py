@@ -2,10 +2,13 @@
 Protocol definitions for client-server communication.
 """
 import json
-from dataclasses import dataclass, asdict, field
-from typing import List, Dict, Optional
+from dataclasses import dataclass, asdict, field, fields
+from typing import Any, Callable, List, Dict, FrozenSet, Optional, Tuple
 from datetime import datetime
-from .constants import MessageType, SessionState
+from .constants import (
+    MessageType, SessionState, Codec, Capability,
+    PROTOCOL_VERSION, MIN_PROTOCOL_VERSION, DEFAULT_SERVER_PORT
+)
 
 @dataclass
 class Message:
@@ -13,6 +16,8 @@ class Message:
     type: str
     timestamp: str = None
     client_id: Optional[str] = None
+    seq: Optional[int] = None  # server->client sequence number, for replay after reconnect
+    msg_id: Optional[int] = None  # request id (server commands, kiosk journal uploads); ACK/NACK carry the id they answer
 
     def __post_init__(self):
         if self.timestamp is None:
@@ -33,11 +38,14 @@ class SessionMessage(Message):
     """Message for session control."""
     duration: Optional[int] = None
     state: Optional[str] = None
+    deadline: Optional[float] = None  # CLOCK: when the session ends, in the kiosk's clock (unix seconds)
 
 @dataclass
 class AllowedAppsMessage(Message):
     """Message containing allowed applications configuration."""
-    apps: List[Dict[str, str]] = field(default_factory=list)  # List of dicts with name, path, icon_path
+    # Dicts with name, path, icon_path and, for icons served by the server, icon_sha256
+    apps: List[Dict[str, str]] = field(default_factory=list)
+    apps_version: Optional[int] = None  # Kept by the server, which re-sends the list on connect only if newer
 
 @dataclass
 class ClientStatusMessage(Message):
@@ -53,9 +61,289 @@ class ErrorMessage(Message):
     error: str = ""
     details: Optional[str] = None
 
-def create_heartbeat(client_id: str) -> Message:
+@dataclass
+class JournalMessage(Message):
+    """Events a kiosk recorded while offline, uploaded in one batch."""
+    events: List[List[Any]] = field(default_factory=list)  # [kind, unix time, payload]
+
+@dataclass
+class HeartbeatMessage(Message):
+    """Heartbeat; from the server it carries a new heartbeat interval.
+
+    With CLOCK both sides stamp heartbeats for ClockSync: the server answers
+    each one from the kiosk, and a kiosk answers one that has no echo.
+    """
+    interval: Optional[int] = None  # seconds
+    sent: Optional[float] = None  # CLOCK: sender's clock when sent (unix seconds)
+    echo: Optional[float] = None  # CLOCK: sent of the last heartbeat received from the peer
+    held: Optional[float] = None  # CLOCK: seconds between receiving that one and sending this one
+
+@dataclass
+class AckMessage(Message):
+    """Kiosk's answer to a command with a msg_id: ACK if applied, NACK with the reason if not."""
+    error: Optional[str] = None
+
+@dataclass
+class TelemetryMessage(Message):
+    """Kiosk resource sample (delta against the previous one), or from the server a new sampling interval."""
+    interval: Optional[int] = None  # server: seconds between samples, 0 stops sampling
+    key: bool = False  # full table: the receiver drops the processes it had
+    cpu: Optional[float] = None  # system CPU %
+    mem: Optional[float] = None  # system memory used %
+    procs: List[List[Any]] = field(default_factory=list)  # changed [pid, cpu %, rss MB(, name if new)]
+    gone: List[int] = field(default_factory=list)  # pids no longer reported
+    overhead: Optional[float] = None  # share of a CPU the sampler itself uses
+
+@dataclass
+class ScreenMessage(Message):
+    """Server: start (fps > 0), retune or stop (fps 0) thumbnails. Kiosk: the tiles that changed."""
+    fps: Optional[float] = None  # server: frames per second
+    quality: Optional[int] = None  # server: JPEG quality, 0 for PNG
+    width: Optional[int] = None  # thumbnail width (requested / actual)
+    height: Optional[int] = None  # kiosk: thumbnail height
+    tile: Optional[int] = None  # kiosk: tile edge in pixels; tiles are numbered row by row
+    key: bool = False  # kiosk: every tile is included
+    tiles: List[List[Any]] = field(default_factory=list)  # kiosk: [index, base64 image]
+
+@dataclass
+class AssetMessage(Message):
+    """Kiosk: ask for the chunk of an asset at offset. Server: that chunk."""
+    sha256: str = ""  # content hash naming the asset
+    offset: int = 0
+    size: Optional[int] = None  # server: total size of the asset, None if the server does not have it
+    data: Optional[str] = None  # server: base64 of up to ASSET_CHUNK_SIZE bytes
+
+@dataclass
+class RedirectMessage(Message):
+    """Server: the kiosk replaces its server list with servers and reconnects to the first."""
+    servers: List[str] = field(default_factory=list)  # "host:port"
+
+def _json_encode(data: Dict[str, Any]) -> bytes:
+    return json.dumps(data, separators=(',', ':')).encode()
+
+# Codec name -> (encode, decode). Encoders must not emit b'\n', it frames messages.
+CODECS: Dict[str, Tuple[Callable[[Dict[str, Any]], bytes], Callable[[bytes], Dict[str, Any]]]] = {
+    Codec.JSON: (_json_encode, json.loads),
+}
+
+# Capabilities implemented by this codebase, advertised in our handshake
+SUPPORTED_CAPABILITIES: List[str] = [
+    Capability.APPS_VERSION, Capability.RESUME, Capability.JOURNAL, Capability.HEARTBEAT, Capability.ACK,
+    Capability.TELEMETRY, Capability.SCREEN, Capability.ASSETS, Capability.CLUSTER, Capability.CLOCK,
+]
+
+# Message fields only sent to peers that negotiated the capability
+CAPABILITY_FIELDS: Dict[str, Tuple[str, ...]] = {
+    Capability.APPS_VERSION: ('apps_version',),
+    Capability.RESUME: ('seq',),
+    Capability.ACK: ('msg_id',),
+    Capability.CLOCK: ('deadline',),
+}
+
+_SESSION_COMMANDS = frozenset({
+    MessageType.SESSION_START, MessageType.SESSION_PAUSE, MessageType.SESSION_RESUME,
+    MessageType.SESSION_EXTEND, MessageType.SESSION_END,
+})
+
+# Message type -> types of still-unsent messages it makes redundant, for coalescing
+# output to slow receivers. Only messages that fully determine the state replace others.
+SUPERSEDES: Dict[str, FrozenSet[str]] = {
+    MessageType.ALLOWED_APPS: frozenset({MessageType.ALLOWED_APPS}),
+    MessageType.SESSION_START: _SESSION_COMMANDS,
+    MessageType.SESSION_END: _SESSION_COMMANDS,
+    MessageType.SESSION_PAUSE: frozenset({MessageType.SESSION_PAUSE, MessageType.SESSION_RESUME}),
+    MessageType.SESSION_RESUME: frozenset({MessageType.SESSION_PAUSE, MessageType.SESSION_RESUME}),
+    MessageType.HEARTBEAT: frozenset({MessageType.HEARTBEAT}),
+    MessageType.TELEMETRY: frozenset({MessageType.TELEMETRY}),
+    MessageType.SCREEN: frozenset({MessageType.SCREEN}),
+    MessageType.REDIRECT: frozenset({MessageType.REDIRECT}),
+}
+
+# Heartbeat sent to peers that negotiated HEARTBEAT: an empty frame, only liveness
+HEARTBEAT_FRAME = b'{}\n'
+
+@dataclass
+class HandshakeMessage(Message):
+    """First message on a connection, sent by both sides."""
+    protocol_version: int = PROTOCOL_VERSION
+    codecs: List[str] = field(default_factory=lambda: list(CODECS))
+    capabilities: List[str] = field(default_factory=lambda: list(SUPPORTED_CAPABILITIES))
+    client_ip: Optional[str] = None
+    apps_version: Optional[int] = None  # Allowed apps list version the kiosk has cached
+    resume_token: Optional[str] = None  # client: token from the last connection; server: token for the next one
+    last_seq: Optional[int] = None  # client: last sequence number it received
+    resumed: Optional[bool] = None  # server: whether the token was accepted
+    heartbeat_interval: Optional[int] = None  # server: seconds between client heartbeats
+    servers: Optional[List[str]] = None  # server: cluster nodes ("host:port") to fail over to, this one first
+
+@dataclass(frozen=True)
+class FeatureSet:
+    """Features agreed for one connection, consulted by the encoder and decoder."""
+    version: int = MIN_PROTOCOL_VERSION
+    codec: str = Codec.JSON
+    capabilities: FrozenSet[str] = frozenset()
+
+    def supports(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+# Features of a peer that has not (yet) sent a handshake
+LEGACY_FEATURES = FeatureSet()
+
+MESSAGE_CLASSES: Dict[str, type] = {
+    MessageType.SESSION_START: SessionMessage,
+    MessageType.SESSION_PAUSE: SessionMessage,
+    MessageType.SESSION_RESUME: SessionMessage,
+    MessageType.SESSION_END: SessionMessage,
+    MessageType.SESSION_EXTEND: SessionMessage,
+    MessageType.ALLOWED_APPS: AllowedAppsMessage,
+    MessageType.CLIENT_STATUS: ClientStatusMessage,
+    MessageType.ERROR: ErrorMessage,
+    MessageType.HANDSHAKE: HandshakeMessage,
+    MessageType.JOURNAL: JournalMessage,
+    MessageType.HEARTBEAT: HeartbeatMessage,
+    MessageType.ACK: AckMessage,
+    MessageType.NACK: AckMessage,
+    MessageType.TELEMETRY: TelemetryMessage,
+    MessageType.SCREEN: ScreenMessage,
+    MessageType.ASSET_REQUEST: AssetMessage,
+    MessageType.ASSET_CHUNK: AssetMessage,
+    MessageType.REDIRECT: RedirectMessage,
+}
+
+def handshake_fields(handshake: HandshakeMessage) -> Dict[str, Any]:
+    """Version and resumption fields of a handshake, for embedding in another first message (e.g. auth)."""
+    data = {
+        'protocol_version': handshake.protocol_version,
+        'codecs': handshake.codecs,
+        'capabilities': handshake.capabilities,
+    }
+    for name in ('resume_token', 'last_seq', 'resumed'):
+        if getattr(handshake, name) is not None:
+            data[name] = getattr(handshake, name)
+    return data
+
+def parse_handshake(data: Dict[str, Any]) -> HandshakeMessage:
+    """Read the peer's first message. Legacy first lines ({'client_ip': ...}, auth) map to version 0."""
+    if 'protocol_version' not in data:
+        return HandshakeMessage(
+            type=MessageType.HANDSHAKE,
+            client_id=data.get('client_id'),
+            protocol_version=0,
+            codecs=[Codec.JSON],
+            capabilities=[],
+            client_ip=data.get('client_ip'),
+        )
+    return HandshakeMessage(
+        type=MessageType.HANDSHAKE,
+        client_id=data.get('client_id'),
+        protocol_version=int(data['protocol_version']),
+        codecs=list(data.get('codecs') or [Codec.JSON]),
+        capabilities=list(data.get('capabilities') or []),
+        client_ip=data.get('client_ip'),
+        apps_version=data.get('apps_version'),
+        resume_token=data.get('resume_token'),
+        last_seq=data.get('last_seq'),
+        resumed=data.get('resumed'),
+    )
+
+def negotiate(local: HandshakeMessage, remote: HandshakeMessage) -> FeatureSet:
+    """Agree on version, codec and capabilities. Codec preference follows the local list."""
+    version = min(local.protocol_version, remote.protocol_version)
+    codec = next(
+        (c for c in local.codecs if c in remote.codecs and c in CODECS),
+        Codec.JSON
+    )
+    return FeatureSet(
+        version=version,
+        codec=codec,
+        capabilities=frozenset(local.capabilities) & frozenset(remote.capabilities)
+    )
+
+def encode_frame(data: Dict[str, Any], features: FeatureSet = LEGACY_FEATURES) -> bytes:
+    """Encode a message dict as one frame for a peer with the given features."""
+    # The handshake goes out before features are known and is always sent whole
+    if data.get('type') != MessageType.HANDSHAKE:
+        hidden = [
+            name for capability, names in CAPABILITY_FIELDS.items()
+            if capability not in features.capabilities for name in names
+        ]
+        if hidden:
+            data = {k: v for k, v in data.items() if k not in hidden}
+    encode, _ = CODECS[features.codec]
+    return encode(data) + b'\n'
+
+def encode_message(message: Message, features: FeatureSet = LEGACY_FEATURES) -> bytes:
+    """Encode a message as one frame for a peer with the given features."""
+    return encode_frame(asdict(message), features)
+
+def decode_frame(frame: bytes, features: FeatureSet = LEGACY_FEATURES) -> Dict[str, Any]:
+    """Decode one frame (with or without its trailing newline) into a dict."""
+    _, decode = CODECS[features.codec]
+    return decode(frame)
+
+def message_from_dict(data: Dict[str, Any]) -> Message:
+    """Build the typed message for a decoded frame, ignoring fields this version does not know."""
+    cls = MESSAGE_CLASSES.get(data.get('type'), Message)
+    known = {f.name for f in fields(cls)}
+    return cls(**{k: v for k, v in data.items() if k in known})
+
+def decode_message(frame: bytes, features: FeatureSet = LEGACY_FEATURES) -> Message:
+    """Decode one frame into a typed message."""
+    return message_from_dict(decode_frame(frame, features))
+
+def create_handshake(
+    client_id: Optional[str] = None,
+    client_ip: Optional[str] = None,
+    apps_version: Optional[int] = None,
+    resume_token: Optional[str] = None,
+    last_seq: Optional[int] = None
+) -> HandshakeMessage:
+    """Create a handshake advertising this side's version, codecs and capabilities."""
+    return HandshakeMessage(
+        type=MessageType.HANDSHAKE,
+        client_id=client_id,
+        client_ip=client_ip,
+        apps_version=apps_version,
+        resume_token=resume_token,
+        last_seq=last_seq
+    )
+
+def create_heartbeat(client_id: str, interval: Optional[int] = None) -> HeartbeatMessage:
     """Create a heartbeat message."""
-    return Message(type=MessageType.HEARTBEAT, client_id=client_id)
+    return HeartbeatMessage(type=MessageType.HEARTBEAT, client_id=client_id, interval=interval)
+
+def create_clock_heartbeat(stamp: Dict[str, float], interval: Optional[int] = None) -> Dict[str, Any]:
+    """A heartbeat frame carrying ClockSync.stamp() (a dict: sent many times a minute, kept small)."""
+    data = {'type': MessageType.HEARTBEAT}
+    if interval is not None:
+        data['interval'] = interval
+    data.update(stamp)
+    return data
+
+def create_ack(client_id: str, msg_id: int, error: Optional[str] = None) -> AckMessage:
+    """Answer a command: ACK, or NACK with the error if it could not be applied."""
+    return AckMessage(type=MessageType.NACK if error else MessageType.ACK, client_id=client_id,
+                      msg_id=msg_id, error=error)
+
+def create_telemetry_interval(client_id: str, interval: int) -> TelemetryMessage:
+    """Tell a kiosk how often to sample its resources (0 stops sampling)."""
+    return TelemetryMessage(type=MessageType.TELEMETRY, client_id=client_id, interval=interval)
+
+def create_screen_request(client_id: str, fps: float, width: Optional[int] = None,
+                          quality: Optional[int] = None) -> ScreenMessage:
+    """Ask a kiosk for screen thumbnails at fps frames per second (0 stops them)."""
+    return ScreenMessage(type=MessageType.SCREEN, client_id=client_id, fps=fps, width=width, quality=quality)
+
+def create_redirect(client_id: str, servers: List[str]) -> RedirectMessage:
+    """Move a kiosk to servers[0]; the list becomes its failover order."""
+    return RedirectMessage(type=MessageType.REDIRECT, client_id=client_id, servers=servers)
+
+def parse_address(address: str, default_port: int = DEFAULT_SERVER_PORT) -> Tuple[str, int]:
+    """Split "host" or "host:port" into (host, port)."""
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        return address, default_port
+    return host, int(port)
 
 def create_session_start(client_id: str, duration: int) -> SessionMessage:
     """Create a session start message."""
@@ -66,12 +354,25 @@ def create_session_start(client_id: str, duration: int) -> SessionMessage:
         state=SessionState.ACTIVE
     )
 
-def create_allowed_apps(client_id: str, apps: List[Dict[str, str]]) -> AllowedAppsMessage:
+def create_allowed_apps(
+    client_id: str,
+    apps: List[Dict[str, str]],
+    apps_version: Optional[int] = None
+) -> AllowedAppsMessage:
     """Create an allowed apps message."""
     return AllowedAppsMessage(
         type=MessageType.ALLOWED_APPS,
         client_id=client_id,
-        apps=apps
+        apps=apps,
+        apps_version=apps_version
+    )
+
+def create_journal(client_id: str, events: List[List[Any]]) -> JournalMessage:
+    """Create a journal upload message."""
+    return JournalMessage(
+        type=MessageType.JOURNAL,
+        client_id=client_id,
+        events=events
     )
 
 def create_client_status(
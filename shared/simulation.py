@@ -0,0 +1,256 @@
+"""
+Simulated time and network for running kiosks and servers many times faster than real time.
+"""
+import asyncio
+import random
+import selectors
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
+EPOCH = 1_800_000_000.0  # wall-clock time simulations start at, fixed so runs repeat exactly
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Never waits: the loop's clock jumps over the time it would have slept.
+
+    Except while work handed to a thread is running: then it blocks until
+    the thread reports back, without moving the clock, so the result lands
+    at the same virtual moment however long the thread took.
+    """
+
+    def __init__(self, loop: 'VirtualEventLoop'):
+        super().__init__()
+        self.loop = loop
+
+    def select(self, timeout: Optional[float] = None):
+        if timeout is None or (timeout > 0 and self.loop.executor_jobs):
+            return super().select(None)  # only another thread can wake the loop
+        if timeout > 0:
+            self.loop.now += timeout
+        return super().select(0)
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """An asyncio event loop whose clock is simulated.
+
+    Whenever every task is waiting, the clock jumps straight to the next
+    timer, so ``asyncio.sleep``, ``wait_for`` timeouts and ``call_later``
+    cost no real time, and a day of heartbeats and session deadlines runs as
+    fast as the callbacks themselves. Code under test takes its clocks from
+    ``time`` (monotonic) and ``wall`` instead of the time module; the
+    server's ClientManager, SessionScheduler and ClockSync all accept them.
+
+    Work handed to threads (``run_in_executor``) takes no virtual time: the
+    clock stands still until it is done. So runs repeat exactly as long as
+    nothing else depends on real time.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.executor_jobs = 0  # run_in_executor calls not finished yet
+        super().__init__(_VirtualSelector(self))
+
+    def time(self) -> float:
+        return self.now
+
+    def run_in_executor(self, executor, func, *args) -> asyncio.Future:
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+        future.add_done_callback(self._executor_done)
+        return future
+
+    def _executor_done(self, future: asyncio.Future):
+        self.executor_jobs -= 1
+
+    def wall(self, offset: float = 0.0, drift: float = 0.0) -> Callable[[], float]:
+        """A wall clock that is offset seconds ahead of the simulation's and runs drift fast."""
+        return lambda: EPOCH + offset + self.now * (1 + drift)
+
+class MemoryTransport(asyncio.Transport):
+    """One end of an in-memory connection made by a Network.
+
+    Bytes arrive at the other end after the network's delay, in order (what
+    arrives at the same moment is delivered together), and are handed to a
+    BufferedProtocol through ``get_buffer`` the way the event loop's own
+    transports do. Writes never block.
+    """
+
+    def __init__(self, network: 'Network', protocol: asyncio.BaseProtocol, extra: Dict[str, Any]):
+        super().__init__(extra)
+        self.network = network
+        self.peer: Optional['MemoryTransport'] = None
+        self._protocol = protocol
+        self._closing = False
+        self._lost = False
+        self._in_flight: Deque[Tuple[float, Callable[[Any], None], Any]] = deque()  # (arrival, callback, argument)
+        self._delivery: Optional[asyncio.TimerHandle] = None
+
+    def get_protocol(self) -> asyncio.BaseProtocol:
+        return self._protocol
+
+    def set_protocol(self, protocol: asyncio.BaseProtocol):
+        self._protocol = protocol
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def set_write_buffer_limits(self, high: Optional[int] = None, low: Optional[int] = None):
+        pass
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+    def write(self, data: bytes):
+        if self._closing or not data:
+            return
+        self.network.bytes_sent += len(data)
+        self._send(self.peer._received, bytes(data))
+
+    def can_write_eof(self) -> bool:
+        return False
+
+    def close(self):
+        """Close once what was written has arrived; the peer sees an orderly end."""
+        if self._closing:
+            return
+        self._closing = True
+        self._send(self.peer._peer_closed, None)
+        self.network.loop.call_soon(self._connection_lost, None)
+
+    def abort(self):
+        """Drop the connection now; the peer sees a reset."""
+        if self._lost:
+            return
+        self._closing = True
+        self.network.loop.call_later(self.network.delay(), self.peer._peer_closed, ConnectionResetError())
+        self._connection_lost(None)
+
+    def _send(self, callback: Callable[[Any], None], argument: Any):
+        # One timer per transport: the loop does not keep timers due at the same moment in order
+        arrival = self.network.loop.time() + self.network.delay()
+        if self._in_flight:
+            arrival = max(arrival, self._in_flight[-1][0])  # later bytes do not overtake earlier ones
+        self._in_flight.append((arrival, callback, argument))
+        if self._delivery is None:
+            self._delivery = self.network.loop.call_at(arrival, self._deliver)
+
+    def _deliver(self):
+        in_flight = self._in_flight
+        now = self.network.loop.time()
+        while in_flight and in_flight[0][0] <= now:
+            _, callback, argument = in_flight.popleft()
+            callback(argument)
+        self._delivery = self.network.loop.call_at(in_flight[0][0], self._deliver) if in_flight else None
+
+    def _received(self, data: bytes):
+        if self._lost:
+            return
+        protocol = self._protocol
+        if not isinstance(protocol, asyncio.BufferedProtocol):
+            protocol.data_received(data)
+            return
+        view = memoryview(data)
+        while view:
+            buffer = protocol.get_buffer(len(view))
+            size = min(len(buffer), len(view))
+            buffer[:size] = view[:size]
+            protocol.buffer_updated(size)
+            view = view[size:]
+
+    def _peer_closed(self, exc: Optional[Exception]):
+        if self._lost:
+            return
+        if exc is None and hasattr(self._protocol, 'eof_received'):
+            self._protocol.eof_received()
+        self._closing = True
+        self._connection_lost(exc)
+
+    def _connection_lost(self, exc: Optional[Exception]):
+        if self._lost:
+            return
+        self._lost = True
+        self.network.disconnected(self)
+        self._protocol.connection_lost(exc)
+
+class Network:
+    """In-memory TCP between protocols on a VirtualEventLoop.
+
+    Servers ``listen`` on an address with a protocol factory (e.g.
+    ClientManager.make_protocol); clients ``connect`` (or
+    ``open_connection`` for asyncio streams). Every message takes
+    ``latency`` plus an exponentially distributed share of ``jitter``
+    seconds, drawn from a seeded generator so runs repeat. ``set_down``
+    takes an address off the network, resetting its connections, as when
+    a server restarts.
+    """
+
+    def __init__(self, loop: VirtualEventLoop, latency: float = 0.001, jitter: float = 0.0, seed: int = 0):
+        self.loop = loop
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.bytes_sent = 0
+        self.connections = 0  # accepted so far
+        self._listeners: Dict[Tuple[str, int], Callable[[], asyncio.BaseProtocol]] = {}
+        self._down: Set[Tuple[str, int]] = set()
+        self._open: Dict[Tuple[str, int], Dict[MemoryTransport, None]] = {}  # ordered, so resets repeat too
+        self._ports = 40000
+
+    def delay(self) -> float:
+        if self.jitter:
+            return self.latency + self.random.expovariate(1 / self.jitter)
+        return self.latency
+
+    def listen(self, address: Tuple[str, int], protocol_factory: Callable[[], asyncio.BaseProtocol]):
+        self._listeners[address] = protocol_factory
+
+    def set_down(self, address: Tuple[str, int], down: bool = True):
+        """Refuse connections to address (resetting the open ones), or accept them again."""
+        if not down:
+            self._down.discard(address)
+            return
+        self._down.add(address)
+        for transport in list(self._open.get(address, ())):
+            transport.abort()
+
+    async def connect(self, address: Tuple[str, int], protocol_factory: Callable[[], asyncio.BaseProtocol],
+                      client_ip: str = '10.0.0.1') -> Tuple[MemoryTransport, asyncio.BaseProtocol]:
+        """Connect to a listening address after one round trip; ConnectionRefusedError if it is not up."""
+        await asyncio.sleep(self.delay() + self.delay())
+        factory = self._listeners.get(address)
+        if factory is None or address in self._down:
+            raise ConnectionRefusedError(f"{address[0]}:{address[1]} refused the connection")
+        self._ports += 1
+        client_address = (client_ip, self._ports)
+        server_protocol, client_protocol = factory(), protocol_factory()
+        server = MemoryTransport(self, server_protocol, {'peername': client_address, 'sockname': address})
+        client = MemoryTransport(self, client_protocol, {'peername': address, 'sockname': client_address})
+        server.peer, client.peer = client, server
+        self._open.setdefault(address, {})[server] = None
+        self.connections += 1
+        server_protocol.connection_made(server)
+        client_protocol.connection_made(client)
+        return client, client_protocol
+
+    async def open_connection(self, host: str, port: int,
+                              client_ip: str = '10.0.0.1') -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Like asyncio.open_connection, over this network."""
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(loop=loop)
+        transport, protocol = await self.connect((host, port), lambda: asyncio.StreamReaderProtocol(reader),
+                                                 client_ip)
+        return reader, asyncio.StreamWriter(transport, protocol, reader, loop)
+
+    def disconnected(self, transport: MemoryTransport):
+        address = transport.get_extra_info('sockname')
+        transports = self._open.get(address)
+        if transports is not None:
+            transports.pop(transport, None)
+
+def run(main: Callable[[], Any]) -> Any:
+    """Run the coroutine main() on a fresh VirtualEventLoop and return its result."""
+    loop = VirtualEventLoop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(main())
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -0,0 +1,79 @@
+"""
+Delta encoding of kiosk resource samples: the kiosk side encodes, the server side applies.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+KEYFRAME_EVERY = 30  # samples between full tables
+
+# pid -> (name, cpu %, rss MB); values are rounded so noise does not count as a change
+ProcessTable = Dict[int, Tuple[str, int, int]]
+
+class TelemetryEncoder:
+    """Turns full process tables into the fields of a TelemetryMessage.
+
+    Only rows that changed since the previous sample are sent, names only
+    the first time a pid is sent, plus the pids that dropped out. Every
+    KEYFRAME_EVERY samples, and after ``reset`` (call it on reconnect), the
+    whole table is sent so the receiver can start over.
+    """
+
+    def __init__(self, keyframe_every: int = KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self._sent: Dict[int, Tuple[int, int]] = {}
+        self._count = 0
+
+    def reset(self):
+        self._sent = {}
+        self._count = 0
+
+    def encode(self, cpu: float, memory: float, processes: ProcessTable,
+               overhead: Optional[float] = None) -> Dict[str, Any]:
+        key = self._count % self.keyframe_every == 0
+        sent = {} if key else self._sent
+        rows: List[List[Any]] = []
+        for pid, (name, cpu_percent, rss) in processes.items():
+            previous = sent.get(pid)
+            if previous is None:
+                rows.append([pid, cpu_percent, rss, name])
+            elif previous != (cpu_percent, rss):
+                rows.append([pid, cpu_percent, rss])
+        gone = [pid for pid in sent if pid not in processes]
+        self._sent = {pid: (cpu_percent, rss) for pid, (_, cpu_percent, rss) in processes.items()}
+        self._count += 1
+        return {'key': key, 'cpu': round(cpu, 1), 'mem': round(memory, 1), 'procs': rows, 'gone': gone,
+                'overhead': round(overhead, 4) if overhead is not None else None}
+
+class TelemetryView:
+    """A kiosk's latest resource sample, rebuilt from the deltas it sends."""
+
+    def __init__(self):
+        self.cpu: Optional[float] = None
+        self.memory: Optional[float] = None
+        self.overhead: Optional[float] = None
+        self.processes: Dict[int, List[Any]] = {}  # pid -> [name, cpu %, rss MB]
+        self.samples = 0
+
+    def apply(self, message: Any):
+        """Apply a TelemetryMessage from the kiosk."""
+        if message.key:
+            self.processes.clear()
+        for pid in message.gone:
+            self.processes.pop(pid, None)
+        for row in message.procs:
+            pid, cpu_percent, rss = row[:3]
+            known = self.processes.get(pid)
+            name = row[3] if len(row) > 3 else (known[0] if known else None)
+            self.processes[pid] = [name, cpu_percent, rss]
+        self.cpu, self.memory, self.overhead = message.cpu, message.mem, message.overhead
+        self.samples += 1
+
+    def top(self, count: int = 5, by: str = 'cpu') -> List[Dict[str, Any]]:
+        """The count busiest processes by 'cpu' or 'rss'."""
+        column = 1 if by == 'cpu' else 2
+        ranked = sorted(self.processes.items(), key=lambda item: item[1][column], reverse=True)[:count]
+        return [{'pid': pid, 'name': name, 'cpu': cpu_percent, 'rss_mb': rss}
+                for pid, (name, cpu_percent, rss) in ranked]
+
+    def to_dict(self, count: int = 5) -> Dict[str, Any]:
+        return {'cpu': self.cpu, 'memory': self.memory, 'overhead': self.overhead,
+                'top_cpu': self.top(count, 'cpu'), 'top_memory': self.top(count, 'rss')}
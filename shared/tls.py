@@ -0,0 +1,84 @@
+"""
+Optional TLS for kiosk connections: server contexts issuing session tickets,
+client contexts with session reuse and certificate pinning.
+"""
+import hashlib
+import logging
+import ssl
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def server_context(certfile: str, keyfile: Optional[str] = None) -> ssl.SSLContext:
+    """TLS context for the server, issuing session tickets so reconnects can skip the full handshake.
+
+    Ticket keys are OpenSSL's own, random per process: a kiosk that lands on
+    another worker, or reconnects after a restart, pays one full handshake.
+    Its session still carries over through the resumption token, which every
+    worker sharing KIOSK_RESUME_SECRET accepts.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(certfile, keyfile)
+    context.num_tickets = 1  # one resumption per connection is all a kiosk needs
+    return context
+
+def certificate_fingerprint(ssl_object: Any) -> str:
+    """SHA-256 of the peer's DER certificate, hex encoded."""
+    return hashlib.sha256(ssl_object.getpeercert(binary_form=True)).hexdigest()
+
+class ClientContext(ssl.SSLContext):
+    """Client context that offers the previous session back and checks pinned certificates.
+
+    asyncio has no way to pass a session to a new connection, so the context
+    remembers the last one and hands it to every SSLObject it creates.
+    """
+    session: Optional[ssl.SSLSession] = None
+    pins: frozenset = frozenset()
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session=session or self.session)
+
+    def verify(self, ssl_object: Any):
+        """Raise if the server's certificate is not one of the pinned ones."""
+        if not self.pins:
+            return
+        fingerprint = certificate_fingerprint(ssl_object)
+        if fingerprint not in self.pins:
+            raise ssl.SSLCertVerificationError(f"Server certificate {fingerprint} does not match the pinned certificate")
+
+    def remember(self, ssl_object: Any):
+        """Keep the connection's session (with its ticket) for the next connect.
+
+        TLS 1.3 tickets arrive after the handshake, so call this once the
+        first message from the server has been read.
+        """
+        self.session = ssl_object.session
+        if ssl_object.session_reused:
+            logger.info("TLS session resumed")
+
+def client_context(config: Optional[Dict[str, Any]]) -> Optional[ClientContext]:
+    """TLS context from the 'tls' section of a client config, or None for plain TCP.
+
+    Keys: enabled, pin_sha256 (fingerprint or list of them; replaces CA
+    verification, for self-signed server certificates), ca_file.
+    """
+    if not config or not config.get('enabled', True):
+        return None
+    context = ClientContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    pins = config.get('pin_sha256')
+    if pins:
+        if isinstance(pins, str):
+            pins = [pins]
+        context.pins = frozenset(_normalize_fingerprint(pin) for pin in pins)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif config.get('ca_file'):
+        context.load_verify_locations(config['ca_file'])
+    else:
+        context.load_default_certs()
+    return context
+
+def _normalize_fingerprint(pin: str) -> str:
+    return pin.replace(':', '').lower()
@@ -0,0 +1,186 @@
+"""
+Buffered asyncio transport for newline-framed messages.
+"""
+import asyncio
+import json
+import logging
+import time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .constants import Codec
+from .protocol import SUPERSEDES, FeatureSet, LEGACY_FEATURES, Message, decode_frame, encode_frame
+
+logger = logging.getLogger(__name__)
+
+READ_BUFFER_SIZE = 64 * 1024
+MAX_FRAME_SIZE = 1024 * 1024  # a peer sending a longer line is disconnected
+# Output is held back (and coalesced) above the high watermark until the
+# socket buffer drains below the low one; past the limit the peer is dropped.
+WRITE_HIGH_WATER = 64 * 1024
+WRITE_LOW_WATER = 16 * 1024
+MAX_OUTPUT_BUFFER = 1024 * 1024
+
+def decode_frames(chunk: bytes, features: FeatureSet = LEGACY_FEATURES) -> List[Dict[str, Any]]:
+    """Decode a run of complete frames (newline-separated, without the final newline).
+
+    For the JSON codec the whole run is parsed with a single json.loads call by
+    turning it into a JSON array. That copies the run twice (replace, then
+    the brackets), which is still about twice as fast as parsing each frame
+    in place with raw_decode. Anything that does not fit that fast path
+    (blank lines, a bad frame) falls back to decoding frame by frame.
+    """
+    if features.codec == Codec.JSON:
+        try:
+            return json.loads(b'[' + chunk.replace(b'\n', b',') + b']')
+        except ValueError:
+            pass
+    frames = []
+    for line in chunk.split(b'\n'):
+        if not line.strip():
+            continue
+        try:
+            frames.append(decode_frame(line, features))
+        except ValueError as e:
+            logger.error(f"Dropping undecodable frame: {e}")
+    return frames
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    """Receives into one reusable buffer and hands over every complete frame per read.
+
+    The event loop reads straight into the protocol's bytearray, so a read
+    allocates nothing and there is no per-line await. The last newline is
+    found by offset in that buffer; a read that completes frames copies them
+    out once as bytes, decodes them in one batch (see ``decode_frames``) and
+    passes them to ``on_frames``. The partial tail is moved to the front of
+    the buffer for the next read.
+
+    On the way out, once the transport holds more than the high watermark
+    the protocol stops writing and keeps frames in a backlog, where a newer
+    message replaces the queued ones it supersedes (latest app list, latest
+    session state). The backlog is written when the transport drains. A peer
+    whose buffered output exceeds ``max_output`` is aborted, so a kiosk that
+    stops reading cannot grow server memory without bound.
+    """
+
+    def __init__(
+        self,
+        on_frames: Callable[['FrameProtocol', List[Dict[str, Any]]], None],
+        on_close: Optional[Callable[['FrameProtocol', Optional[Exception]], None]] = None,
+        features: FeatureSet = LEGACY_FEATURES,
+        buffer_size: int = READ_BUFFER_SIZE,
+        on_superseded: Optional[Callable[['FrameProtocol', Dict[str, Any]], None]] = None,
+        max_output: int = MAX_OUTPUT_BUFFER,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.on_frames = on_frames
+        self.on_close = on_close
+        self.on_superseded = on_superseded  # called with each queued frame dropped by coalescing
+        self.features = features
+        self.max_output = max_output
+        self.clock = clock  # the owner's, so it can compare paused_since with its own now
+        self.transport: Optional[asyncio.Transport] = None
+        self.context: Any = None  # owner's per-connection state
+        self.paused_since: Optional[float] = None  # clock time output was last held back
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._used = 0
+        self._backlog: List[Tuple[Optional[str], bytes, Dict[str, Any]]] = []
+        self._backlog_bytes = 0
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(WRITE_HIGH_WATER, WRITE_LOW_WATER)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if len(self._buffer) - self._used < 4096:
+            if len(self._buffer) >= MAX_FRAME_SIZE:
+                # No newline in a full buffer; refuse to grow without bound
+                logger.error("Frame too large; closing connection")
+                self._used = 0
+                self.transport.close()
+            else:
+                # Views handed out earlier may still be alive, so copy instead of resizing
+                buffer = bytearray(2 * len(self._buffer))
+                buffer[:self._used] = self._view[:self._used]
+                self._buffer, self._view = buffer, memoryview(buffer)
+        return self._view[self._used:]
+
+    def buffer_updated(self, nbytes: int):
+        start = self._used
+        self._used += nbytes
+        end = self._buffer.rfind(b'\n', start, self._used)
+        if end < 0:
+            return
+        frames = decode_frames(bytes(self._view[:end]), self.features)
+        rest = self._used - end - 1
+        if rest:
+            self._view[:rest] = self._view[end + 1:self._used]
+        self._used = rest
+        if frames:
+            self.on_frames(self, frames)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self._backlog.clear()
+        self._backlog_bytes = 0
+        if self.on_close is not None:
+            self.on_close(self, exc)
+
+    def pause_writing(self):
+        self.paused_since = self.clock()
+
+    def resume_writing(self):
+        self.paused_since = None
+        backlog, self._backlog, self._backlog_bytes = self._backlog, [], 0
+        for i, (_, frame, _) in enumerate(backlog):
+            self.transport.write(frame)
+            if self.paused_since is not None:
+                # Full again; keep the rest queued
+                self._backlog = backlog[i + 1:]
+                self._backlog_bytes = sum(len(entry[1]) for entry in self._backlog)
+                return
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Output not yet handed to the network: the transport's buffer plus the backlog."""
+        if self.transport is None:
+            return 0
+        return self.transport.get_write_buffer_size() + self._backlog_bytes
+
+    def send(self, message: Message):
+        self.send_frame(asdict(message))
+
+    def send_frame(self, data: Dict[str, Any]):
+        if self.is_closing():
+            return
+        frame = encode_frame(data, self.features)
+        if self.paused_since is None:
+            self.transport.write(frame)
+            return
+        message_type = data.get('type')
+        superseded = SUPERSEDES.get(message_type)
+        if superseded and self._backlog:
+            kept = []
+            for entry in self._backlog:
+                if entry[0] in superseded:
+                    self._backlog_bytes -= len(entry[1])
+                    if self.on_superseded is not None:
+                        self.on_superseded(self, entry[2])
+                else:
+                    kept.append(entry)
+            self._backlog = kept
+        self._backlog.append((message_type, frame, data))
+        self._backlog_bytes += len(frame)
+        if self.buffered_bytes > self.max_output:
+            logger.warning(f"Peer has {self.buffered_bytes} bytes of unsent output; disconnecting")
+            self.transport.abort()
+
+    def is_closing(self) -> bool:
+        return self.transport is None or self.transport.is_closing()
+
+    def close(self):
+        if self.transport is None:
+            return
+        if self.paused_since is not None:
+            self.transport.abort()  # the peer is not reading; do not wait for the buffer to drain
+        else:
+            self.transport.close()
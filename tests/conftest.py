@@ -0,0 +1,22 @@
+"""
+Helpers shared by the tests.
+"""
+import pytest
+
+class FakeClock:
+    """A clock that only moves when the test sets ``now``."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+@pytest.fixture
+def make_clock():
+    """FakeClock itself, for tests that need several clocks or another start."""
+    return FakeClock
@@ -0,0 +1,65 @@
+"""
+Admin client list: merged changes applied in batches, self-sorting rows and proxy filters.
+"""
+import os
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtWidgets = pytest.importorskip('PySide6.QtWidgets')
+from PySide6 import QtCore
+from server.admin_model import COLUMN_OF, SORT_ROLE, ClientChanges, ClientFilters, ClientTableModel
+
+@pytest.fixture(scope='module')
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])  # shared with the widget tests
+
+def _column(model, name, role=QtCore.Qt.DisplayRole):
+    return [model.data(model.index(row, COLUMN_OF[name]), role) for row in range(model.rowCount())]
+
+def test_changes_merge_until_the_model_refreshes(app):
+    changes = ClientChanges()
+    changes.put('pc1', {'ip': '10.0.0.1', 'state': 'idle'})
+    changes.put('pc1', {'state': 'active', 'remaining_time': 3725})
+    changes.put('pc2', {'ip': '10.0.0.2'})
+    changes.put('pc2', None)
+    assert changes.drain() == {'pc1': {'ip': '10.0.0.1', 'state': 'active', 'remaining_time': 3725}, 'pc2': None}
+    assert changes.received == 4 and changes.drain() == {}
+
+def test_rows_sort_once_per_refresh_and_only_changed_cells_are_signalled(app):
+    changes = ClientChanges()
+    model = ClientTableModel(changes, refresh_rate=0)
+    signalled = []
+    model.dataChanged.connect(lambda first, last: signalled.append(
+        (first.row(), last.row(), first.column(), last.column())))
+    for number, remaining in ((1, 600), (2, 60), (3, 3600)):
+        changes.put(f'pc{number}', {'ip': f'10.0.0.{number}', 'state': 'active', 'remaining_time': remaining})
+    model.refresh()
+    model.sort(COLUMN_OF['remaining_time'])
+    assert [model.client_id(row) for row in range(3)] == ['pc2', 'pc1', 'pc3']
+    assert _column(model, 'remaining_time') == ['0:01:00', '0:10:00', '1:00:00']
+    changes.put('pc1', {'state': 'active', 'rtt': 0.012})
+    changes.put('pc3', {'rtt': 0.02})
+    model.refresh()
+    assert signalled == [(1, 2, COLUMN_OF['rtt'], COLUMN_OF['rtt'])]  # one range over both rows
+    changes.put('pc3', {'remaining_time': 5})
+    changes.put('pc2', None)
+    model.refresh()
+    assert _column(model, 'remaining_time', SORT_ROLE) == [5, 600]
+    assert model.refreshes == 3
+
+def test_filters_by_state_and_search(app):
+    changes = ClientChanges()
+    model = ClientTableModel(changes, refresh_rate=0)
+    filters = ClientFilters(model)
+    changes.put('pc1', {'ip': '10.0.0.1', 'state': 'active'})
+    changes.put('pc2', {'ip': '10.0.0.2', 'state': 'idle'})
+    changes.put('bar-pc', {'ip': '10.0.1.9', 'state': 'active'})
+    model.refresh()
+    filters.set_state('active')
+    assert filters.model.rowCount() == 2
+    filters.set_search('BAR')
+    assert filters.model.rowCount() == 1
+    filters.set_search('10.0.0.')
+    assert filters.model.rowCount() == 1
+    filters.set_state(None)
+    assert filters.model.rowCount() == 2
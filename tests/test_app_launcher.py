@@ -0,0 +1,55 @@
+"""
+AppLauncher indexes: adopting descendants, and forgetting foreign pids.
+"""
+import os
+import subprocess
+import sys
+from client.app_launcher import AppLauncher
+
+def _sleeper() -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+
+def test_descendant_window_is_adopted_and_removal_is_reported():
+    launcher = AppLauncher()
+    events = []
+    launcher.on_window_added = lambda app_name, hwnd: events.append(('added', app_name, hwnd))
+    launcher.on_window_removed = lambda app_name, hwnd: events.append(('removed', app_name, hwnd))
+    launcher.track('Game', os.getpid())
+    child = _sleeper()
+    try:
+        assert launcher.window_shown(100, child.pid) == 'Game'
+        assert launcher.window_shown(101, child.pid) == 'Game'
+        assert child.pid in launcher.tracked_pids()
+        assert launcher.window_for('Game') == 100
+        launcher.window_destroyed(100)
+        assert launcher.window_for('Game') == 101
+        launcher.window_destroyed(101)
+        assert launcher.window_for('Game') is None
+    finally:
+        child.kill()
+        child.wait()
+    assert events == [('added', 'Game', 100), ('added', 'Game', 101),
+                      ('removed', 'Game', 100), ('removed', 'Game', 101)]
+
+def test_foreign_pid_is_forgotten_with_its_last_window():
+    launcher = AppLauncher()
+    foreign = []
+    launcher.on_foreign_window = lambda hwnd, pid: foreign.append(hwnd)
+    pid = os.getppid()
+    assert launcher.window_shown(1, pid) is None
+    assert launcher.window_shown(1, pid) is None  # reported once per window
+    assert launcher.window_shown(2, pid) is None
+    assert foreign == [1, 2]
+    launcher.window_destroyed(1)
+    assert pid in launcher._foreign_pids
+    launcher.window_destroyed(2)
+    assert not launcher._foreign_pids and not launcher._foreign_hwnds
+
+def test_exited_foreign_process_is_reaped():
+    launcher = AppLauncher()
+    child = _sleeper()
+    assert launcher.window_shown(1, child.pid) is None
+    child.kill()
+    child.wait()
+    launcher.reap()
+    assert not launcher._foreign_pids and not launcher._foreign_hwnds
@@ -0,0 +1,60 @@
+"""
+Assets: the server's content-addressed store and the kiosk's resumable, verified downloads.
+"""
+import base64
+import os
+from client.asset_cache import AssetCache, AssetFetcher
+from server.asset_store import AssetStore
+from shared.constants import ASSET_CHUNK_SIZE, MessageType
+from shared.protocol import AssetMessage
+
+ICON = os.urandom(ASSET_CHUNK_SIZE * 5 + 100)
+
+def _answer(store: AssetStore, digest: str, offset: int) -> AssetMessage:
+    chunk = store.chunk(digest, offset)
+    if chunk is None:
+        return AssetMessage(type=MessageType.ASSET_CHUNK, sha256=digest, offset=offset)
+    size, data = chunk
+    return AssetMessage(type=MessageType.ASSET_CHUNK, sha256=digest, offset=offset, size=size,
+                        data=base64.b64encode(data).decode())
+
+def test_icons_are_published_once_and_served_from_memory(tmp_path):
+    icon = tmp_path / 'chrome.png'
+    icon.write_bytes(ICON)
+    store = AssetStore(str(tmp_path / 'store'))
+    apps = store.attach_icons([{'name': 'Chrome', 'icon_path': str(icon)}, {'name': 'Calc', 'icon_path': 'missing.png'}])
+    digest = apps[0]['icon_sha256']
+    assert 'icon_sha256' not in apps[1]
+    assert store.publish(str(icon)) == digest
+    assert store.chunk(digest, 0)[0] == len(ICON)
+    assert store.chunk(digest, len(ICON) - 10) == (len(ICON), ICON[-10:])
+    assert store.disk_reads == 1
+    assert store.chunk('../etc/passwd', 0) is None
+
+def test_download_resumes_after_a_disconnect_and_is_verified(tmp_path):
+    source = tmp_path / 'icon.png'
+    source.write_bytes(ICON)
+    store = AssetStore(str(tmp_path / 'store'))
+    digest = store.publish(str(source))
+    cache = AssetCache(str(tmp_path / 'cache'))
+    requests, ready = [], []
+    fetcher = AssetFetcher(cache, lambda sha, offset: requests.append((sha, offset)), on_ready=ready.append)
+    fetcher.want([digest, digest])
+    assert requests == [(digest, 0)]  # one chunk until the size is known
+    fetcher.received(_answer(store, digest, requests.pop(0)[1]))
+    assert len(requests) == 4
+    fetcher.received(_answer(store, digest, requests.pop(0)[1]))
+    requests.clear()  # the connection drops with three requests in flight
+    fetcher.restart()
+    assert requests == [(digest, 2 * ASSET_CHUNK_SIZE)]
+    while requests:
+        fetcher.received(_answer(store, digest, requests.pop(0)[1]))
+    assert ready == [digest]
+    assert open(cache.path(digest), 'rb').read() == ICON
+    assert cache.gc([]) == 1 and cache.path(digest) is None
+
+def test_corrupt_download_is_discarded(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    digest = 'a' * 64
+    assert cache.write(digest, 0, b'not it', 6) is False
+    assert cache.partial_size(digest) == 0 and cache.path(digest) is None
@@ -0,0 +1,23 @@
+"""
+BillingLedger: batched debits, and flushes that do not hold up the event loop.
+"""
+import threading
+from server.billing import BillingLedger
+
+def test_debits_and_balances_do_not_wait_for_a_flush(tmp_path):
+    ledger = BillingLedger(str(tmp_path / 'ledger.db'))
+    ledger.credit('alice', 600)
+    ledger.debit('alice', 100.5, 'pc1')
+    with ledger._write_lock:  # the disk is slow: the flush is stuck writing
+        flush = threading.Thread(target=ledger.flush)
+        flush.start()
+        flush.join(0.2)
+        assert flush.is_alive()
+        ledger.debit('alice', 50, 'pc2')
+        assert ledger.balance('alice') == 450  # the debits being written still count
+    flush.join(5)
+    assert ledger.balance('alice') == 450
+    assert ledger.flush() == 1
+    assert ledger.balance('alice') == 450  # the half second is carried over, not lost
+    ledger.close()
+    assert BillingLedger(str(tmp_path / 'ledger.db')).balance('alice') == 450
@@ -0,0 +1,39 @@
+"""
+Blocklist: rule matching, and the enforcer terminating only processes new since its last scan.
+"""
+import hashlib
+import psutil
+from client.blocklist import BlocklistEnforcer, BlocklistMatcher
+
+def test_names_patterns_and_hashes_match(tmp_path):
+    program = tmp_path / 'renamed.exe'
+    program.write_bytes(b'MZ cheat engine')
+    matcher = BlocklistMatcher(['CMD.exe', '*cheat*.exe', '', f'sha256:{hashlib.sha256(b"MZ cheat engine").hexdigest()}'])
+    assert matcher.match_name('cmd.EXE') and matcher.match_name('MyCheatTool.exe')
+    assert not matcher.match_name('chrome.exe')
+    assert matcher.match_executable(str(program))
+    assert not matcher.match_executable(str(tmp_path / 'missing.exe'))
+    assert not BlocklistMatcher([' '])
+
+def test_enforcer_looks_up_and_terminates_only_new_processes():
+    running = {1: 'explorer.exe', 2: 'chrome.exe'}
+    described, terminated, reported = [], [], []
+
+    def describe(pid, with_exe):
+        described.append(pid)
+        if pid == 4:
+            raise psutil.NoSuchProcess(pid)  # exited before it was looked at
+        return running[pid], None
+
+    enforcer = BlocklistEnforcer(BlocklistMatcher(['cmd.exe']), list_pids=lambda: list(running),
+                                 describe=describe, terminate=terminated.append,
+                                 on_blocked=lambda pid, name: reported.append(name))
+    assert enforcer.scan() == []
+    running.update({3: 'cmd.exe', 4: 'short.exe'})
+    assert enforcer.scan() == [(3, 'cmd.exe')]
+    assert terminated == [3] and reported == ['cmd.exe']
+    assert sorted(described) == [1, 2, 3, 4]  # each pid once
+    assert enforcer.name_of(2) == 'chrome.exe'
+    del running[2]
+    enforcer.scan()
+    assert enforcer.name_of(2) is None
@@ -0,0 +1,43 @@
+"""
+ClientDirectory: the client -> worker map every worker keeps, and commands forwarded to the owner.
+"""
+import queue
+from server.client_directory import ClientDirectory
+
+def _workers(count=2):
+    inboxes = [queue.Queue() for _ in range(count)]
+    return [ClientDirectory(worker_id, inboxes) for worker_id in range(count)], inboxes
+
+def _deliver(directory, inbox):
+    while not inbox.empty():
+        directory._apply(inbox.get())
+
+def test_registrations_replicate_and_commands_reach_the_owner():
+    (first, second), inboxes = _workers()
+    moved = []
+    second.on_registered_elsewhere = lambda client_id, worker_id: moved.append((client_id, worker_id))
+    first.register('pc1')
+    _deliver(second, inboxes[1])
+    assert second.owner('pc1') == 0 and moved == [('pc1', 0)]
+    commands = []
+    first.on_command = lambda client_id, data, reply_to: commands.append((client_id, data, reply_to))
+    assert second.forward('pc1', {'type': 'session_end'}, reply_to=(1, 7))
+    assert not first.forward('pc1', {'type': 'session_end'})  # its own client: handled locally
+    _deliver(first, inboxes[0])
+    assert commands == [('pc1', {'type': 'session_end'}, (1, 7))]
+    results = []
+    second.on_result = lambda client_id, result: results.append(result)
+    first.reply((1, 7), 'pc1', {'status': 'acked'})
+    _deliver(second, inboxes[1])
+    assert results == [{'status': 'acked', 'request_id': 7}]
+
+def test_a_stale_unregister_does_not_drop_the_new_owner():
+    (first, second, third), inboxes = _workers(3)
+    first.register('pc1')
+    second.register('pc1')  # the kiosk reconnected to another worker
+    _deliver(third, inboxes[2])
+    assert third.owner('pc1') == 1
+    first.owners['pc1'] = 0
+    first.unregister('pc1')  # the old connection goes away afterwards
+    _deliver(third, inboxes[2])
+    assert third.owner('pc1') == 1
@@ -0,0 +1,43 @@
+"""
+ClientRegistry: indexed queries over connected kiosks, and the change stream for the admin view.
+"""
+from server.client_registry import ClientConnection, ClientRegistry
+from shared.constants import SessionState
+
+def _registry():
+    registry = ClientRegistry()
+    for index, (state, apps) in enumerate([(SessionState.ACTIVE, ['Chrome', 'Word']),
+                                           (SessionState.ACTIVE, ['Chrome']),
+                                           (SessionState.INACTIVE, [])]):
+        conn = ClientConnection(f'pc{index}', f'10.0.0.{index}', None)
+        conn.state, conn.active_apps = state, tuple(apps)
+        registry.add(conn)
+    return registry
+
+def _ids(clients):
+    return sorted(conn.client_id for conn in clients)
+
+def test_queries_intersect_the_indexes():
+    registry = _registry()
+    assert _ids(registry.query(state=SessionState.ACTIVE)) == ['pc0', 'pc1']
+    assert _ids(registry.query(state=SessionState.ACTIVE, app='Word')) == ['pc0']
+    assert _ids(registry.query(ip='10.0.0.2')) == ['pc2']
+    assert registry.query(state=SessionState.PAUSED) == []
+    assert len(registry.query()) == 3
+    assert registry['pc0'].active_apps is not registry['pc1'].active_apps
+    assert registry['pc1'].active_apps is registry._intern_apps(['Chrome'])  # shared tuple
+
+def test_updates_move_clients_between_indexes_and_are_streamed():
+    registry = _registry()
+    changes = []
+    registry.watch(lambda client_id, fields: changes.append((client_id, fields)))
+    assert len(changes) == 3  # the current table first
+    del changes[:]
+    registry.update(registry['pc0'], state=SessionState.PAUSED, active_apps=['Word'], remaining_time=60)
+    assert changes == [('pc0', {'state': SessionState.PAUSED, 'active_apps': ('Word',), 'remaining_time': 60})]
+    assert _ids(registry.query(app='Chrome')) == ['pc1']
+    assert _ids(registry.query(state=SessionState.PAUSED, app='Word')) == ['pc0']
+    registry.remove('pc0')
+    assert changes[-1] == ('pc0', None)
+    assert registry.query(app='Word') == [] and registry.count_by_state() == {
+        SessionState.ACTIVE: 1, SessionState.INACTIVE: 1}
@@ -0,0 +1,56 @@
+"""
+ClockSync offsets from heartbeat timestamps, and the kiosk's countdown to the server's deadline.
+"""
+import pytest
+from client.session_countdown import SessionCountdown
+from shared.clock_sync import ClockSync
+
+def test_offset_comes_from_the_least_delayed_exchange(make_clock):
+    server_clock = make_clock()
+    kiosk_clock = make_clock(server_clock.now + 5)  # the kiosk's clock is five seconds ahead
+    server, kiosk = ClockSync(server_clock), ClockSync(kiosk_clock)
+
+    def advance(seconds):
+        server_clock.now += seconds
+        kiosk_clock.now += seconds
+
+    def exchange(down, up, held=0.01):
+        stamp = server.stamp()
+        advance(down)
+        kiosk.received(**stamp)
+        advance(held)
+        stamp = kiosk.stamp()
+        advance(up)
+        return server.received(**stamp)
+
+    assert exchange(0.02, 0.02)
+    assert kiosk.samples == 0  # the server's first heartbeat had nothing to echo
+    assert server.offset == pytest.approx(5) and server.rtt == pytest.approx(0.04)
+    assert exchange(0.02, 1.0)  # queued on the way back
+    assert server.offset == pytest.approx(5)  # the earlier, shorter exchange still decides
+    assert server.rtt > 0.04 and server.jitter > 0
+    assert server.to_peer(10) == pytest.approx(15)
+    assert server.to_dict()['samples'] == 2
+
+def test_countdown_follows_the_deadline_and_survives_a_clock_change(make_clock):
+    monotonic, wall = make_clock(50.0), make_clock(1000.0)
+    countdown = SessionCountdown(monotonic, wall)
+    countdown.start(60, deadline=1060.0)
+    monotonic.now += 2.6
+    wall.now += 2.6
+    assert countdown.tick() == 57  # a late tick does not add up
+    wall.now -= 3600  # the wall clock was set back an hour
+    monotonic.now += 1
+    wall.now += 1
+    assert countdown.tick() == 56
+    countdown.pause()
+    monotonic.now += 100
+    assert countdown.time_left() == 56
+    countdown.extend(10)
+    assert countdown.tick() == 66 and not countdown.expired
+
+def test_countdown_without_a_deadline_counts_ticks(make_clock):
+    countdown = SessionCountdown(make_clock(), make_clock())
+    countdown.start(1)
+    assert [countdown.tick(), countdown.tick()] == [1, 0]
+    assert countdown.expired
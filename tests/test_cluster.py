@@ -0,0 +1,106 @@
+"""
+Cluster: replicated session log between server nodes, and load-based redirects.
+"""
+import asyncio
+import json
+import socket
+import pytest
+from server.billing import BillingLedger
+from server.cluster import Cluster
+from shared.constants import SessionState
+
+SECRET = b'cluster secret'
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def _until(condition, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_entries_apply_once_and_late_session_changes_lose():
+    cluster = Cluster('a', 'a:5000')
+    changed = []
+    cluster.on_session = lambda client_id, holder: changed.append((client_id, holder))
+    active = {'state': SessionState.ACTIVE, 'remaining': 600}
+    assert cluster.apply(['b/0/1', 1, 'session', {'client_id': 'pc1', 'at': 10.0, 'session': active}])
+    assert not cluster.apply(['b/0/1', 1, 'session', {'client_id': 'pc1', 'at': 10.0, 'session': active}])
+    cluster.apply(['c/0/1', 1, 'session', {'client_id': 'pc1', 'at': 5.0, 'session': None}])  # older
+    assert cluster.sessions['pc1']['holder'] == 'b/0/1'
+    assert changed == [('pc1', 'b/0/1')]
+    cluster.publish_session('pc1', None)
+    assert cluster.session('pc1') is None and changed == [('pc1', 'b/0/1')]  # own changes are not reported
+
+def test_an_overloaded_node_redirects_to_the_least_loaded():
+    cluster = Cluster('a', 'a:5000')
+    held = [100]
+    cluster.load = lambda: held[0]
+    cluster.nodes = {'b': ['b:5000', 20], 'c': ['c:5000', 0]}
+    assert cluster.servers() == ['a:5000', 'c:5000', 'b:5000']
+    targets = cluster.rebalance(held=100)
+    assert len(targets) == 60  # c and b each filled up to the mean of 40
+    assert targets[:20] == ['c:5000'] * 20 and cluster.nodes == {'b': ['b:5000', 40], 'c': ['c:5000', 40]}
+    held[0] -= len(targets)  # the redirected kiosks leave before the next pass
+    assert cluster.rebalance(held=held[0]) == []
+
+def test_nodes_link_up_and_catch_up_on_the_log():
+    async def main():
+        port = _free_port()
+        first = Cluster('a', 'a:5000', listen=('127.0.0.1', port), secret=SECRET)
+        first.publish_session('pc1', {'state': SessionState.ACTIVE, 'remaining': 600})  # before the link
+        second = Cluster('b', 'b:5000', peers=[('127.0.0.1', port)], secret=SECRET)
+        second.load = lambda: 7
+        tasks = [asyncio.create_task(first.run())]
+        await asyncio.sleep(0.05)  # listening, so the first connection attempt succeeds
+        tasks.append(asyncio.create_task(second.run()))
+        try:
+            await _until(lambda: 'pc1' in second.sessions and first.nodes)
+            assert first.nodes == {'b': ['b:5000', 7]}
+            assert 0 < second.session('pc1')['remaining'] <= 600
+            second.publish_session('pc2', None)
+            await _until(lambda: 'pc2' in first.sessions)
+            assert first.sessions['pc2']['holder'] == second.origin
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    asyncio.run(main())
+
+def test_entries_from_a_peer_without_the_secret_are_dropped(tmp_path):
+    async def main():
+        port = _free_port()
+        ledger = BillingLedger(str(tmp_path / 'ledger.db'))
+        node = Cluster('a', 'a:5000', ledger=ledger, listen=('127.0.0.1', port), secret=SECRET)
+        task = asyncio.create_task(node.run())
+        await asyncio.sleep(0.05)
+        entry = ['evil/0/1', 1, 'ledger', {'rows': [[0.0, 'mallory', None, 10 ** 6]]}]
+        hello = {'type': 'hello', 'node': 'evil', 'address': 'evil:5000'}
+        # Unsealed, then after a challenge with a forged seal
+        for frames in ([hello, {'type': 'entries', 'entries': [entry]}],
+                       [{'type': 'challenge', 'nonce': '00' * 16},
+                        {'type': 'sealed', 'body': json.dumps(hello), 'mac': '00' * 32},
+                        {'type': 'entries', 'entries': [entry]}]):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b''.join(json.dumps(frame).encode() + b'\n' for frame in frames))
+            await asyncio.wait_for(reader.read(), 5)  # the node hangs up
+            writer.close()
+        wrong = Cluster('b', 'b:5000', peers=[('127.0.0.1', port)], secret=b'guessed')
+        wrong.append('ledger', {'rows': [[0.0, 'mallory', None, 10 ** 6]]})
+        other = asyncio.create_task(wrong.run())
+        await asyncio.sleep(0.5)
+        assert node.applied == {} and node.nodes == {} and wrong.nodes == {}
+        assert ledger.balance('mallory') == 0
+        for running in (task, other):
+            running.cancel()
+        await asyncio.gather(task, other, return_exceptions=True)
+        ledger.close()
+    asyncio.run(main())
+
+def test_linking_without_a_secret_is_refused():
+    with pytest.raises(ValueError):
+        asyncio.run(Cluster('a', 'a:5000', listen=('127.0.0.1', 0)).run())
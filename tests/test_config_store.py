@@ -0,0 +1,36 @@
+"""
+AllowedAppsStore: atomic, coalesced writes from the background thread.
+"""
+import json
+import os
+from client import config_store
+from client.config_store import AllowedAppsStore
+
+APPS = [{'name': 'Chrome', 'path': 'C:/chrome.exe'}]
+
+def test_save_writes_and_load_reads_back(tmp_path):
+    path = str(tmp_path / 'apps.json')
+    store = AllowedAppsStore(path)
+    assert store.save(APPS, version=3)
+    assert store.flush(5)
+    store.close()
+    assert json.loads(open(path, 'rb').read()) == {'version': 3, 'apps': APPS}
+    again = AllowedAppsStore(path)
+    assert again.load() == (3, APPS)
+    assert not again.save(APPS, version=3)  # same content as on disk
+    again.close()
+    assert not os.path.exists(path + '.tmp')
+
+def test_failed_write_stays_pending_until_it_succeeds(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_store, 'WRITE_RETRY_DELAY', 0.05)
+    path = tmp_path / 'apps.json'
+    path.mkdir()  # replacing a directory with a file fails
+    store = AllowedAppsStore(str(path))
+    store.save(APPS, version=1)
+    assert not store.flush(5)
+    assert isinstance(store.error, OSError)
+    path.rmdir()
+    assert store.flush(5)  # the retry wrote it
+    assert store.error is None
+    store.close()
+    assert json.loads(path.read_bytes())['version'] == 1
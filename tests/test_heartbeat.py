@@ -0,0 +1,48 @@
+"""
+Heartbeats: the interval the server picks for its fleet, and kiosks skipping them while other traffic flows.
+"""
+import asyncio
+from client.kiosk_connection import KioskConnection
+from client.server_list import ServerList
+from server.client_manager import HEARTBEAT_LAG_THRESHOLD, heartbeat_interval_for
+from shared.constants import HEARTBEAT_FLEET_STEP, HEARTBEAT_INTERVAL, MAX_HEARTBEAT_INTERVAL, Capability
+from shared.protocol import HEARTBEAT_FRAME, create_handshake, negotiate
+from shared.simulation import run
+
+class FakeWriter:
+    def __init__(self):
+        self.sent = []
+
+    def write(self, data: bytes):
+        self.sent.append(data)
+
+    def is_closing(self) -> bool:
+        return False
+
+    async def drain(self):
+        pass
+
+def test_interval_grows_with_the_fleet_and_under_lag():
+    assert heartbeat_interval_for(1) == HEARTBEAT_INTERVAL
+    assert heartbeat_interval_for(HEARTBEAT_FLEET_STEP) == 2 * HEARTBEAT_INTERVAL
+    assert heartbeat_interval_for(1, lag=HEARTBEAT_LAG_THRESHOLD * 2) == 2 * HEARTBEAT_INTERVAL
+    assert heartbeat_interval_for(100 * HEARTBEAT_FLEET_STEP) == MAX_HEARTBEAT_INTERVAL
+
+def test_kiosk_sends_one_only_after_a_quiet_interval(clock):
+    async def main():
+        kiosk = KioskConnection(ServerList(['a']), '10.1.0.1', monotonic=clock)
+        server = create_handshake('server')
+        server.capabilities = [Capability.HEARTBEAT]
+        kiosk.features = negotiate(create_handshake('pc1'), server)
+        kiosk.connected = True
+        kiosk.writer = writer = FakeWriter()
+        kiosk.write(b'status\n')
+        clock.now += HEARTBEAT_INTERVAL - 1
+        kiosk._send_heartbeat()
+        assert writer.sent == [b'status\n']  # the status proved the kiosk alive
+        clock.now += HEARTBEAT_INTERVAL
+        kiosk._send_heartbeat()
+        assert writer.sent == [b'status\n', HEARTBEAT_FRAME]
+        kiosk.heartbeat_timer.cancel()
+        await asyncio.sleep(0)
+    run(main)
@@ -0,0 +1,133 @@
+"""
+KioskConnection against the real ClientManager, in virtual time over an in-memory network.
+"""
+import asyncio
+from client.kiosk_connection import KioskConnection
+from client.server_list import ServerList
+from server.client_manager import SLOW_CLIENT_TIMEOUT, ClientManager
+from server.resumption import RESUME_WINDOW, ResumptionTokens
+from shared.constants import MAX_RECONNECT_DELAY, UNREACHABLE_AFTER, Capability, MessageType
+from shared.protocol import SessionState
+from shared.simulation import Network, run
+
+SERVER = ('10.0.0.1', 5000)
+KIOSK_IP = '10.1.0.1'
+
+def _fleet_of_one(loop):
+    network = Network(loop, latency=0.002)
+    manager = ClientManager(tokens=ResumptionTokens(bytes(32), clock=loop.wall()),
+                            clock=loop.time, wall_clock=loop.wall())
+    network.listen(SERVER, manager.make_protocol)
+    kiosk = KioskConnection(
+        ServerList([f'{SERVER[0]}:{SERVER[1]}'], clock=loop.time), KIOSK_IP,
+        open_connection=lambda host, port, ssl=None: network.open_connection(host, port, KIOSK_IP),
+        monotonic=loop.time, wall=loop.wall(90.0)  # the kiosk's clock is a minute and a half ahead
+    )
+    return network, manager, kiosk
+
+async def _stop():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def test_session_ends_with_the_server_across_a_reconnect():
+    async def main():
+        loop = asyncio.get_running_loop()
+        network, manager, kiosk = _fleet_of_one(loop)
+        manager.start()
+        ended, locked = [], []
+        expire = manager.scheduler.on_expire
+        manager.scheduler.on_expire = lambda client_id: (ended.append(loop.time()), expire(client_id))
+        kiosk.on_session_end = lambda: locked.append(loop.time())
+        kiosk.start()
+        await asyncio.sleep(10)
+        assert kiosk.online and kiosk.features.supports(Capability.CLOCK)
+        assert kiosk.client_id == KIOSK_IP
+        manager.start_session(KIOSK_IP, 600)
+        await asyncio.sleep(300)
+        assert kiosk.state == SessionState.ACTIVE
+        network.set_down(SERVER)
+        await asyncio.sleep(5)
+        assert not kiosk.online
+        network.set_down(SERVER, False)
+        await asyncio.sleep(MAX_RECONNECT_DELAY + 1)
+        assert kiosk.online
+        await asyncio.sleep(400)
+        assert kiosk.state == SessionState.ENDED
+        assert len(ended) == 1 and len(locked) == 1
+        assert abs(locked[0] - ended[0]) < 1.0
+        await _stop()
+    run(main)
+
+def test_keeps_trying_and_tells_the_user_once_when_unreachable():
+    async def main():
+        loop = asyncio.get_running_loop()
+        network, manager, kiosk = _fleet_of_one(loop)
+        manager.start()
+        unreachable = []
+        kiosk.on_unreachable = lambda: unreachable.append(loop.time())
+        network.set_down(SERVER)
+        kiosk.start()
+        await asyncio.sleep(UNREACHABLE_AFTER * 3)
+        assert len(unreachable) == 1 and unreachable[0] >= UNREACHABLE_AFTER
+        assert not kiosk.online
+        network.set_down(SERVER, False)
+        await asyncio.sleep(MAX_RECONNECT_DELAY + 1)
+        assert kiosk.online
+        await _stop()
+    run(main)
+
+def test_app_list_is_resent_on_connect_only_when_the_cached_copy_is_older():
+    async def main():
+        loop = asyncio.get_running_loop()
+        network, manager, kiosk = _fleet_of_one(loop)
+        manager.start()
+        received = []
+        kiosk.apps_version = lambda: received[-1] if received else 0
+
+        def on_message(message):
+            if message.type == MessageType.ALLOWED_APPS:
+                received.append(message.apps_version)
+        kiosk.on_message = on_message
+
+        async def away(seconds):
+            network.set_down(SERVER)
+            await asyncio.sleep(seconds)
+            network.set_down(SERVER, False)
+            await asyncio.sleep(MAX_RECONNECT_DELAY + 1)
+            assert kiosk.online
+
+        kiosk.start()
+        await asyncio.sleep(10)
+        manager.set_allowed_apps(KIOSK_IP, [{'name': 'Chrome', 'path': 'C:/chrome.exe'}], 1)
+        await asyncio.sleep(1)
+        assert received == [1]
+        network.set_down(SERVER)
+        await asyncio.sleep(5)
+        manager.set_allowed_apps(KIOSK_IP, [{'name': 'Word', 'path': 'C:/word.exe'}], 2)  # while it is away
+        await away(RESUME_WINDOW + 60)  # too long to be replayed
+        assert received == [1, 2]
+        await away(RESUME_WINDOW + 60)
+        assert received == [1, 2]  # its cached copy is current
+        await away(5)  # resumed: nothing missed, nothing resent
+        assert received == [1, 2]
+        await _stop()
+    run(main)
+
+def test_a_kiosk_that_stops_reading_is_dropped_in_the_managers_time():
+    async def main():
+        loop = asyncio.get_running_loop()
+        network, manager, kiosk = _fleet_of_one(loop)
+        manager.start()
+        kiosk.start()
+        await asyncio.sleep(10)
+        conn = manager.clients.get(KIOSK_IP)
+        conn.protocol.pause_writing()  # its socket buffer filled up
+        assert conn.protocol.paused_since == loop.time()
+        await asyncio.sleep(SLOW_CLIENT_TIMEOUT / 2)
+        assert network.connections == 1
+        await asyncio.sleep(SLOW_CLIENT_TIMEOUT)
+        assert network.connections == 2 and manager.clients.get(KIOSK_IP) is not conn
+        await _stop()
+    run(main)
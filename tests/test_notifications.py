@@ -0,0 +1,37 @@
+"""
+Notifier: notices that never block the event loop, and prompts answered through futures.
+"""
+import asyncio
+import os
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtWidgets = pytest.importorskip('PySide6.QtWidgets')
+from shared.notifications import Notifier
+
+@pytest.fixture(scope='module')
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+def test_keyed_notice_is_replaced_then_dismissed(app):
+    notifier = Notifier()
+    notifier.notify('Offline', 'Reconnecting...', level='warning', timeout=0, key='connection')
+    notifier.notify('Offline', 'Still reconnecting...', level='error', timeout=0, key='connection')
+    notifier.notify('Welcome', 'Enjoy your session')
+    assert len(notifier._banners) == 2
+    banner = notifier._banners['connection']
+    assert banner.text_label.text() == 'Still reconnecting...' and not banner.timer.isActive()
+    assert banner.y() < notifier._banners['notice0'].y()  # stacked in the order they appeared
+    notifier.dismiss('connection')
+    assert list(notifier._banners) == ['notice0']
+    notifier._banners['notice0'].mousePressEvent(None)
+    assert notifier._banners == {}
+
+def test_prompt_resolves_without_a_nested_event_loop(app):
+    async def main():
+        dialog = QtWidgets.QDialog()
+        answer = Notifier().ask(dialog)
+        assert dialog.isVisible() and not answer.done()  # ask returned with the dialog up
+        asyncio.get_running_loop().call_soon(dialog.accept)
+        return await asyncio.wait_for(answer, 1)
+    assert asyncio.run(main()) == QtWidgets.QDialog.Accepted
@@ -0,0 +1,23 @@
+"""
+PendingRequests: commands waiting for a kiosk's ACK, answered or timed out.
+"""
+import asyncio
+from server.pending_requests import CommandStatus, PendingRequests
+from shared.simulation import run
+
+def test_answers_resolve_and_silence_times_out():
+    async def main():
+        pending = PendingRequests(timeout=10)
+        acked_id, acked = pending.add('pc1')
+        silent_id, silent = pending.add('pc2')
+        assert acked_id != silent_id and len(pending) == 2
+        assert not pending.resolve(acked_id, 'pc2', CommandStatus.ACKED)  # another kiosk cannot answer it
+        assert pending.resolve(acked_id, 'pc1', CommandStatus.NACKED, 'no such app')
+        result = await acked
+        assert (result.status, result.error, result.ok) == (CommandStatus.NACKED, 'no such app', False)
+        result = await silent
+        assert result.status == CommandStatus.TIMEOUT and result.client_id == 'pc2'
+        assert asyncio.get_running_loop().time() == 10
+        assert len(pending) == 0
+        assert not pending.resolve(silent_id, 'pc2', CommandStatus.ACKED)  # too late
+    run(main)
@@ -0,0 +1,43 @@
+"""
+Handshake negotiation and capability-dependent framing.
+"""
+import json
+from shared.constants import Capability, Codec, MessageType, MIN_PROTOCOL_VERSION, PROTOCOL_VERSION
+from shared.protocol import (
+    LEGACY_FEATURES, SUPPORTED_CAPABILITIES, create_handshake, encode_frame, negotiate, parse_handshake
+)
+
+def test_negotiate_takes_lower_version_and_shared_capabilities():
+    local = create_handshake('server')
+    remote = create_handshake('pc1')
+    remote.protocol_version = PROTOCOL_VERSION + 1
+    remote.capabilities = [Capability.RESUME, Capability.CLOCK, 'teleport']
+    features = negotiate(local, remote)
+    assert features.version == PROTOCOL_VERSION
+    assert features.codec == Codec.JSON
+    assert features.capabilities == frozenset({Capability.RESUME, Capability.CLOCK})
+
+def test_legacy_first_line_is_version_zero_without_capabilities():
+    remote = parse_handshake({'type': 'client_info', 'client_ip': '10.0.0.5'})
+    assert remote.protocol_version == MIN_PROTOCOL_VERSION
+    assert remote.client_ip == '10.0.0.5'
+    features = negotiate(create_handshake('server'), remote)
+    assert features.version == MIN_PROTOCOL_VERSION
+    assert features.capabilities == frozenset()
+
+def test_unknown_codec_falls_back_to_json():
+    remote = create_handshake('pc1')
+    remote.codecs = ['msgpack']
+    assert negotiate(create_handshake('server'), remote).codec == Codec.JSON
+
+def test_fields_of_unnegotiated_capabilities_are_not_sent():
+    data = {'type': MessageType.SESSION_START, 'duration': 60, 'seq': 3, 'msg_id': 9, 'deadline': 1.5}
+    assert json.loads(encode_frame(data, LEGACY_FEATURES)) == {'type': MessageType.SESSION_START, 'duration': 60}
+    local = create_handshake('server')
+    features = negotiate(local, create_handshake('pc1'))
+    assert set(SUPPORTED_CAPABILITIES) == features.capabilities
+    assert json.loads(encode_frame(data, features)) == data
+
+def test_handshake_is_always_sent_whole():
+    handshake = {'type': MessageType.HANDSHAKE, 'apps_version': 4, 'seq': None}
+    assert json.loads(encode_frame(handshake, LEGACY_FEATURES)) == handshake
@@ -0,0 +1,28 @@
+"""
+Resumption tokens and the replay log a reconnecting kiosk picks up from.
+"""
+from server.resumption import REPLAY_LOG_SIZE, ReplayLog, ResumptionTokens
+
+def test_tokens_name_the_client_until_they_expire(clock):
+    tokens = ResumptionTokens(b'secret', ttl=60, clock=clock)
+    token = tokens.issue('pc1', 'alice')
+    assert tokens.verify(token) == {'cid': 'pc1', 'exp': 1060, 'acct': 'alice'}
+    assert ResumptionTokens(b'other', clock=clock).verify(token) is None
+    payload, signature = token.rsplit('.', 1)
+    assert tokens.verify(payload[:-2] + 'xx.' + signature) is None
+    assert tokens.verify('garbage') is None
+    clock.now += 61
+    assert tokens.verify(token) is None
+
+def test_replay_log_returns_what_was_missed_or_none_once_dropped():
+    log = ReplayLog()
+    for index in range(5):
+        log.record({'type': 'session_extend', 'duration': index})
+    assert [data['seq'] for data in log.since(2)] == [3, 4, 5]
+    assert log.since(5) == []
+    assert log.since(None) is None
+    for index in range(REPLAY_LOG_SIZE):
+        log.record({'type': 'heartbeat'})
+    assert log.since(2) is None  # too far back: the kiosk gets a snapshot instead
+    again = ReplayLog.from_dict(log.to_dict())
+    assert again.next_seq == log.next_seq and again.since(log.next_seq - 2) == log.since(log.next_seq - 2)
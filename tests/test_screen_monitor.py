@@ -0,0 +1,50 @@
+"""
+Screen monitoring: changed-tile thumbnails, streamed only while someone watches.
+"""
+import base64
+import pytest
+from shared.constants import MessageType
+from shared.protocol import ScreenMessage
+from server.screen_monitor import MAX_FPS, MIN_FPS, ScreenMonitor, fps_for
+
+def test_frame_rate_is_shared_and_backs_off():
+    assert fps_for(1) == MAX_FPS
+    assert fps_for(40) == 0.5
+    assert fps_for(40, lag=1.0, buffered=10 ** 9) == MIN_FPS
+
+def test_stream_runs_from_first_viewer_to_last():
+    sent, frames = [], []
+    monitor = ScreenMonitor(lambda client_id, message: sent.append((client_id, message.fps)) or True)
+    stop_one = monitor.watch('pc1', lambda client_id, view, changed: frames.append(changed))
+    stop_two = monitor.watch('pc1', lambda client_id, view, changed: None)
+    assert sent == [('pc1', MAX_FPS)]
+    tiles = [[0, base64.b64encode(b'a').decode()], [1, base64.b64encode(b'b').decode()]]
+    monitor.apply('pc1', ScreenMessage(type=MessageType.SCREEN, width=100, height=50, tile=64, key=True, tiles=tiles))
+    monitor.apply('pc1', ScreenMessage(type=MessageType.SCREEN, width=100, height=50, tile=64, tiles=tiles[1:]))
+    view = monitor.views['pc1']
+    assert frames == [[0, 1], [1]] and view.tiles == {0: b'a', 1: b'b'}
+    assert view.tile_origin(1) == (64, 0)
+    late = []
+    stop_late = monitor.watch('pc1', lambda client_id, view, changed: late.append(changed))
+    assert late == [[0, 1]]  # a new viewer starts from the last picture
+    monitor.client_connected('pc1')
+    assert sent[-1] == ('pc1', MAX_FPS)
+    stop_one()
+    stop_two()
+    assert len(sent) == 2 and monitor.watched() == ['pc1']
+    stop_late()
+    assert sent[-1] == ('pc1', 0) and monitor.watched() == [] and 'pc1' not in monitor.views
+
+def test_encoder_sends_only_changed_tiles():
+    QtGui = pytest.importorskip('PySide6.QtGui')
+    from client.screen_capture import TileEncoder
+    image = QtGui.QImage(256, 128, QtGui.QImage.Format_RGB32)
+    image.fill(0xffffff)
+    encoder = TileEncoder(width=128, quality=0, tile=32)
+    width, height, key, tiles = encoder.encode(image)
+    assert (width, height, key, len(tiles)) == (128, 64, True, 8)
+    assert encoder.encode(image)[3] == []
+    image.setPixel(250, 120, 0)  # bottom-right corner
+    assert [index for index, data in encoder.encode(image)[3]] == [7]
+    encoder.reset()
+    assert encoder.encode(image)[2]
@@ -0,0 +1,34 @@
+"""
+ServerList: failover to the next server, backoff between rounds, and when to give the user notice.
+"""
+import random
+from client.server_list import ServerList
+from shared.constants import MAX_RECONNECT_DELAY, RECONNECT_DELAY, UNREACHABLE_AFTER
+
+def test_next_server_at_once_then_doubling_jittered_delays(clock):
+    servers = ServerList(['a', 'b:6000'], clock=clock, rng=random.Random(1))
+    assert servers.current == ('a', 5000)
+    assert servers.failed() == 0
+    assert servers.current == ('b', 6000)
+    delays = []
+    for _ in range(8):
+        delays.append(servers.failed())
+        assert servers.failed() == 0
+    for rounds, delay in enumerate(delays):
+        full = min(RECONNECT_DELAY * 2 ** rounds, MAX_RECONNECT_DELAY)
+        assert full / 2 <= delay <= full
+    servers.connected()
+    servers.failed()
+    assert servers.failed() <= RECONNECT_DELAY  # the backoff starts over
+
+def test_unreachable_after_failing_for_a_while(clock):
+    servers = ServerList(['a'], clock=clock)
+    assert not servers.unreachable
+    servers.failed()
+    clock.now += UNREACHABLE_AFTER - 1
+    servers.failed()
+    assert not servers.unreachable
+    clock.now += 1
+    assert servers.unreachable
+    servers.connected()
+    assert not servers.unreachable
@@ -0,0 +1,53 @@
+"""
+SessionJournal: torn records, compaction, and forgetting only what was uploaded.
+"""
+from shared.constants import JournalEvent
+from client.session_journal import SessionJournal
+
+def test_discard_keeps_events_appended_after_the_mark(tmp_path):
+    journal = SessionJournal(str(tmp_path / 'journal.bin'))
+    journal.append(JournalEvent.STATUS, {'state': 'active'}, timestamp=1.0)
+    journal.append(JournalEvent.APP, {'name': 'Chrome'}, timestamp=2.0)
+    uploaded = journal.read()
+    mark = journal.mark()
+    journal.append(JournalEvent.TICK, {'remaining': 60}, timestamp=3.0)
+    journal.discard(mark)
+    assert [event[2] for event in uploaded] == [{'state': 'active'}, {'name': 'Chrome'}]
+    assert journal.read() == [(JournalEvent.TICK, 3.0, {'remaining': 60})]
+    journal.discard(journal.mark())
+    assert journal.empty and journal.read() == []
+    journal.close()
+
+def test_a_mark_from_before_a_rewrite_discards_nothing(tmp_path):
+    journal = SessionJournal(str(tmp_path / 'journal.bin'))
+    journal.append(JournalEvent.STATUS, {'state': 'active'}, timestamp=1.0)
+    mark = journal.mark()
+    journal.compact()
+    journal.discard(mark)
+    assert len(journal.read()) == 1
+    journal.close()
+
+def test_torn_tail_is_ignored_and_appends_survive_reopening(tmp_path):
+    path = str(tmp_path / 'journal.bin')
+    journal = SessionJournal(path)
+    journal.append(JournalEvent.APP, {'name': 'Chrome'}, timestamp=1.0)
+    journal.close()
+    with open(path, 'ab') as f:
+        f.write(b'\x02\x00\x00')  # a header cut short by a power cut
+    journal = SessionJournal(path)
+    assert journal.read() == [(JournalEvent.APP, 1.0, {'name': 'Chrome'})]
+    journal.append(JournalEvent.APP, {'name': 'Word'}, timestamp=2.0)
+    journal.close()
+    assert SessionJournal(path).read() == [(JournalEvent.APP, 1.0, {'name': 'Chrome'}),
+                                           (JournalEvent.APP, 2.0, {'name': 'Word'})]
+
+def test_compaction_keeps_the_journal_within_the_cap(tmp_path):
+    journal = SessionJournal(str(tmp_path / 'journal.bin'), max_bytes=2048)
+    journal.append(JournalEvent.APP, {'name': 'Chrome'}, timestamp=0.0)
+    for i in range(1, 200):
+        journal.append(JournalEvent.TICK, {'remaining': 10000 - i}, timestamp=float(i))
+        assert journal.mark()[1] <= 2048
+    events = journal.read()
+    assert events[0] == (JournalEvent.APP, 0.0, {'name': 'Chrome'})
+    assert events[-1][2] == {'remaining': 10000 - 199}
+    journal.close()
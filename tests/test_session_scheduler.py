@@ -0,0 +1,68 @@
+"""
+SessionScheduler: expiry, billing, and per-account reservation of prepaid time.
+"""
+import asyncio
+import threading
+from server.billing import BillingLedger
+from server.session_scheduler import SessionScheduler
+
+def _scheduler(tmp_path, clock, balance=600):
+    ledger = BillingLedger(str(tmp_path / 'ledger.db'))
+    ledger.credit('alice', balance)
+    expired = []
+    return SessionScheduler(expired.append, ledger=ledger, clock=clock), ledger, expired
+
+def test_sessions_expire_and_are_billed_to_the_deadline(tmp_path, clock):
+    scheduler, ledger, expired = _scheduler(tmp_path, clock)
+    assert scheduler.start('pc1', 100, 'alice') == 100
+    clock.now += 150
+    assert scheduler.expire_due() == ['pc1'] and expired == ['pc1']
+    assert ledger.balance('alice') == 500
+
+def test_concurrent_sessions_share_the_balance(tmp_path, clock):
+    scheduler, ledger, _ = _scheduler(tmp_path, clock)
+    assert scheduler.start('pc1', 400, 'alice') == 400
+    assert scheduler.start('pc2', 400, 'alice') == 200
+    assert scheduler.available('alice') == 0
+    assert scheduler.start('pc3', 400, 'alice') == 0
+    # Restarting a kiosk's own session does not count its old one against it
+    assert scheduler.available('alice', exclude='pc2') == 200
+    scheduler.end('pc3')
+    clock.now += 100
+    scheduler.end('pc1')  # used 100 of its 400
+    assert scheduler.available('alice') == 300
+
+def test_extension_beyond_the_balance_is_refused(tmp_path, clock):
+    scheduler, _, _ = _scheduler(tmp_path, clock)
+    scheduler.start('pc1', 300, 'alice')
+    clock.now += 200
+    assert scheduler.extend('pc1', 301) is None
+    assert scheduler.remaining('pc1') == 100
+    assert scheduler.extend('pc1', 300) == 400
+    scheduler.pause('pc1')
+    assert scheduler.extend('pc1', 1) is None
+    assert scheduler.extend('pc1', -50) == 350
+    # Sessions without an account are not limited
+    scheduler.start('pc2', 60)
+    assert scheduler.extend('pc2', 10 ** 6) is not None
+
+def test_run_flushes_the_ledger_off_the_event_loop(tmp_path, clock):
+    scheduler, ledger, _ = _scheduler(tmp_path, clock)
+    scheduler.start('pc1', 300, 'alice')
+    clock.now += 30
+    flushed_on = []
+    write_pending = ledger.write_pending
+    ledger.write_pending = lambda: flushed_on.append(threading.current_thread()) or write_pending()
+    published = []
+    ledger.on_change = lambda kind, data: published.append((threading.current_thread(), data['rows']))
+
+    async def run():
+        task = asyncio.ensure_future(scheduler.run(flush_interval=0))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert flushed_on[0] is not threading.main_thread()
+    thread, rows = published[0]
+    assert thread is threading.main_thread()
+    assert [row[1:] for row in rows] == [('alice', 'pc1', -30)]
@@ -0,0 +1,69 @@
+"""
+SessionTeardown against real child processes: close, then terminate, then kill.
+"""
+import os
+import subprocess
+import sys
+import time
+import psutil
+import pytest
+from client.session_teardown import SessionTeardown
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason='signals real POSIX children')
+
+CLOSE, TERMINATE, KILL = 0.3, 0.3, 2.0
+SLACK = 0.25  # scheduling and wait_procs polling
+
+OBEDIENT = 'import time; print("ready", flush=True); time.sleep(60)'
+STUBBORN = 'import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print("ready", flush=True); time.sleep(60)'
+# Starts a stubborn grandchild, which reports on the shared stdout when it is up
+PARENT = f'import subprocess, sys, time; subprocess.Popen([sys.executable, "-c", {STUBBORN!r}]); time.sleep(60)'
+
+def _spawn(code: str) -> subprocess.Popen:
+    child = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE)
+    assert child.stdout.readline() == b'ready\n'
+    return child
+
+@pytest.fixture
+def children():
+    spawned = []
+    yield lambda code: spawned.append(_spawn(code)) or spawned[-1]
+    for child in spawned:
+        child.kill()
+        child.wait()
+
+def test_escalates_from_close_to_terminate_to_kill(children):
+    obedient, stubborn = children(OBEDIENT), children(STUBBORN)
+    asked = []
+    teardown = SessionTeardown(
+        request_close=lambda processes: asked.append((time.monotonic(), sorted(p.pid for p in processes))),
+        close_timeout=CLOSE, terminate_timeout=TERMINATE, kill_timeout=KILL
+    )
+    started = time.monotonic()
+    report = teardown.run([obedient.pid, stubborn.pid])
+    # The close request was made at once, to both; neither window closed
+    assert asked[0][1] == sorted([obedient.pid, stubborn.pid])
+    assert asked[0][0] - started < SLACK
+    assert report.closed == []
+    assert report.terminated == [obedient.pid]
+    assert report.killed == [stubborn.pid]
+    assert report.clean
+    # Both grace periods ran out in full; the kill took effect at once
+    assert CLOSE + TERMINATE <= report.duration < CLOSE + TERMINATE + SLACK
+
+def test_sigterm_is_the_polite_request_on_posix(children):
+    obedient, stubborn = children(OBEDIENT), children(STUBBORN)
+    report = SessionTeardown(close_timeout=CLOSE, terminate_timeout=TERMINATE, kill_timeout=KILL).run(
+        [obedient.pid, stubborn.pid])
+    assert report.closed == [obedient.pid]
+    assert report.terminated == []
+    assert report.killed == [stubborn.pid]
+    assert CLOSE + TERMINATE <= report.duration < CLOSE + TERMINATE + SLACK
+
+def test_descendants_are_torn_down_with_their_root(children):
+    parent = children(PARENT)
+    grandchild = psutil.Process(parent.pid).children()[0]
+    report = SessionTeardown(close_timeout=CLOSE, terminate_timeout=TERMINATE, kill_timeout=KILL).run([parent.pid])
+    assert report.closed == [parent.pid]
+    assert report.killed == [grandchild.pid]
+    assert not grandchild.is_running()
@@ -0,0 +1,26 @@
+"""
+VirtualEventLoop: the clock jumps over idle time but stands still while threads work.
+"""
+import asyncio
+import time
+from shared.simulation import run
+
+def test_sleeping_costs_no_real_time():
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        await asyncio.sleep(3600)
+        assert loop.time() == 3600
+        return time.perf_counter() - started
+    assert run(main) < 1.0
+
+def test_executor_work_takes_no_virtual_time():
+    async def main():
+        loop = asyncio.get_running_loop()
+        fired = []
+        loop.call_later(0.01, fired.append, True)  # due while the thread is still sleeping
+        result = await loop.run_in_executor(None, lambda: time.sleep(0.1) or 42)
+        assert result == 42 and loop.time() == 0 and not fired
+        await asyncio.sleep(0.02)
+        assert fired
+    run(main)
@@ -0,0 +1,37 @@
+"""
+Telemetry: delta-encoded process tables rebuilt on the server, and the sampler's CPU budget.
+"""
+import os
+from client.telemetry import TelemetrySampler
+from shared.constants import MessageType
+from shared.protocol import TelemetryMessage
+from shared.telemetry import TelemetryEncoder, TelemetryView
+
+def _send(encoder: TelemetryEncoder, view: TelemetryView, processes) -> TelemetryMessage:
+    message = TelemetryMessage(type=MessageType.TELEMETRY, **encoder.encode(20.0, 50.0, processes))
+    view.apply(message)
+    return message
+
+def test_only_changes_are_sent_and_the_view_keeps_up():
+    encoder, view = TelemetryEncoder(keyframe_every=3), TelemetryView()
+    first = {1: ('chrome.exe', 30, 400), 2: ('word.exe', 5, 200)}
+    assert _send(encoder, view, first).key
+    second = {1: ('chrome.exe', 30, 400), 2: ('word.exe', 9, 200), 3: ('calc.exe', 1, 10)}
+    message = _send(encoder, view, second)
+    assert not message.key and message.procs == [[2, 9, 200], [3, 1, 10, 'calc.exe']] and message.gone == []
+    message = _send(encoder, view, {1: ('chrome.exe', 30, 400), 3: ('calc.exe', 1, 10)})
+    assert message.procs == [] and message.gone == [2]
+    assert view.top(1) == [{'pid': 1, 'name': 'chrome.exe', 'cpu': 30, 'rss_mb': 400}]
+    assert sorted(view.processes) == [1, 3]
+    assert _send(encoder, view, second).key  # every third sample is a full table
+    encoder.reset()
+    assert _send(encoder, view, second).key
+
+def test_sampler_reports_this_process_and_stays_within_budget():
+    sampler = TelemetrySampler(top=1000, budget=0.01)
+    sampler.sample()
+    cpu, memory, processes = sampler.sample()
+    assert 0 <= cpu <= 100 and 0 < memory <= 100
+    assert os.getpid() in processes
+    sampler.cost = 1.0  # a pass that took a whole second of CPU
+    assert sampler.delay(10) == 100 and sampler.overhead(10) == 0.01
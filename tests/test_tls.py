@@ -0,0 +1,65 @@
+"""
+TLS: pinned server certificates and session resumption on reconnect.
+"""
+import asyncio
+import hashlib
+import shutil
+import ssl
+import subprocess
+import pytest
+from shared.tls import client_context, server_context
+
+pytestmark = pytest.mark.skipif(shutil.which('openssl') is None, reason='needs the openssl command')
+
+@pytest.fixture
+def certificate(tmp_path):
+    cert, key = str(tmp_path / 'cert.pem'), str(tmp_path / 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', cert,
+                    '-days', '1', '-subj', '/CN=kiosk-server'], check=True, capture_output=True)
+    with open(cert) as f:
+        pin = hashlib.sha256(ssl.PEM_cert_to_DER_cert(f.read())).hexdigest()
+    return cert, key, pin
+
+async def _serve(cert: str, key: str):
+    async def greet(reader, writer):
+        writer.write(b'hello\n')
+        await writer.drain()
+        await reader.read()
+        writer.close()
+    return await asyncio.start_server(greet, '127.0.0.1', 0, ssl=server_context(cert, key))
+
+async def _connect(port: int, context):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, ssl=context)
+    ssl_object = writer.get_extra_info('ssl_object')
+    context.verify(ssl_object)
+    assert await reader.readline() == b'hello\n'
+    context.remember(ssl_object)
+    writer.close()
+    return ssl_object.session_reused
+
+def test_pinned_certificate_connects_and_resumes(certificate):
+    cert, key, pin = certificate
+
+    async def main():
+        server = await _serve(cert, key)
+        port = server.sockets[0].getsockname()[1]
+        context = client_context({'pin_sha256': ':'.join(pin[i:i + 2] for i in range(0, len(pin), 2)).upper()})
+        assert not await _connect(port, context)
+        assert await _connect(port, context)  # the ticket from the first connection
+        server.close()
+    asyncio.run(main())
+
+def test_other_certificate_is_refused(certificate):
+    cert, key, _ = certificate
+
+    async def main():
+        server = await _serve(cert, key)
+        port = server.sockets[0].getsockname()[1]
+        with pytest.raises(ssl.SSLCertVerificationError):
+            await _connect(port, client_context({'pin_sha256': '00' * 32}))
+        server.close()
+    asyncio.run(main())
+
+def test_no_config_means_plain_tcp():
+    assert client_context(None) is None
+    assert client_context({'enabled': False}) is None
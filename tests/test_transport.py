@@ -0,0 +1,81 @@
+"""
+FrameProtocol: frames split across reads, batch decoding and the output backlog.
+"""
+import json
+from shared.constants import MessageType
+from shared.transport import FrameProtocol, decode_frames
+
+class FakeTransport:
+    def __init__(self):
+        self.written = []
+        self.closing = False
+
+    def set_write_buffer_limits(self, high, low):
+        pass
+
+    def write(self, data: bytes):
+        self.written.append(data)
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+    def is_closing(self) -> bool:
+        return self.closing
+
+    def abort(self):
+        self.closing = True
+
+    close = abort
+
+def _feed(protocol: FrameProtocol, data: bytes):
+    buffer = protocol.get_buffer(len(data))
+    buffer[:len(data)] = data
+    protocol.buffer_updated(len(data))
+
+def test_frames_split_across_reads_are_joined():
+    batches = []
+    protocol = FrameProtocol(lambda _, frames: batches.append(frames), buffer_size=8192)
+    protocol.connection_made(FakeTransport())
+    _feed(protocol, b'{"a": 1}\n{"b"')
+    _feed(protocol, b': 2}\n{"c": 3}\n{"d": ')
+    _feed(protocol, b'4}\n')
+    assert batches == [[{'a': 1}], [{'b': 2}, {'c': 3}], [{'d': 4}]]
+
+def test_a_frame_longer_than_the_buffer_grows_it():
+    batches = []
+    protocol = FrameProtocol(lambda _, frames: batches.append(frames), buffer_size=8192)
+    protocol.connection_made(FakeTransport())
+    frame = json.dumps({'blob': 'x' * 20000}).encode() + b'\n'
+    for i in range(0, len(frame), 4096):
+        _feed(protocol, frame[i:i + 4096])
+    assert batches == [[{'blob': 'x' * 20000}]]
+
+def test_bad_and_blank_lines_do_not_lose_the_rest():
+    assert decode_frames(b'{"a": 1}\n\n{oops\n{"b": 2}') == [{'a': 1}, {'b': 2}]
+
+def test_backlog_keeps_only_the_latest_superseding_frame():
+    transport = FakeTransport()
+    dropped = []
+    protocol = FrameProtocol(lambda *_: None, on_superseded=lambda _, data: dropped.append(data))
+    protocol.connection_made(transport)
+    protocol.pause_writing()
+    protocol.send_frame({'type': MessageType.ALLOWED_APPS, 'apps': [1]})
+    protocol.send_frame({'type': MessageType.ALLOWED_APPS, 'apps': [2]})
+    assert transport.written == []
+    assert dropped == [{'type': MessageType.ALLOWED_APPS, 'apps': [1]}]
+    protocol.resume_writing()
+    assert [json.loads(frame)['apps'] for frame in transport.written] == [[2]]
+
+def test_a_peer_that_stops_reading_is_dropped():
+    transport = FakeTransport()
+    protocol = FrameProtocol(lambda *_: None, max_output=4096)
+    protocol.connection_made(transport)
+    protocol.pause_writing()
+    for index in range(20):
+        protocol.send_frame({'type': MessageType.SESSION_EXTEND, 'blob': 'x' * 200, 'n': index})  # never coalesced
+        if transport.closing:
+            break
+    assert transport.closing and protocol.buffered_bytes > 4096
+    backlog = protocol.buffered_bytes
+    protocol.send_frame({'type': MessageType.SESSION_EXTEND})  # nothing is queued once it is closing
+    assert protocol.buffered_bytes == backlog
@@ -0,0 +1,37 @@
+"""
+UsageRollups: session and app time split into hourly and daily buckets, checkpointed per worker.
+"""
+from server.event_log import EventKind
+from server.usage_rollups import APP, CLIENT, HOUR, UsageRollups, load_rollups
+
+START = 1_700_000_000 // HOUR * HOUR + HOUR - 600  # ten minutes before the hour
+
+def test_intervals_split_across_hours_without_losing_seconds(tmp_path, make_clock):
+    clock = make_clock(START)
+    start = clock.now
+    rollups = UsageRollups(str(tmp_path), clock=clock)
+    rollups.observe(EventKind.SESSION_START, 'pc1')
+    rollups.observe(EventKind.APPS, 'pc1', {'apps': ['Chrome', 'Word']})
+    clock.now += 900
+    rollups.observe(EventKind.APPS, 'pc1', {'apps': ['Chrome']})
+    clock.now += 300
+    rollups.observe(EventKind.SESSION_PAUSE, 'pc1')
+    rollups.observe(EventKind.DISCONNECT, 'pc1')
+    clock.now += 3600  # paused: not counted
+    assert rollups.hourly(CLIENT, 'pc1', start, clock.now) == [600, 600, 0]
+    assert rollups.hourly(APP, 'Word', start, start + HOUR) == [600, 300]
+    assert rollups.hourly(APP, 'Chrome', start, start + HOUR) == [600, 600]
+    assert rollups.names(APP) == ['Chrome', 'Word']
+
+def test_checkpoints_of_every_worker_add_up(tmp_path, make_clock):
+    clock = make_clock(START)
+    for writer in range(2):
+        rollups = UsageRollups(str(tmp_path), writer, clock=clock)
+        rollups.start('pc1', clock.now)
+        rollups.stop('pc1', clock.now + 100 * (writer + 1))
+        rollups.close()
+    total = load_rollups(str(tmp_path))
+    total.clock = clock
+    assert total.hourly(CLIENT, 'pc1', clock.now, clock.now) == [300]
+    again = UsageRollups(str(tmp_path), 0, clock=clock)  # picks its own checkpoint back up
+    assert again.hourly(CLIENT, 'pc1', clock.now, clock.now) == [100]